@@ -3,29 +3,48 @@
 # - Painel interativo (Ocorrências) agora aparece APENAS UMA VEZ e fica LADO A LADO com Motivos (Top 12)
 # - Mantém: drill (Ano->Mês->Semana), botão Voltar, Reset drill, Tabela por barra clicada, Participação (barras) e Atrasadas
 
+import importlib.util
 import io
 import os
 import json
+import hashlib
+import re
+import shutil
+import sys
+import threading
+import time
+import unicodedata
+import uuid
+import weakref
+from itertools import chain
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import streamlit as st
-import plotly.express as px
+import plotly.graph_objects as go
+from plotly.utils import PlotlyJSONEncoder as _PlotlyJSONEncoder
 
-from openpyxl import Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.formatting.rule import CellIsRule
-from openpyxl.worksheet.table import Table, TableStyleInfo
-
-from openpyxl.chart import BarChart, PieChart
-from openpyxl.chart.reference import Reference
-from openpyxl.chart.label import DataLabelList
-
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib.utils import ImageReader
+# openpyxl (gráficos/tabelas/estilos) e reportlab só são importados quando uma
+# exportação é gerada: import local em cada função de Excel/PDF.
+# Orçamento de cold start (processo novo, dataset já em disco): tela de login
+# < 1 s e 1º painel < 1,5 s; nada de export no caminho até lá.
 
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pa_pq
+except Exception:  # sem pyarrow: dataset fica só em memória (sem Arrow mapeado)
+    pa = None
+    pa_ipc = None
+    pa_pq = None
+
+# Leitura do Excel: calamine (Rust) quando instalado; senão o motor padrão do pandas
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = "calamine"
+except Exception:
+    EXCEL_ENGINE = None
 
 # =========================================================
 # Persistência local (último arquivo carregado)
@@ -37,31 +56,80 @@ LAST_DIR.mkdir(exist_ok=True)
 LAST_FILE = LAST_DIR / "last_excel.bin"
 LAST_META = LAST_DIR / "last_excel_meta.json"
 
-
-def _save_last_upload(xls_bytes: bytes, filename: str, sheet_name: str):
+# Ingestão em segundo plano (upload novo)
+INGEST_POLL_S = 1.0   # intervalo de atualização da barra de progresso
+INGEST_KEEP = 8       # jobs concluídos mantidos no registro
+
+# Aquecimento: na 1ª execução do script no processo, carrega o último Excel
+# salvo e monta a visão padrão em segundo plano (False desliga)
+AQUECER_NA_PARTIDA = True
+
+# Memória das sessões (recorte/cubos derivados de cada sessão, somados no
+# processo): acima do teto, sessões ociosas perdem o recorte, da mais antiga
+# para a mais recente, e recalculam se voltarem
+SESSOES_MEM_MAX_MB = 1024
+SESSAO_OCIOSA_S = 120   # só sessão sem rerun há esse tempo pode ser descartada
+
+# Dataset normalizado em Arrow IPC (1 arquivo por digest/aba), aberto via mmap
+# por todos os processos do servidor: o page cache do SO guarda uma única cópia
+# e um processo novo não precisa reprocessar o Excel.
+DATASET_DIR = LAST_DIR / "datasets"
+DATASET_DIR.mkdir(exist_ok=True)
+DATASET_KEEP = 4  # quantos .arrow manter em disco
+DATASET_SCHEMA_VER = 3  # sobe quando a leitura (SCHEMA_QUALIEX) muda: reprocessa o Excel
+
+# Drill no navegador: index.html do app + plotly.min.js do pacote plotly
+# instalado, copiados na partida para a pasta que o Streamlit serve
+DRILL_HTML = Path(__file__).resolve().parent / "componentes" / "drill_ocorrencias" / "index.html"
+DRILL_DIR = LAST_DIR / "componentes" / "drill_ocorrencias"
+
+# PDF / Resumo Excel gerados ficam em disco (chave = versão + estado do
+# recorte), compartilhados entre sessões e processos; LRU acima do teto
+EXPORT_CACHE_DIR = LAST_DIR / "exportacoes"
+EXPORT_CACHE_MAX_MB = 512
+# Sobe quando o conteúdo do PDF/Excel muda (arquivos antigos deixam de casar)
+EXPORT_FORMATO = 4
+
+
+def _save_last_upload(xls_bytes: bytes, filename: str, sheet_name: str, digest: str | None = None):
     try:
-        LAST_FILE.write_bytes(xls_bytes)
-        LAST_META.write_text(
+        # grava em .tmp e troca com os.replace: quem lê nunca pega arquivo pela metade
+        tmp_file = LAST_FILE.with_suffix(".bin.tmp")
+        tmp_file.write_bytes(xls_bytes)
+        tmp_meta = LAST_META.with_suffix(".json.tmp")
+        tmp_meta.write_text(
             json.dumps(
-                {"filename": filename or "ultimo.xlsx", "sheet": sheet_name or DEFAULT_SHEET},
+                {
+                    "filename": filename or "ultimo.xlsx",
+                    "sheet": sheet_name or DEFAULT_SHEET,
+                    "digest": digest or "",
+                },
                 ensure_ascii=False,
                 indent=2,
             ),
             encoding="utf-8",
         )
+        os.replace(tmp_file, LAST_FILE)
+        os.replace(tmp_meta, LAST_META)
     except Exception:
         # Se falhar (permissão, etc.), apenas não persiste.
         pass
 
 
+def _load_last_meta() -> dict:
+    try:
+        if LAST_META.exists():
+            return json.loads(LAST_META.read_text(encoding="utf-8"))
+    except Exception:
+        pass
+    return {}
+
+
 def _load_last_upload():
     try:
         if LAST_FILE.exists():
             b = LAST_FILE.read_bytes()
-            meta = {}
-            if LAST_META.exists():
-                meta = json.loads(LAST_META.read_text(encoding="utf-8"))
-            return b, meta
+            return b, _load_last_meta()
     except Exception:
         return None, {}
     return None, {}
@@ -85,6 +153,41 @@ COL_RESP_OCORRENCIA = "Responsável"
 COL_RESP_ANALISE = "Responsável da análise de causa"
 COL_CATEGORIA = "Categoria"
 COL_SITUACAO = "Situação"  # ATRASADA / NO PRAZO
+COL_DESCRICAO = "Descrição"
+COL_CLIENTE = "Cliente"
+COL_QTD_NC = "Quantidade não conforme"
+
+# Esquema da consulta Qualiex (documentado no README): coluna -> tipo
+# - data: DATE_FMT_BR exato (rápido); outros formatos só nas exceções
+# - inteiro: numérico; o que não for número fica vazio
+# - categoria: poucos valores distintos (filtros); espaços normalizados
+# - texto: livre (só remove espaços nas pontas)
+SCHEMA_QUALIEX = {
+    COL_CODIGO: "texto",
+    COL_TITULO: "texto",
+    COL_STATUS: "categoria",
+    COL_SITUACAO: "categoria",
+    COL_DATA: "data",
+    COL_RESP_OCORRENCIA: "categoria",
+    COL_CATEGORIA: "categoria",
+    "Local": "categoria",
+    COL_CLIENTE: "categoria",
+    COL_DESCRICAO: "texto",
+    COL_RESP_ANALISE: "categoria",
+    "Link": "texto",
+    "Embalagem": "categoria",
+    COL_MOTIVO: "categoria",
+    COL_QTD_NC: "inteiro",
+    COL_TURNO: "categoria",
+}
+COLS_OBRIGATORIAS = [COL_CODIGO, COL_TITULO, COL_STATUS, COL_DATA, COL_MOTIVO]
+
+# Status que contam como encerrados (o resto é "em aberto")
+STATUS_FECHADOS = {"CONCLUÍDA", "CONCLUIDA", "CONCLUÍDO", "CONCLUIDO", "FECHADA", "ENCERRADA", "CANCELADA", "FINALIZADA"}
+
+# Medidas dos gráficos: rótulo na tela -> coluna do cubo
+MEDIDAS = {"Ocorrências": "n", "Quantidade": "qtd"}
+MEDIDA_ROTULO = {v: k for k, v in MEDIDAS.items()}
 
 # ✅ Filtros por marcar (com Categoria incluída)
 FILTROS_COLS = [
@@ -112,6 +215,65 @@ LIMIAR_SEMANAL = 2      # <=2 verde, >2 vermelho (visão SEMANA)
 GREEN = "#2E7D32"
 RED = "#C62828"
 BLUE = "#1f77b4"
+HIGHLIGHT = "#FF8F00"   # barra selecionada no filtro cruzado
+GREY = "#9E9E9E"        # período anterior (modo comparação)
+
+# Aging das pendências (dias desde a Data de emissão): limite superior de cada
+# faixa (0–7, 8–15, 16–30, 31–60) e a última, aberta (>60)
+AGING_LIMITES = [7, 15, 30, 60]
+AGING_FAIXAS = ["0–7 dias", "8–15 dias", "16–30 dias", "31–60 dias", ">60 dias"]
+AGING_CORES = ["#81C784", "#FFD54F", "#FFB74D", "#E57373", RED]
+
+# Gráficos por categoria: os k maiores de cada um; a cauda vira uma barra só
+TOP_K = {"motivos": 12, "participacao": 15, "atrasadas": 15, "aging": 15}
+ROTULO_OUTROS = "(Outros)"
+
+# Mapa Turno/Horário x dia da semana (segunda = 0, como datetime.weekday)
+DIAS_SEMANA = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]
+
+# Varredura de limiares: mesmo critério das cores (> limiar estoura), por granularidade
+LIMIARES_VARREDURA = {"Semana": LIMIAR_SEMANAL, "Mês": LIMIAR_OCORRENCIAS}
+
+# Gráfico Ocorrências por nível do drill: (eixo x, título) — servidor e navegador
+NIVEIS_OCORRENCIAS = {
+    "ANO": ("Ano", "{y} (clique para detalhar)"),
+    "MES_ANO": ("Mês/Ano", "{y} por mês/ano (clique para detalhar por semana)"),
+    "MES": ("Mês", "{y} por mês (clique para detalhar por semana)"),
+    "SEMANA": ("Semana", "{y} por semana do mês (clique para ver tabela)"),
+}
+
+# Cache de figuras (spec JSON por hash do dataset + título/nível)
+FIG_CACHE_MAX = 256
+# Datasets base mantidos em memória (1 por digest, compartilhados entre sessões)
+BASE_CACHE_MAX = 4
+
+# Índice temporal (somas prefixadas por dia): colunas com contagem por valor
+TIME_INDEX_COLS = [COL_MOTIVO, COL_RESP_ANALISE, COL_RESP_OCORRENCIA, COL_SITUACAO]
+TIME_INDEX_MAX_CELLS = 20_000_000  # valores x dias; acima disso a coluna fica fora do índice
+
+# Busca textual (índice invertido + trigramas, sem acento)
+TEXT_SEARCH_COLS = [COL_TITULO, COL_DESCRICAO]
+
+# Duplicatas (MinHash/LSH): 64 hashes em 16 faixas de 4 -> ~99% de chance de
+# virar par candidato com similaridade >= 0,7 e ~12% com 0,3 (descartado depois)
+DUP_NUM_PERM = 64
+DUP_BANDS = 16
+DUP_LIMIAR = 0.7       # similaridade (Jaccard estimada) para considerar duplicata
+DUP_MAX_BUCKET = 50    # balde maior que isso só liga vizinhos (evita O(n²))
+DUP_SEED = 20250101
+
+# Exportação bruta (CSV/Parquet): linhas convertidas por bloco
+EXPORT_CHUNK_ROWS = 20_000
+
+# Modo exploração: gráficos/tabela numa amostra estratificada (mês x Categoria)
+# do recorte, do tamanho que cabe no orçamento de tempo de um rerun.
+# AMOSTRA_LINHAS_POR_S: vazão do trabalho por linha (cubo + aging + ordenação
+# da tabela) medida no servidor; fixa para que o tamanho (e a amostra) não
+# dependa da carga da máquina no momento
+AMOSTRA_ORCAMENTO_S = 0.25
+AMOSTRA_LINHAS_POR_S = 300_000
+AMOSTRA_MIN_LINHAS = 20_000
+AMOSTRA_SEED = 20250101
 
 
 # =========================================================
@@ -150,6 +312,21 @@ def br_date_str(dt) -> str:
         return ""
 
 
+def fmt_num(x, sinal: bool = False) -> str:
+    """Número de rótulo/KPI: inteiro sem casas; quantidade fracionária com 2."""
+    x = float(x)
+    if x.is_integer():
+        return f"{int(x):+d}" if sinal else str(int(x))
+    return f"{x:+.2f}" if sinal else f"{x:.2f}"
+
+
+def valores_medida(v, medida: str = "n") -> np.ndarray:
+    # contagens (n, atrasadas, abertas): inteiros; quantidade: soma em float,
+    # sem truncar (Qtd. não conforme pode ter fração; 2 casas tiram o ruído da soma)
+    v = np.asarray(v, dtype=float)
+    return v.round(2) if medida in ("qtd", "qtd_atrasadas") else v.round().astype("int64")
+
+
 def normalizar_situacao(x: str) -> str:
     s = str(x).strip().upper()
     if s in ("ATRASADA", "ATRASADO"):
@@ -161,7 +338,7 @@ def normalizar_situacao(x: str) -> str:
     return s
 
 
-def _titulo_filtro(anos_sel, mes_sel: str, resp_occ_sel: str) -> str:
+def _titulo_filtro(anos_sel, mes_sel: str, resp_occ_sel: str, periodo=None, busca: str = "") -> str:
     # anos_sel pode ser lista (multi-seleção) ou string
     if isinstance(anos_sel, (list, tuple, set)):
         if not anos_sel:
@@ -171,7 +348,12 @@ def _titulo_filtro(anos_sel, mes_sel: str, resp_occ_sel: str) -> str:
     else:
         ano_txt = str(anos_sel)
 
-    return f"Ano(s) {ano_txt} | Mês {mes_sel} | Resp ocorrência {resp_occ_sel}"
+    txt = f"Ano(s) {ano_txt} | Mês {mes_sel} | Resp ocorrência {resp_occ_sel}"
+    if periodo is not None:
+        txt += f" | Período {br_date_str(periodo[0])} a {br_date_str(periodo[1])}"
+    if busca:
+        txt += f' | Busca "{busca}"'
+    return txt
 
 
 def semana_do_mes(dt_series: pd.Series) -> pd.Series:
@@ -179,10 +361,20 @@ def semana_do_mes(dt_series: pd.Series) -> pd.Series:
     return ((d.dt.day - 1) // 7 + 1).astype("Int64")
 
 
+def fragmento(func):
+    """Painel reexecutável sozinho (st.fragment): interação dentro dele só
+    reexecuta o painel. Streamlit sem fragmentos: o painel roda inline."""
+    deco = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+    return deco(func) if deco is not None else func
+
+
 # =========================================================
 # Excel helpers
 # =========================================================
+# openpyxl: import tardio dentro de cada função (1ª exportação, não a subida)
 def _excel_theme():
+    from openpyxl.styles import Font, PatternFill, Side
+
     return {
         "title_fill": PatternFill("solid", fgColor="1F4E79"),
         "hdr_fill": PatternFill("solid", fgColor="2F5597"),
@@ -206,6 +398,8 @@ def _set_col_widths(ws, widths: dict):
 
 
 def _apply_border(ws, cell_range: str):
+    from openpyxl.styles import Border
+
     th = _excel_theme()["thin"]
     border = Border(left=th, right=th, top=th, bottom=th)
     for row in ws[cell_range]:
@@ -214,6 +408,8 @@ def _apply_border(ws, cell_range: str):
 
 
 def _merge_title(ws, cell_range: str, text: str):
+    from openpyxl.styles import Font, Alignment
+
     theme = _excel_theme()
     ws.merge_cells(cell_range)
     c = ws[cell_range.split(":")[0]]
@@ -224,6 +420,10 @@ def _merge_title(ws, cell_range: str, text: str):
 
 
 def _add_table(ws, start_row, start_col, df: pd.DataFrame, table_name: str, style="TableStyleMedium9"):
+    from openpyxl.utils.dataframe import dataframe_to_rows
+    from openpyxl.styles import Alignment
+    from openpyxl.worksheet.table import Table, TableStyleInfo
+
     for r_idx, row in enumerate(dataframe_to_rows(df, index=False, header=True), start=start_row):
         for c_idx, v in enumerate(row, start=start_col):
             ws.cell(row=r_idx, column=c_idx, value=v)
@@ -255,7 +455,9 @@ def _hex_no_hash(hex_color: str) -> str:
     return hex_color.replace("#", "").upper()
 
 
-def _style_xl_bar_chart(chart: BarChart, rotate_x_45: bool, solid_fill_hex: str | None):
+def _style_xl_bar_chart(chart, rotate_x_45: bool, solid_fill_hex: str | None):
+    from openpyxl.chart.label import DataLabelList
+
     try:
         chart.y_axis.majorGridlines = None
         chart.y_axis.minorGridlines = None
@@ -286,7 +488,9 @@ def _style_xl_bar_chart(chart: BarChart, rotate_x_45: bool, solid_fill_hex: str
             pass
 
 
-def _style_xl_pie_chart(chart: PieChart):
+def _style_xl_pie_chart(chart):
+    from openpyxl.chart.label import DataLabelList
+
     try:
         chart.dLbls = DataLabelList()
         chart.dLbls.showPercent = True
@@ -302,6 +506,9 @@ def _add_bar_chart_from_sheet(
     height=7.2, width=12.5,
     solid_fill_hex=None
 ):
+    from openpyxl.chart import BarChart
+    from openpyxl.chart.reference import Reference
+
     chart = BarChart()
     chart.type = "col"
     chart.style = 10
@@ -319,11 +526,49 @@ def _add_bar_chart_from_sheet(
     target_ws.add_chart(chart, anchor_cell)
 
 
+def _add_stacked_bar_chart_from_sheet(
+    data_ws, target_ws,
+    title, cat_col, first_val_col, last_val_col, start_row, end_row, anchor_cell,
+    cores,
+    rotate_x_45=True,
+    height=7.2, width=16.0
+):
+    from openpyxl.chart import BarChart
+    from openpyxl.chart.reference import Reference
+
+    # Uma série por coluna (first_val_col..last_val_col), empilhadas
+    chart = BarChart()
+    chart.type = "col"
+    chart.grouping = "stacked"
+    chart.overlap = 100
+    chart.style = 10
+    chart.title = title
+    chart.height = float(height)
+    chart.width = float(width)
+
+    data = Reference(data_ws, min_col=first_val_col, max_col=last_val_col, min_row=start_row, max_row=end_row)
+    cats = Reference(data_ws, min_col=cat_col, min_row=start_row + 1, max_row=end_row)
+    chart.add_data(data, titles_from_data=True)
+    chart.set_categories(cats)
+
+    _style_xl_bar_chart(chart, rotate_x_45=rotate_x_45, solid_fill_hex=None)
+    for serie, cor in zip(chart.series, cores):
+        try:
+            serie.graphicalProperties.solidFill = _hex_no_hash(cor)
+            serie.graphicalProperties.line.solidFill = _hex_no_hash(cor)
+        except Exception:
+            pass
+    target_ws.add_chart(chart, anchor_cell)
+
+
 def _add_pie_chart_from_sheet(
     data_ws, target_ws,
     title, cat_col, val_col, start_row, end_row, anchor_cell,
     height=7.2, width=12.5
 ):
+    from openpyxl.chart import PieChart
+    from openpyxl.chart.reference import Reference
+
     chart = PieChart()
     chart.title = title
     chart.height = float(height)
@@ -341,10 +586,17 @@ def _add_pie_chart_from_sheet(
 # =========================================================
 # PDF do Dashboard (1 página) — Plotly -> PNG via kaleido
 # =========================================================
-def build_dashboard_pdf_bytes(app_name: str, filtro_txt: str, kpis: dict, figs_plotly: list) -> bytes:
+def build_dashboard_pdf_bytes(app_name: str, filtro_txt: str, kpis: dict, figs_plotly: list, gerado_em=None) -> bytes:
+    # gerado_em: data do rodapé (o cache de exportações guarda o PDF por dia)
+    # import tardio (reportlab; o kaleido já só carrega no fig.to_image)
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.utils import ImageReader
+
+    gerado_em = pd.Timestamp.today() if gerado_em is None else pd.Timestamp(gerado_em)
     img_bytes_list = []
     for fig in figs_plotly:
-        b = fig.to_image(format="png", scale=2)
+        b = _fig_png_cached(_fig_to_spec(fig))
         img_bytes_list.append(io.BytesIO(b))
 
     out = io.BytesIO()
@@ -360,20 +612,26 @@ def build_dashboard_pdf_bytes(app_name: str, filtro_txt: str, kpis: dict, figs_p
     content_h = content_top - content_bottom
     content_w = W - 2 * margin
 
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(margin, H - margin - 22, f"{app_name} — Dashboard")
+    def _cabecalho_rodape():
+        c.setFont("Helvetica-Bold", 16)
+        c.drawString(margin, H - margin - 22, f"{app_name} — Dashboard")
 
-    c.setFont("Helvetica", 9)
-    c.drawString(margin, H - margin - 40, f"Filtro: {filtro_txt[:180]}")
+        c.setFont("Helvetica", 9)
+        c.drawString(margin, H - margin - 40, f"Filtro: {filtro_txt[:180]}")
 
-    c.setFont("Helvetica-Bold", 10)
-    kpi_line = (
-        f"Total: {kpis.get('total', 0)}   |   "
-        f"Em atraso: {kpis.get('atras', 0)}   |   "
-        f"Período: {kpis.get('periodo', '-')}   |   "
-        f"Versão: {APP_VERSION}"
-    )
-    c.drawString(margin, H - margin - 58, kpi_line)
+        c.setFont("Helvetica-Bold", 10)
+        kpi_line = (
+            f"Total: {kpis.get('total', 0)}   |   "
+            f"Em atraso: {kpis.get('atras', 0)}   |   "
+            f"Período: {kpis.get('periodo', '-')}   |   "
+            f"Versão: {APP_VERSION}"
+        )
+        c.drawString(margin, H - margin - 58, kpi_line)
+
+        c.setFont("Helvetica", 8)
+        c.drawRightString(W - margin, margin / 2, f"Gerado em {gerado_em.strftime('%d/%m/%Y')}")
+
+    _cabecalho_rodape()
 
     gap = 12
     cell_w = (content_w - gap) / 2
@@ -388,8 +646,12 @@ def build_dashboard_pdf_bytes(app_name: str, filtro_txt: str, kpis: dict, figs_p
         img = ImageReader(img_bytes_list[i])
         c.drawImage(img, x, y, width=cell_w, height=cell_h, preserveAspectRatio=True, anchor="c")
 
-    c.setFont("Helvetica", 8)
-    c.drawRightString(W - margin, margin / 2, f"Gerado em {pd.Timestamp.now().strftime('%d/%m/%Y %H:%M')}")
+    # Gráficos além dos 4 da grade: uma página cada, mesmo cabeçalho
+    for extra in img_bytes_list[len(positions):]:
+        c.showPage()
+        _cabecalho_rodape()
+        c.drawImage(ImageReader(extra), margin, content_bottom, width=content_w, height=content_h,
+                    preserveAspectRatio=True, anchor="c")
 
     c.showPage()
     c.save()
@@ -400,66 +662,871 @@ def build_dashboard_pdf_bytes(app_name: str, filtro_txt: str, kpis: dict, figs_p
 # =========================================================
 # Carregamento e filtros
 # =========================================================
-@st.cache_data(show_spinner=False)
-def carregar_df(upload_bytes: bytes, sheet_name: str) -> pd.DataFrame:
-    df = pd.read_excel(io.BytesIO(upload_bytes), sheet_name=sheet_name)
+def _bytes_digest(b: bytes) -> str:
+    return hashlib.sha256(b).hexdigest()
 
-    obrig = [COL_CODIGO, COL_TITULO, COL_STATUS, COL_DATA, COL_MOTIVO]
-    for c in obrig:
+
+def _ident_last_upload() -> str:
+    # muda quando o último arquivo salvo é trocado (lido antes dos bytes)
+    try:
+        info = LAST_FILE.stat()
+        return f"salvo:{info.st_size}:{info.st_mtime_ns}"
+    except OSError:
+        return "salvo"
+
+
+def digest_sessao(conteudo: bytes, ident: str) -> str:
+    """sha256 do arquivo calculado 1x por arquivo na sessão, não a cada rerun.
+    `ident`: file_id do upload ou _ident_last_upload()."""
+    guardados = st.session_state.setdefault("_digests", {})
+    if ident not in guardados:
+        if len(guardados) >= 4:
+            guardados.clear()
+        guardados[ident] = _bytes_digest(conteudo)
+    return guardados[ident]
+
+
+def _read_excel_tipado(upload_bytes: bytes, sheet_name: str):
+    # texto/categoria já saem como string do leitor (sem inferência por coluna)
+    dtype = {c: str for c, t in SCHEMA_QUALIEX.items() if t in ("texto", "categoria")}
+    # só célula vazia é ausente; o texto "nan"/"NA" de uma célula é mantido
+    na = {c: [""] for c, t in SCHEMA_QUALIEX.items() if t not in ("texto", "categoria")}
+    kw = {"sheet_name": sheet_name, "dtype": dtype, "keep_default_na": False, "na_values": na}
+    if EXCEL_ENGINE is not None:
+        try:
+            return pd.read_excel(io.BytesIO(upload_bytes), engine=EXCEL_ENGINE, **kw), EXCEL_ENGINE
+        except ValueError as e:
+            # pandas antigo sem o motor calamine: cai no padrão; aba inexistente etc. sobe
+            if "engine" not in str(e).lower():
+                raise
+    return pd.read_excel(io.BytesIO(upload_bytes), **kw), "openpyxl"
+
+
+def _parse_datas(s: pd.Series, rel: dict) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(s):
+        rel["datas_formato_padrao"] = int(s.notna().sum())
+        return s
+
+    # células de data do Excel já chegam como datetime; texto vai no formato exato
+    d = pd.to_datetime(s, format=DATE_FMT_BR, errors="coerce")
+    vazio = s.isna() | (s.astype(str).str.strip() == "")
+    resto = d.isna() & ~vazio
+    rel["datas_formato_padrao"] = int(d.notna().sum())
+    if resto.any():
+        # exceções (com hora, ISO...): inferência por elemento, só nessas linhas
+        d2 = pd.to_datetime(s[resto].astype(str).str.strip(), errors="coerce", dayfirst=True, format="mixed")
+        d = d.copy()
+        d[resto] = d2
+        rel["datas_fallback"] = int(d2.notna().sum())
+    return d
+
+
+def _ler_excel(upload_bytes: bytes, sheet_name: str, progresso=None, relatorio=None) -> pd.DataFrame:
+    """Lê a consulta Qualiex seguindo SCHEMA_QUALIEX.
+
+    `relatorio` (dict opcional) recebe o que foi descartado ou ajustado e por quê.
+    """
+    rel = relatorio if relatorio is not None else {}
+    if progresso:
+        progresso(0.05, "Lendo planilha")
+    df, motor = _read_excel_tipado(upload_bytes, sheet_name)
+    if progresso:
+        progresso(0.6, "Normalizando colunas")
+
+    for c in COLS_OBRIGATORIAS:
         if c not in df.columns:
             raise ValueError(f"Não encontrei a coluna obrigatória '{c}' na planilha.")
 
-    df = df.copy()
-    df[COL_DATA] = pd.to_datetime(df[COL_DATA], errors="coerce", dayfirst=True)
-    df = df.dropna(subset=[COL_DATA])
+    rel["motor"] = motor
+    rel["linhas_lidas"] = int(len(df))
+    rel["colunas_ausentes"] = [c for c in SCHEMA_QUALIEX if c not in df.columns]
+    rel["colunas_extras"] = [str(c) for c in df.columns if c not in SCHEMA_QUALIEX]
+    ajustes = {}
+
+    bruto = df[COL_DATA]
+    datas = _parse_datas(bruto, rel)
+    vazio = bruto.isna() | (bruto.astype(str).str.strip() == "")
+    rel["descartadas"] = {
+        "data vazia": int(vazio.sum()),
+        "data inválida": int((datas.isna() & ~vazio).sum()),
+    }
+    if rel.get("datas_fallback"):
+        ajustes[f"{COL_DATA}: fora de {DATE_FMT_BR}, lida por inferência"] = rel["datas_fallback"]
+    df[COL_DATA] = datas
+    df = df.loc[datas.notna().to_numpy()]
 
     for c in df.columns:
-        if df[c].dtype == "object":
-            df[c] = df[c].astype(str).str.strip().replace("nan", "")
+        tipo = SCHEMA_QUALIEX.get(c)
+        if tipo in ("texto", "categoria"):
+            v = df[c].fillna("").astype(str).str.strip()
+            if tipo == "categoria":
+                v = v.str.replace(r"\s+", " ", regex=True)
+            df[c] = v
+        elif tipo == "inteiro":
+            num = pd.to_numeric(df[c], errors="coerce")
+            invalido = num.isna() & df[c].notna() & (df[c].astype(str).str.strip() != "")
+            if invalido.any():
+                ajustes[f"{c}: não numérico -> vazio"] = int(invalido.sum())
+            df[c] = num
+        elif tipo is None and df[c].dtype == "object":
+            df[c] = df[c].fillna("").astype(str).str.strip()
 
     if COL_SITUACAO in df.columns:
         df[COL_SITUACAO] = df[COL_SITUACAO].apply(normalizar_situacao)
+        fora = ~df[COL_SITUACAO].isin(["ATRASADA", "NO PRAZO", ""])
+        if fora.any():
+            ajustes[f"{COL_SITUACAO}: fora de ATRASADA/NO PRAZO (mantido)"] = int(fora.sum())
+
+    # categoria: códigos + dicionário (memória, filtros e agrupamentos mais leves)
+    for c, tipo in SCHEMA_QUALIEX.items():
+        if tipo == "categoria" and c in df.columns:
+            df[c] = df[c].astype("category")
+
+    rel["ajustes"] = ajustes
+    rel["linhas_validas"] = int(len(df))
+    return df.reset_index(drop=True)
 
-    return df
 
+def _arrow_path(digest: str, sheet_name: str) -> Path:
+    sheet_tag = hashlib.blake2b(str(sheet_name).encode("utf-8"), digest_size=6).hexdigest()
+    return DATASET_DIR / f"{digest[:32]}_{sheet_tag}_v{DATASET_SCHEMA_VER}.arrow"
 
-def aplicar_filtros(df: pd.DataFrame, anos_sel, mes_sel, resp_occ_sel, multi_filters: dict) -> pd.DataFrame:
-    dff = df.copy()
+
+def _write_arrow(df: pd.DataFrame, path: Path, relatorio=None):
+    tbl = pa.Table.from_pandas(df, preserve_index=False)
+    # large_string: o pandas (>= 3) embrulha a coluna sem copiar o buffer mapeado
+    fields = [
+        pa.field(f.name, pa.large_string()) if pa.types.is_string(f.type) else f
+        for f in tbl.schema
+    ]
+    meta = dict(tbl.schema.metadata or {})
+    if relatorio is not None:
+        # relatório de carga vai junto do dataset (processo novo não relê o Excel)
+        meta[b"relatorio_carga"] = json.dumps(relatorio, ensure_ascii=False).encode("utf-8")
+    tbl = tbl.cast(pa.schema(fields, metadata=meta))
+
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with pa.OSFile(str(tmp), "wb") as sink:
+        with pa_ipc.new_file(sink, tbl.schema) as w:
+            w.write_table(tbl)
+    os.replace(tmp, path)  # atômico: outro processo nunca vê arquivo pela metade
+
+
+def _read_arrow_mmap(path: Path) -> pd.DataFrame:
+    # Sem "with": os buffers do DataFrame continuam apontando para o mmap
+    src = pa.memory_map(str(path), "r")
+    tbl = pa_ipc.open_file(src).read_all()
+    return tbl.to_pandas(split_blocks=True)
+
+
+def _prune_arrow_files(keep: Path):
+    try:
+        files = sorted(DATASET_DIR.glob("*.arrow"), key=lambda f: f.stat().st_mtime, reverse=True)
+        for f in files[DATASET_KEEP:]:
+            if f != keep:
+                f.unlink()
+    except Exception:
+        pass
+
+
+def _materializar_base(digest: str, sheet_name: str, upload_bytes: bytes, progresso=None, relatorio=None) -> pd.DataFrame:
+    # Parse + Arrow mapeado; sem chamadas st.* (roda também na thread de ingestão)
+    if pa is None:
+        return _ler_excel(upload_bytes, sheet_name, progresso, relatorio)
+
+    path = _arrow_path(digest, sheet_name)
+    if not path.exists():
+        rel = relatorio if relatorio is not None else {}
+        df = _ler_excel(upload_bytes, sheet_name, progresso, rel)
+        if progresso:
+            progresso(0.85, "Gravando dataset (Arrow)")
+        try:
+            _write_arrow(df, path, rel)
+            _prune_arrow_files(keep=path)
+        except Exception:
+            # Se falhar (disco, tipo não suportado...), segue com o DataFrame em memória
+            return df
+
+    try:
+        os.utime(path)  # marca uso recente (poda por mtime)
+    except Exception:
+        pass
+    return _read_arrow_mmap(path)
+
+
+@st.cache_resource(show_spinner=False, max_entries=BASE_CACHE_MAX)
+def _carregar_base(digest: str, sheet_name: str, _upload_bytes: bytes) -> pd.DataFrame:
+    # Um único DataFrame por (digest, aba), compartilhado por TODAS as sessões.
+    # É somente leitura: ninguém escreve nele (recortes usam máscara).
+    job = _ingest_registry()["jobs"].get(_ingest_key(digest, sheet_name))
+    if job is not None and job.get("df") is not None:
+        # já materializado pela thread de ingestão: só assume a referência
+        df = job["df"]
+        job["df"] = None
+        return df
+    return _materializar_base(digest, sheet_name, _upload_bytes)
+
+
+def carregar_df(upload_bytes: bytes, sheet_name: str, digest: str | None = None) -> pd.DataFrame:
+    return _carregar_base(digest or _bytes_digest(upload_bytes), sheet_name, upload_bytes)
+
+
+def relatorio_carga(digest: str, sheet_name: str) -> dict:
+    """O que a leitura descartou/ajustou: do job de ingestão ou dos metadados do Arrow."""
+    job = _ingest_registry()["jobs"].get(_ingest_key(digest, sheet_name))
+    if job is not None and job.get("relatorio"):
+        return job["relatorio"]
+    if pa is None:
+        return {}
+    try:
+        with pa.memory_map(str(_arrow_path(digest, sheet_name)), "r") as src:
+            meta = pa_ipc.open_file(src).schema.metadata or {}
+        return json.loads(meta.get(b"relatorio_carga", b"{}").decode("utf-8"))
+    except Exception:
+        return {}
+
+
+# =========================================================
+# Ingestão em segundo plano
+# - O parse do Excel roda numa thread; a página não trava (nem a de outros
+#   usuários) e continua mostrando o dataset anterior (.last_input)
+# - Quando termina, o último arquivo é trocado de forma atômica
+# =========================================================
+@st.cache_resource(show_spinner=False)
+def _ingest_registry() -> dict:
+    # Compartilhado pelo processo: {"lock": Lock, "jobs": {chave: job}}
+    return {"lock": threading.Lock(), "jobs": {}}
+
+
+def _ingest_key(digest: str, sheet_name: str) -> str:
+    return f"{digest}|{sheet_name}"
+
+
+def _ingest_worker(job: dict, upload_bytes: bytes):
+    def progresso(frac: float, etapa: str):
+        job["progress"] = float(frac)
+        job["stage"] = etapa
+
+    try:
+        job["df"] = _materializar_base(job["digest"], job["sheet"], upload_bytes, progresso, job["relatorio"])
+        # entrega ao cache da base aqui mesmo: o registro não segura o DataFrame
+        _carregar_base(job["digest"], job["sheet"], upload_bytes)
+        _save_last_upload(upload_bytes, job["filename"], job["sheet"], job["digest"])
+        progresso(1.0, "Pronto")
+        job["status"] = "done"
+    except Exception as e:
+        job["error"] = str(e)
+        job["status"] = "error"
+    finally:
+        job["df"] = None
+
+
+def iniciar_ingestao(upload_bytes: bytes, filename: str, sheet_name: str, tentativa: str | None = None, digest: str | None = None) -> dict:
+    """Dispara (uma vez por digest/aba) o processamento do Excel e devolve o job.
+
+    job["status"]: "running" / "done" / "error"; job["progress"] vai de 0 a 1.
+    `tentativa` identifica o pedido (novo upload, "Tentar novamente"): um job
+    que terminou em erro é descartado e refeito quando chega outra tentativa.
+    `digest`: sha256 já calculado (digest_sessao); None -> calcula.
+    """
+    digest = digest or _bytes_digest(upload_bytes)
+    key = _ingest_key(digest, sheet_name)
+    reg = _ingest_registry()
+
+    with reg["lock"]:
+        job = reg["jobs"].get(key)
+        if job is not None:
+            if job["status"] != "error" or tentativa is None or job["tentativa"] == tentativa:
+                return job
+            reg["jobs"].pop(key, None)
+
+        job = {
+            "digest": digest,
+            "sheet": sheet_name,
+            "filename": filename or "ultimo.xlsx",
+            "status": "running",
+            "progress": 0.0,
+            "stage": "Na fila",
+            "error": "",
+            "df": None,
+            "relatorio": {},
+            "tentativa": tentativa,
+        }
+
+        # Arrow já existe (outro processo/sessão já processou): pronto na hora
+        if pa is not None and _arrow_path(digest, sheet_name).exists():
+            job["status"] = "done"
+            job["progress"] = 1.0
+            job["stage"] = "Pronto"
+            meta = _load_last_meta()
+            if meta.get("digest") != digest or meta.get("sheet") != sheet_name:
+                _save_last_upload(upload_bytes, job["filename"], sheet_name, digest)
+        else:
+            threading.Thread(target=_ingest_worker, args=(job, upload_bytes), daemon=True).start()
+
+        reg["jobs"][key] = job
+        # poda jobs antigos já finalizados
+        done = [k for k, j in reg["jobs"].items() if j["status"] != "running"]
+        for k in done[:-INGEST_KEEP]:
+            reg["jobs"].pop(k, None)
+    return job
+
+
+def _acompanhar_ingestao(job: dict):
+    if job["status"] != "running":
+        st.rerun()
+    st.progress(job["progress"], text=f"Processando {job['filename']}: {job['stage']}…")
+
+
+if hasattr(st, "fragment"):
+    # só este trecho reexecuta a cada INGEST_POLL_S; o painel segue utilizável
+    _acompanhar_ingestao = st.fragment(run_every=INGEST_POLL_S)(_acompanhar_ingestao)
+
+
+def _recorte(df: pd.DataFrame, mask) -> pd.DataFrame:
+    # Sem filtro efetivo devolve o próprio dataset (zero cópia); com filtro, a
+    # máscara copia as linhas do recorte. Ninguém escreve num recorte (nem na
+    # base compartilhada): o app não depende de mode.copy_on_write
+    if mask is None or bool(np.all(mask)):
+        return df
+    return df[mask]
+
+
+def aplicar_filtros(df: pd.DataFrame, anos_sel, mes_sel, resp_occ_sel, multi_filters: dict, periodo=None, linhas=None) -> pd.DataFrame:
+    # Monta uma máscara única (nada de df.copy() por etapa) e materializa no fim
+    mask = np.ones(len(df), dtype=bool)
 
     # anos_sel: lista de anos selecionados (multi-seleção)
     if anos_sel is not None:
         anos_list = [int(a) for a in anos_sel if str(a).strip() != ""]
         if len(anos_list) == 0:
-            return dff.iloc[0:0]
+            return df.iloc[0:0]
         # se não selecionou TODOS os anos, filtra
-        anos_disponiveis = sorted(dff[COL_DATA].dt.year.dropna().unique().tolist())
+        anos_disponiveis = sorted(df[COL_DATA].dt.year.dropna().unique().tolist())
         if len(anos_list) != len(anos_disponiveis):
-            dff = dff[dff[COL_DATA].dt.year.isin(anos_list)]
+            mask &= df[COL_DATA].dt.year.isin(anos_list).to_numpy()
 
     if mes_sel != "(Todos)":
         mes_num = INV_MESES_ABREV.get(mes_sel)
         if mes_num:
-            dff = dff[dff[COL_DATA].dt.month == int(mes_num)]
+            mask &= (df[COL_DATA].dt.month == int(mes_num)).to_numpy()
 
-    if resp_occ_sel != "(Todos)" and COL_RESP_OCORRENCIA in dff.columns:
-        dff = dff[dff[COL_RESP_OCORRENCIA].astype(str) == resp_occ_sel]
+    if resp_occ_sel != "(Todos)" and COL_RESP_OCORRENCIA in df.columns:
+        mask &= (df[COL_RESP_OCORRENCIA].astype(str) == resp_occ_sel).to_numpy()
+
+    # periodo: (início, fim) em datas, ambos inclusivos
+    if periodo is not None:
+        ini = pd.Timestamp(periodo[0]).normalize()
+        fim_excl = pd.Timestamp(periodo[1]).normalize() + pd.Timedelta(days=1)
+        mask &= ((df[COL_DATA] >= ini) & (df[COL_DATA] < fim_excl)).to_numpy()
+
+    # linhas: posições (no dataset base) vindas da busca textual
+    if linhas is not None:
+        sel = np.zeros(len(df), dtype=bool)
+        sel[linhas] = True
+        mask &= sel
 
     for col, selecionados in multi_filters.items():
-        if col not in dff.columns:
+        if col not in df.columns:
             continue
         if not selecionados:
-            return dff.iloc[0:0]
-        dff = dff[dff[col].astype(str).isin(selecionados)]
+            return df.iloc[0:0]
+        mask &= df[col].astype(str).isin(selecionados).to_numpy()
+
+    return _recorte(df, mask)
+
+
+def _valores_distintos(s: pd.Series) -> list:
+    vals = sorted(s.dropna().astype(str).unique().tolist())
+    return [v for v in vals if v != ""]
+
+
+def _rotulos(s: pd.Series, vazio: str) -> pd.Series:
+    """Valores como texto, com vazio/NaN trocados por `vazio` (categoria ou str)."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # troca feita no dicionário; código -1 (NaN) cai no último item, `vazio`
+        cats = np.append(s.cat.categories.astype(str).to_numpy(dtype=object), vazio)
+        cats[cats == ""] = vazio
+        return pd.Series(cats[s.cat.codes.to_numpy()], index=s.index, name=s.name)
+    return s.fillna("").replace("", vazio).astype(str)
+
+
+@st.cache_resource(show_spinner=False, max_entries=BASE_CACHE_MAX)
+def opcoes_filtros(base_key: str, _df: pd.DataFrame) -> dict:
+    """Opções dos filtros (anos >= 2025, Resp. ocorrência, filtros por marcar),
+    1x por dataset."""
+    anos_all = sorted(_df[COL_DATA].dt.year.dropna().unique().tolist())
+    return {
+        "anos": [a for a in anos_all if int(a) >= 2025],
+        "resp": _valores_distintos(_df[COL_RESP_OCORRENCIA]) if COL_RESP_OCORRENCIA in _df.columns else [],
+        "multi": {col: _valores_distintos(_df[col]) for col in FILTROS_COLS if col in _df.columns},
+    }
+
+
+def periodo_total_base(df: pd.DataFrame, anos) -> tuple:
+    # Período livre: de 01/01 do primeiro ano analisado até a última data
+    data_min = max(df[COL_DATA].min().normalize(), pd.Timestamp(int(min(anos)), 1, 1))
+    data_max = df[COL_DATA].max().normalize()
+    return data_min.date(), data_max.date()
+
+
+# =========================================================
+# Índice temporal (somas prefixadas por dia)
+# - Montado 1x por dataset: contagem acumulada por dia, no total e por valor
+#   de motivo / responsável / situação
+# - Qualquer intervalo de datas vira 2 consultas: cum[fim + 1] - cum[início]
+# - Vale para a visão padrão dos "Filtros por marcar" (todos marcados), que já
+#   exclui linhas com valor vazio nessas colunas
+# =========================================================
+def _mask_filtros_padrao(df: pd.DataFrame) -> np.ndarray:
+    mask = np.ones(len(df), dtype=bool)
+    for col in FILTROS_COLS:
+        if col in df.columns:
+            s = df[col]
+            mask &= (s.notna() & (s.astype(str) != "")).to_numpy()
+    return mask
+
+
+def _cum_1d(dias: np.ndarray, n_dias: int) -> np.ndarray:
+    cum = np.zeros(n_dias + 1, dtype=np.int64)
+    np.cumsum(np.bincount(dias, minlength=n_dias), out=cum[1:])
+    return cum
+
+
+def _cum_2d(codes: np.ndarray, dias: np.ndarray, n_vals: int, n_dias: int) -> np.ndarray:
+    c = np.bincount(codes * n_dias + dias, minlength=n_vals * n_dias).reshape(n_vals, n_dias)
+    cum = np.zeros((n_vals, n_dias + 1), dtype=np.int32)
+    np.cumsum(c, axis=1, out=cum[:, 1:])
+    return cum
+
+
+def construir_indice_tempo(df: pd.DataFrame):
+    dfe = _recorte(df, _mask_filtros_padrao(df))
+    if dfe.empty:
+        return None
+
+    d = dfe[COL_DATA].dt.normalize()
+    d0 = d.min()
+    n_dias = int((d.max() - d0).days) + 1
+    dias = (d - d0).dt.days.to_numpy(dtype=np.int64)
+
+    if COL_SITUACAO in dfe.columns:
+        atras_mask = (dfe[COL_SITUACAO].astype(str) == "ATRASADA").to_numpy()
+    else:
+        atras_mask = np.zeros(len(dfe), dtype=bool)
+
+    idx = {
+        "d0": d0,
+        "n": n_dias,
+        "total": _cum_1d(dias, n_dias),
+        "atras": _cum_1d(dias[atras_mask], n_dias),
+        "cats": {},       # col -> (valores, cum 2-D)
+        "atras_por": {},  # col -> (valores, cum 2-D só das ATRASADAS)
+    }
+
+    for col in TIME_INDEX_COLS:
+        if col not in dfe.columns:
+            continue
+        codes, uniq = pd.factorize(dfe[col].astype(str), sort=True)
+        if len(uniq) * n_dias > TIME_INDEX_MAX_CELLS:
+            continue
+        vals = [str(v) for v in uniq]
+        idx["cats"][col] = (vals, _cum_2d(codes, dias, len(vals), n_dias))
+        if col == COL_RESP_ANALISE:
+            idx["atras_por"][col] = (vals, _cum_2d(codes[atras_mask], dias[atras_mask], len(vals), n_dias))
+
+    return idx
+
+
+@st.cache_resource(show_spinner=False, max_entries=BASE_CACHE_MAX)
+def indice_tempo(base_key: str, _df: pd.DataFrame):
+    return construir_indice_tempo(_df)
+
+
+def _faixa_dias(tidx: dict, ini, fim):
+    # (ini, fim) inclusivos -> posições [lo, hi) no vetor acumulado
+    lo = int((pd.Timestamp(ini).normalize() - tidx["d0"]).days)
+    hi = int((pd.Timestamp(fim).normalize() - tidx["d0"]).days) + 1
+    lo = min(max(lo, 0), tidx["n"])
+    hi = min(max(hi, lo), tidx["n"])
+    return lo, hi
+
+
+def contar_periodo(tidx: dict, ini, fim, atrasadas: bool = False) -> int:
+    cum = tidx["atras"] if atrasadas else tidx["total"]
+    lo, hi = _faixa_dias(tidx, ini, fim)
+    return int(cum[hi] - cum[lo])
+
+
+def contar_periodo_por(tidx: dict, col: str, ini, fim, atrasadas: bool = False):
+    # Série valor -> contagem no intervalo (só valores com contagem > 0, sem
+    # ordenar: quem usa fica com os k maiores), ou None
+    fonte = tidx["atras_por"] if atrasadas else tidx["cats"]
+    if col not in fonte:
+        return None
+    vals, cum = fonte[col]
+    lo, hi = _faixa_dias(tidx, ini, fim)
+    cont = pd.Series(cum[:, hi] - cum[:, lo], index=vals, dtype="int64")
+    return cont[cont > 0]
+
+
+def extremos_periodo(tidx: dict, ini, fim):
+    # Primeira e última data com ocorrência dentro do intervalo (busca binária)
+    cum = tidx["total"]
+    lo, hi = _faixa_dias(tidx, ini, fim)
+    if cum[hi] == cum[lo]:
+        return None, None
+    primeiro = int(np.searchsorted(cum, cum[lo], side="right")) - 1
+    ultimo = int(np.searchsorted(cum, cum[hi], side="left")) - 1
+    d0 = tidx["d0"]
+    return d0 + pd.Timedelta(days=primeiro), d0 + pd.Timedelta(days=ultimo)
+
+
+def _contar_faixas(tidx: dict, inicios: pd.DatetimeIndex, fins_excl: pd.DatetimeIndex, periodo) -> np.ndarray:
+    # Contagem de várias faixas [início, fim) de uma vez, recortadas pelo período
+    d0, n = tidx["d0"], tidx["n"]
+    p_lo = int((pd.Timestamp(periodo[0]).normalize() - d0).days)
+    p_hi = int((pd.Timestamp(periodo[1]).normalize() - d0).days) + 1
+    lo = np.clip(np.maximum(np.asarray((inicios - d0).days), p_lo), 0, n)
+    hi = np.clip(np.minimum(np.asarray((fins_excl - d0).days), p_hi), 0, n)
+    hi = np.maximum(hi, lo)
+    cum = tidx["total"]
+    return cum[hi] - cum[lo]
+
+
+def _contagens_indice(tidx: dict, periodo, chave: str, ano=None, mes=None) -> pd.Series:
+    # Mesmo formato do groupby por data (ver _contagens_datas), via índice
+    ini = pd.Timestamp(periodo[0]).normalize()
+    fim = pd.Timestamp(periodo[1]).normalize()
+    if ano is not None:
+        ini = max(ini, pd.Timestamp(int(ano), 1, 1))
+        fim = min(fim, pd.Timestamp(int(ano), 12, 31))
+    if mes is not None:
+        base_mes = pd.Timestamp(ini.year, int(mes), 1)
+        ini = max(ini, base_mes)
+        fim = min(fim, base_mes + pd.offsets.MonthEnd(0))
+    if ini > fim:
+        return pd.Series(dtype="int64")
+    per = (ini, fim)
+
+    if chave == "ano":
+        anos_r = pd.date_range(pd.Timestamp(ini.year, 1, 1), fim, freq="YS")
+        cont = _contar_faixas(tidx, anos_r, anos_r + pd.offsets.YearBegin(1), per)
+        g = pd.Series(cont, index=anos_r.year)
+        return g[g > 0]
+
+    if chave == "semana":
+        inicio_mes = pd.Timestamp(ini.year, ini.month, 1)
+        inicios = pd.DatetimeIndex([inicio_mes + pd.Timedelta(days=7 * i) for i in range(5)])
+        cont = _contar_faixas(tidx, inicios, inicios + pd.Timedelta(days=7), per)
+        return pd.Series(cont, index=range(1, 6))
+
+    meses_r = pd.date_range(pd.Timestamp(ini.year, ini.month, 1), fim, freq="MS")
+    cont = _contar_faixas(tidx, meses_r, meses_r + pd.offsets.MonthBegin(1), per)
+    if chave == "mes_ano":
+        g = pd.Series(cont, index=pd.MultiIndex.from_arrays([meses_r.year, meses_r.month]))
+        return g[g > 0]
+    # "mes": soma por mês do ano
+    return pd.Series(cont, index=meses_r.month).groupby(level=0).sum()
+
+
+def _contagens_datas(d: pd.Series, chave: str, ano=None, mes=None) -> pd.Series:
+    if ano is not None:
+        d = d[d.dt.year == int(ano)]
+    if mes is not None:
+        d = d[d.dt.month == int(mes)]
+    if chave == "ano":
+        return d.groupby(d.dt.year).size().sort_index()
+    if chave == "mes_ano":
+        return d.groupby([d.dt.year, d.dt.month]).size().sort_index()
+    if chave == "mes":
+        return d.groupby(d.dt.month).size()
+    return d.groupby(semana_do_mes(d)).size()
+
+
+def periodo_drill(periodo, anos_sel, mes_sel: str, drill=None):
+    """Período (início, fim) equivalente a apply_drill_filters, ou None se o drill
+    não for um intervalo contínuo (mês clicado valendo para vários anos).
+
+    `drill`: (nível, ano, mês) explícito; None lê o drill da sessão.
+    """
+    _, drill_year, drill_month = drill_atual() if drill is None else drill
+    ini = pd.Timestamp(periodo[0]).normalize()
+    fim = pd.Timestamp(periodo[1]).normalize()
+
+    if drill_year is not None and (isinstance(anos_sel, (list, tuple, set)) and len(anos_sel) > 1):
+        y = int(drill_year)
+        ini = max(ini, pd.Timestamp(y, 1, 1))
+        fim = min(fim, pd.Timestamp(y, 12, 31))
+
+    if mes_sel == "(Todos)" and drill_month is not None:
+        if ini.year != fim.year:
+            return None
+        base_mes = pd.Timestamp(ini.year, int(drill_month), 1)
+        ini = max(ini, base_mes)
+        fim = min(fim, base_mes + pd.offsets.MonthEnd(0))
+
+    return ini, fim
+
+
+# =========================================================
+# Busca textual (Título / Descrição)
+# - Índice invertido montado 1x por dataset: token -> linhas (CSR: offsets +
+#   posições ordenadas), texto sem acento e em minúsculas
+# - Trigramas do vocabulário resolvem buscas parciais ("embal" -> "embalagem")
+#   sem varrer as linhas; termos curtos (< 3) varrem só o vocabulário. Em todos
+#   os casos o termo casa com qualquer trecho da palavra ("ab" acha "rabo")
+# - Vários termos: interseção (todos precisam aparecer)
+# =========================================================
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalizar_texto(txt: str) -> str:
+    # "Reclamação" -> "reclamacao" (NFKD + descarta o que não é ASCII)
+    return unicodedata.normalize("NFKD", str(txt)).encode("ascii", "ignore").decode("ascii").lower()
+
+
+def _normalizar_serie_texto(s: pd.Series) -> pd.Series:
+    # mesma regra de normalizar_texto, vetorizada
+    return (
+        s.fillna("").astype(str)
+        .str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+        .str.lower()
+    )
+
+
+def _tokens_por_linha(df: pd.DataFrame):
+    """Tokens de Título + Descrição achatados: (linhas, códigos, vocabulário), na
+    ordem em que aparecem no texto; None se não há colunas de texto."""
+    cols = [c for c in TEXT_SEARCH_COLS if c in df.columns]
+    if not cols or df.empty:
+        return None
+
+    texto = _normalizar_serie_texto(df[cols[0]])
+    for c in cols[1:]:
+        texto = texto + " " + _normalizar_serie_texto(df[c])
+
+    toks = texto.str.findall(_TOKEN_RE).tolist()
+    lens = np.fromiter((len(t) for t in toks), dtype=np.int64, count=len(toks))
+    flat = np.fromiter(chain.from_iterable(toks), dtype=object, count=int(lens.sum()))
+    rows = np.repeat(np.arange(len(toks), dtype=np.int64), lens)
+
+    codes, vocab = pd.factorize(flat)
+    return rows, codes.astype(np.int64), np.asarray(vocab, dtype=object)
+
+
+def construir_indice_texto(df: pd.DataFrame):
+    tok = _tokens_por_linha(df)
+    if tok is None:
+        return None
+    rows, codes, vocab = tok
+    n = len(df)
+    # (token, linha) únicos, ordenados por token e depois por linha
+    chave = np.sort(codes * n + rows)
+    chave = chave[np.r_[True, chave[1:] != chave[:-1]]]
+    post_codes = chave // n
+    post_rows = (chave % n).astype(np.int32)
+    offs = np.searchsorted(post_codes, np.arange(len(vocab) + 1))
+
+    tri = {}
+    for c, tok in enumerate(vocab):
+        for t in {tok[i:i + 3] for i in range(len(tok) - 2)}:
+            tri.setdefault(t, []).append(c)
+
+    return {
+        "n": n,
+        "vocab": vocab,
+        "codigo": {tok: c for c, tok in enumerate(vocab)},
+        "offs": offs,
+        "pos": post_rows,
+        "tri": {t: np.asarray(cs, dtype=np.int32) for t, cs in tri.items()},
+        "vocab_txt": pd.Series(vocab, dtype=object),
+    }
+
+
+@st.cache_resource(show_spinner=False, max_entries=BASE_CACHE_MAX)
+def indice_texto(base_key: str, _df: pd.DataFrame):
+    return construir_indice_texto(_df)
 
-    return dff
+
+def _codigos_termo(tx: dict, termo: str) -> np.ndarray:
+    # Tokens do vocabulário que contêm o termo
+    if len(termo) < 3:
+        # sem trigrama: mesma regra (trecho da palavra), varrendo o vocabulário
+        return np.flatnonzero(tx["vocab_txt"].str.contains(termo, regex=False).to_numpy(dtype=bool))
+
+    cand = None
+    for t in {termo[i:i + 3] for i in range(len(termo) - 2)}:
+        cs = tx["tri"].get(t)
+        if cs is None:
+            return np.empty(0, dtype=np.int64)
+        cand = cs if cand is None else np.intersect1d(cand, cs, assume_unique=True)
+    vocab = tx["vocab"]
+    return np.asarray([c for c in cand if termo in vocab[c]], dtype=np.int64)
+
+
+def buscar_texto(tx: dict, consulta: str):
+    """Posições (no dataset base) das linhas que contêm todos os termos, ou None sem busca."""
+    termos = _TOKEN_RE.findall(normalizar_texto(consulta or ""))
+    if not termos:
+        return None
+    if tx is None:
+        return np.empty(0, dtype=np.int64)
+
+    offs, pos = tx["offs"], tx["pos"]
+    resultado = None
+    for termo in dict.fromkeys(termos):
+        cs = _codigos_termo(tx, termo)
+        if len(cs) == 0:
+            return np.empty(0, dtype=np.int64)
+        linhas = pos[offs[cs[0]]:offs[cs[0] + 1]]
+        if len(cs) > 1:
+            linhas = np.unique(np.concatenate([pos[offs[c]:offs[c + 1]] for c in cs]))
+        resultado = linhas if resultado is None else np.intersect1d(resultado, linhas, assume_unique=True)
+        if len(resultado) == 0:
+            break
+    return resultado.astype(np.int64)
+
+
+# =========================================================
+# Duplicatas (MinHash + LSH)
+# - A mesma reclamação aberta várias vezes com Título/Descrição parecidos
+# - Assinatura MinHash (DUP_NUM_PERM hashes) sobre bigramas de palavras
+# - LSH: DUP_BANDS faixas; só quem cai no mesmo balde (mesmo Cliente) vira par
+#   candidato, sem comparar todos contra todos
+# - Pares confirmados pela similaridade estimada viram grupos (componentes
+#   conexas); em cada grupo fica a ocorrência mais antiga
+# =========================================================
+def _minhash_assinaturas(df: pd.DataFrame):
+    tok = _tokens_por_linha(df)
+    n = len(df)
+    sig = np.full((n, DUP_NUM_PERM), np.iinfo(np.uint32).max, dtype=np.uint32)
+    if tok is None:
+        return sig, np.zeros(n, dtype=bool)
+    rows, codes, vocab = tok
+    v = np.int64(len(vocab))
+
+    # bigramas de palavras consecutivas da mesma linha; linha com 1 palavra usa a própria
+    mesma = rows[:-1] == rows[1:]
+    sh_rows = np.concatenate([rows[:-1][mesma], rows])
+    sh_ids = np.concatenate([codes[:-1][mesma] * v + codes[1:][mesma], v * v + codes])
+    n_bi = np.bincount(rows[:-1][mesma], minlength=n)
+    manter = np.r_[np.ones(int(mesma.sum()), dtype=bool), n_bi[rows] == 0]
+    sh_rows, sh_ids = sh_rows[manter], sh_ids[manter]
+
+    ordem = np.argsort(sh_rows, kind="stable")
+    sh_rows, sh_ids = sh_rows[ordem], sh_ids[ordem].astype(np.uint64)
+    tem_texto = np.zeros(n, dtype=bool)
+    if len(sh_rows) == 0:
+        return sig, tem_texto
+    inicio = np.flatnonzero(np.r_[True, sh_rows[1:] != sh_rows[:-1]])
+    linhas = sh_rows[inicio]
+    tem_texto[linhas] = True
+
+    # hashing multiplicativo (a*x + b) >> 32, em uint64 com overflow proposital
+    rng = np.random.default_rng(DUP_SEED)
+    a = rng.integers(1, 2**63, size=DUP_NUM_PERM, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2**63, size=DUP_NUM_PERM, dtype=np.uint64)
+    x = sh_ids * np.uint64(0x9E3779B97F4A7C15)  # espalha os ids antes
+    with np.errstate(over="ignore"):
+        for k in range(DUP_NUM_PERM):
+            h = ((a[k] * x + b[k]) >> np.uint64(32)).astype(np.uint32)
+            sig[linhas, k] = np.minimum.reduceat(h, inicio)
+    return sig, tem_texto
+
+
+def _componentes(n: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    # Rótulo = menor posição do grupo (propagação de mínimo + salto de ponteiro)
+    lab = np.arange(n, dtype=np.int64)
+    if len(i) == 0:
+        return lab
+    while True:
+        m = np.minimum(lab[i], lab[j])
+        novo = lab.copy()
+        np.minimum.at(novo, i, m)
+        np.minimum.at(novo, j, m)
+        novo = novo[novo]
+        if np.array_equal(novo, lab):
+            return lab
+        lab = novo
+
+
+def construir_duplicatas(df: pd.DataFrame) -> dict:
+    n = len(df)
+    sig, tem_texto = _minhash_assinaturas(df)
+    if COL_CLIENTE in df.columns:
+        cliente = pd.factorize(df[COL_CLIENTE].astype(str))[0].astype(np.int64)
+    else:
+        cliente = np.zeros(n, dtype=np.int64)
+
+    cand = np.flatnonzero(tem_texto)
+    r = DUP_NUM_PERM // DUP_BANDS
+    pares_i, pares_j = [], []
+    for band in range(DUP_BANDS):
+        # chave do balde: hash 64 bits da faixa + cliente (colisão rara e o par
+        # ainda passa pela verificação de similaridade)
+        balde = cliente[cand].astype(np.uint64)
+        with np.errstate(over="ignore"):
+            for c in range(band * r, (band + 1) * r):
+                balde = balde * np.uint64(0x100000001B3) ^ sig[cand, c].astype(np.uint64)
+        ordem = np.argsort(balde, kind="stable")
+        b_ord = balde[ordem]
+        mesmo = b_ord[1:] == b_ord[:-1]
+        # vizinhos no balde (cadeia): limita o custo de baldes muito grandes
+        pares_i.append(cand[ordem[:-1][mesmo]])
+        pares_j.append(cand[ordem[1:][mesmo]])
+        # baldes pequenos: completa com os demais pares do balde
+        ini = np.flatnonzero(np.r_[True, ~mesmo])
+        tam = np.diff(np.r_[ini, len(b_ord)])
+        for s0, t in zip(ini[(tam > 2) & (tam <= DUP_MAX_BUCKET)], tam[(tam > 2) & (tam <= DUP_MAX_BUCKET)]):
+            membros = cand[ordem[s0:s0 + t]]
+            ii, jj = np.triu_indices(t, k=2)
+            pares_i.append(membros[ii])
+            pares_j.append(membros[jj])
+
+    i = np.concatenate(pares_i) if pares_i else np.empty(0, dtype=np.int64)
+    j = np.concatenate(pares_j) if pares_j else np.empty(0, dtype=np.int64)
+    if len(i):
+        par = np.unique(np.minimum(i, j) * n + np.maximum(i, j))
+        i, j = par // n, par % n
+        sim = (sig[i] == sig[j]).mean(axis=1)
+        i, j = i[sim >= DUP_LIMIAR], j[sim >= DUP_LIMIAR]
+
+    grupo = _componentes(n, i, j)
+
+    # representante: a mais antiga de cada grupo (empate: menor posição)
+    datas = df[COL_DATA].to_numpy()
+    ordem = np.lexsort((np.arange(n), datas, grupo))
+    primeiro = np.r_[True, grupo[ordem][1:] != grupo[ordem][:-1]]
+    manter = np.zeros(n, dtype=bool)
+    manter[ordem[primeiro]] = True
+
+    tam_grupo = np.bincount(grupo, minlength=n)
+    return {
+        "assinaturas": sig,
+        "grupo": grupo,
+        "manter": manter,
+        "tam_grupo": tam_grupo[grupo],
+        "n_grupos": int((tam_grupo > 1).sum()),
+        "n_colapsadas": int(n - manter.sum()),
+    }
+
+
+@st.cache_resource(show_spinner=False, max_entries=BASE_CACHE_MAX)
+def duplicatas(base_key: str, _df: pd.DataFrame) -> dict:
+    return construir_duplicatas(_df)
 
 
 # =========================================================
 # Drilldown + seleção da tabela
 # =========================================================
+# (nível, ano clicado, mês clicado) sem drill; é o que init_drill_state grava
+DRILL_PADRAO = ("AUTO", None, None)
+
+
 def init_drill_state():
     if "drill_level" not in st.session_state:
-        st.session_state.drill_level = "AUTO"  # AUTO / ANO / MES / SEMANA
+        st.session_state.drill_level = DRILL_PADRAO[0]  # AUTO / ANO / MES / SEMANA
     if "drill_year" not in st.session_state:
         st.session_state.drill_year = None
     if "drill_month" not in st.session_state:
@@ -471,6 +1538,11 @@ def init_drill_state():
         st.session_state.table_focus_value = None
 
 
+def drill_atual() -> tuple:
+    # Estado do drill da sessão, para as funções que recebem `drill` explícito
+    return st.session_state.drill_level, st.session_state.drill_year, st.session_state.drill_month
+
+
 def reset_drill():
     st.session_state.drill_level = "AUTO"
     st.session_state.drill_year = None
@@ -499,29 +1571,36 @@ def resolve_initial_level(anos_sel, mes_sel: str):
 
 
 def apply_drill_filters(df_filtrado: pd.DataFrame, anos_sel, mes_sel: str) -> pd.DataFrame:
-    dff = df_filtrado.copy()
+    return filtrar_drill(df_filtrado, anos_sel, mes_sel, st.session_state.drill_year, st.session_state.drill_month)
 
-    if st.session_state.drill_year is not None and (isinstance(anos_sel, (list, tuple, set)) and len(anos_sel) > 1):
-        dff = dff[dff[COL_DATA].dt.year == int(st.session_state.drill_year)]
 
-    if mes_sel == "(Todos)" and st.session_state.drill_month is not None:
-        dff = dff[dff[COL_DATA].dt.month == int(st.session_state.drill_month)]
+def filtrar_drill(df_filtrado: pd.DataFrame, anos_sel, mes_sel: str, drill_year, drill_month) -> pd.DataFrame:
+    # Sem session_state: também roda no download adiado (outra thread)
+    mask = np.ones(len(df_filtrado), dtype=bool)
+
+    if drill_year is not None and (isinstance(anos_sel, (list, tuple, set)) and len(anos_sel) > 1):
+        mask &= (df_filtrado[COL_DATA].dt.year == int(drill_year)).to_numpy()
 
-    return dff
+    if mes_sel == "(Todos)" and drill_month is not None:
+        mask &= (df_filtrado[COL_DATA].dt.month == int(drill_month)).to_numpy()
+
+    return _recorte(df_filtrado, mask)
 
 
 def apply_table_focus(df_context: pd.DataFrame) -> pd.DataFrame:
-    lvl = st.session_state.table_focus_level
-    val = st.session_state.table_focus_value
+    return filtrar_foco(df_context, st.session_state.table_focus_level, st.session_state.table_focus_value)
+
+
+def filtrar_foco(df_context: pd.DataFrame, lvl, val) -> pd.DataFrame:
     if not lvl or val is None:
         return df_context
 
-    dff = df_context.copy()
+    mask = None
 
     if lvl == "ANO":
         try:
             y = int(val)
-            dff = dff[dff[COL_DATA].dt.year == y]
+            mask = (df_context[COL_DATA].dt.year == y).to_numpy()
         except Exception:
             return df_context
 
@@ -529,7 +1608,7 @@ def apply_table_focus(df_context: pd.DataFrame) -> pd.DataFrame:
         try:
             m = INV_MESES_ABREV.get(str(val))
             if m:
-                dff = dff[dff[COL_DATA].dt.month == int(m)]
+                mask = (df_context[COL_DATA].dt.month == int(m)).to_numpy()
         except Exception:
             return df_context
 
@@ -541,7 +1620,8 @@ def apply_table_focus(df_context: pd.DataFrame) -> pd.DataFrame:
                 m = INV_MESES_ABREV.get(mes_ab.strip())
                 y = int(ano_txt.strip())
                 if m:
-                    dff = dff[(dff[COL_DATA].dt.year == y) & (dff[COL_DATA].dt.month == int(m))]
+                    d = df_context[COL_DATA]
+                    mask = ((d.dt.year == y) & (d.dt.month == int(m))).to_numpy()
         except Exception:
             return df_context
 
@@ -549,34 +1629,43 @@ def apply_table_focus(df_context: pd.DataFrame) -> pd.DataFrame:
         try:
             s = str(val).replace("ª", "").strip()
             w = int(s)
-            dff = dff.copy()
-            dff["_SEMANA_MES"] = semana_do_mes(dff[COL_DATA])
-            dff = dff[dff["_SEMANA_MES"] == w].drop(columns=["_SEMANA_MES"], errors="ignore")
+            mask = (semana_do_mes(df_context[COL_DATA]) == w).fillna(False).to_numpy(dtype=bool)
         except Exception:
             return df_context
 
-    return dff
+    return _recorte(df_context, mask)
 
 
-def occurrences_dataset(df_filtrado: pd.DataFrame, anos_sel, mes_sel: str):
-    level = st.session_state.drill_level
+def occurrences_dataset(df_filtrado: pd.DataFrame, anos_sel, mes_sel: str, tidx=None, periodo=None, cubo=None, medida: str = "n", drill=None):
+    # medida != "n" (ex.: quantidade) só existe no cubo; drill=None lê a sessão
+    ycol = MEDIDA_ROTULO[medida]
+    level, drill_year, drill_month = drill_atual() if drill is None else drill
     if level == "AUTO":
         level = resolve_initial_level(anos_sel, mes_sel)
 
+    # Contagens por data: cubo do filtro cruzado, índice temporal (tempo
+    # constante) ou linhas do recorte
+    if cubo is not None:
+        def contar(chave, ano=None, mes=None):
+            return _contagens_cubo(cubo, chave, ano, mes, medida)
+    elif tidx is not None and periodo is not None:
+        def contar(chave, ano=None, mes=None):
+            return _contagens_indice(tidx, periodo, chave, ano, mes)
+    else:
+        def contar(chave, ano=None, mes=None):
+            return _contagens_datas(df_filtrado[COL_DATA], chave, ano, mes)
+
     breadcrumb = []
 
     # -------------------------
     # NOVO: MÊS/ANO (quando seleciono mais de um ano)
     # -------------------------
     if level == "MES_ANO":
-        dff = df_filtrado.copy()
-        dff["_Y"] = dff[COL_DATA].dt.year.astype(int)
-        dff["_M"] = dff[COL_DATA].dt.month.astype(int)
-        g = dff.groupby(["_Y", "_M"]).size().reset_index(name="Ocorrências")
-        g["_KEY"] = g["_Y"] * 100 + g["_M"]
-        g = g.sort_values("_KEY")
-        g["Mês/Ano"] = g.apply(lambda r: f"{MESES_ABREV.get(int(r['_M']), r['_M'])}/{int(r['_Y'])}", axis=1)
-        df_plot = g[["Mês/Ano", "Ocorrências"]].copy()
+        g = contar("mes_ano")
+        df_plot = pd.DataFrame({
+            "Mês/Ano": [f"{MESES_ABREV.get(int(m), m)}/{int(y)}" for y, m in g.index],
+            ycol: valores_medida(g.values, medida),
+        })
         breadcrumb.append("Visão: Mês/Ano")
         return df_plot, "MES_ANO", " > ".join(breadcrumb)
 
@@ -591,23 +1680,21 @@ def occurrences_dataset(df_filtrado: pd.DataFrame, anos_sel, mes_sel: str):
         ano_alvo = int(anos_list[0])
 
     # Quando o recorte tem múltiplos anos, o alvo vem do drill (clique no Mês/Ano)
-    if len(anos_list) > 1 and st.session_state.drill_year is not None:
-        ano_alvo = int(st.session_state.drill_year)
+    if len(anos_list) > 1 and drill_year is not None:
+        ano_alvo = int(drill_year)
 
     # Se ainda não tenho ano alvo, volto para uma visão por ano
     if ano_alvo is None:
-        g = df_filtrado.groupby(df_filtrado[COL_DATA].dt.year).size().sort_index()
-        df_plot = pd.DataFrame({"Ano": g.index.astype(int), "Ocorrências": g.values.astype(int)})
+        g = contar("ano")
+        df_plot = pd.DataFrame({"Ano": np.asarray(g.index, dtype=int), ycol: valores_medida(g.values, medida)})
         breadcrumb.append("Visão: Ano")
         return df_plot, "ANO", " > ".join(breadcrumb)
 
     breadcrumb.append(f"Ano {ano_alvo}")
-    df_ano = df_filtrado[df_filtrado[COL_DATA].dt.year == ano_alvo].copy()
 
     if level == "MES":
-        df_ano["MesNum"] = df_ano[COL_DATA].dt.month.astype(int)
-        g = df_ano.groupby("MesNum").size().reindex(range(1, 13), fill_value=0)
-        df_plot = pd.DataFrame({"Mês": [MESES_ABREV[m] for m in range(1, 13)], "Ocorrências": g.values.astype(int)})
+        g = contar("mes", ano_alvo).reindex(range(1, 13), fill_value=0)
+        df_plot = pd.DataFrame({"Mês": [MESES_ABREV[m] for m in range(1, 13)], ycol: valores_medida(g.values, medida)})
         breadcrumb.append("Visão: Mês")
         return df_plot, "MES", " > ".join(breadcrumb)
 
@@ -615,26 +1702,23 @@ def occurrences_dataset(df_filtrado: pd.DataFrame, anos_sel, mes_sel: str):
     mes_alvo = None
     if mes_sel != "(Todos)":
         mes_alvo = int(INV_MESES_ABREV.get(mes_sel))
-    elif st.session_state.drill_month is not None:
-        mes_alvo = int(st.session_state.drill_month)
+    elif drill_month is not None:
+        mes_alvo = int(drill_month)
 
     if mes_alvo is None:
-        df_ano["MesNum"] = df_ano[COL_DATA].dt.month.astype(int)
-        g = df_ano.groupby("MesNum").size().reindex(range(1, 13), fill_value=0)
-        df_plot = pd.DataFrame({"Mês": [MESES_ABREV[m] for m in range(1, 13)], "Ocorrências": g.values.astype(int)})
+        g = contar("mes", ano_alvo).reindex(range(1, 13), fill_value=0)
+        df_plot = pd.DataFrame({"Mês": [MESES_ABREV[m] for m in range(1, 13)], ycol: valores_medida(g.values, medida)})
         breadcrumb.append("Visão: Mês")
         return df_plot, "MES", " > ".join(breadcrumb)
 
     breadcrumb.append(f"Mês {MESES_ABREV.get(mes_alvo, mes_alvo)}")
     breadcrumb.append("Visão: Semana do mês")
 
-    df_mes = df_ano[df_ano[COL_DATA].dt.month == mes_alvo].copy()
-    df_mes["Semana"] = semana_do_mes(df_mes[COL_DATA])
-    g = df_mes.groupby("Semana").size().sort_index()
+    g = contar("semana", ano_alvo, mes_alvo)
 
     idx = [1, 2, 3, 4, 5]
     g = g.reindex(idx, fill_value=0)
-    df_plot = pd.DataFrame({"Semana": [f"{i}ª" for i in idx], "Ocorrências": g.values.astype(int)})
+    df_plot = pd.DataFrame({"Semana": [f"{i}ª" for i in idx], ycol: valores_medida(g.values, medida)})
 
     return df_plot, "SEMANA", " > ".join(breadcrumb)
 
@@ -688,151 +1772,1400 @@ def go_back_one_level(level_now: str, anos_sel, mes_sel: str):
 
 # =========================================================
 # Datasets (seguindo seleção)
+# - Gráficos por categoria partem de contagens já agregadas (value_counts
+#   sem ordenar, índice temporal ou cubo) e ficam com os k maiores (TOP_K):
+#   seleção parcial (np.partition), só os k são ordenados; a cauda é somada
+#   em "(Outros)" — UI, PDF e Resumo Excel usam as mesmas tabelas
 # =========================================================
-def calc_resp_analise(df_context: pd.DataFrame):
-    resp = (
-        df_context[COL_RESP_ANALISE].fillna("").replace("", "SEM RESPONSÁVEL")
-        if COL_RESP_ANALISE in df_context.columns else pd.Series(["SEM RESPONSÁVEL"] * len(df_context))
-    )
-    df_resp = resp.value_counts().reset_index()
-    df_resp.columns = ["Responsável (análise)", "Ocorrências"]
-    if df_resp.empty:
-        df_resp = pd.DataFrame({"Responsável (análise)": ["SEM DADOS"], "Ocorrências": [0]})
-    return df_resp
+def top_k_outros(cont: pd.Series, k=None) -> pd.Series:
+    """Os k maiores valores de cont, em ordem decrescente (empate: rótulo), e
+    ROTULO_OUTROS com a soma do restante no fim; k=None -> todos.
+
+    O desempate pelo rótulo deixa o resultado igual qualquer que seja a
+    origem das contagens (linhas, índice temporal ou cubo).
+    """
+    v = cont.to_numpy()
+
+    def _rot(pos):
+        return np.asarray(cont.index[pos], dtype=str)
+
+    if k is None or len(v) <= k:
+        return cont.iloc[np.lexsort((_rot(slice(None)), -v))]
+    corte = np.partition(v, len(v) - k)[len(v) - k]  # k-ésimo maior
+    acima = np.flatnonzero(v > corte)
+    empate = np.flatnonzero(v == corte)
+    empate = empate[np.argsort(_rot(empate), kind="stable")][: k - len(acima)]
+    sel = np.concatenate([acima, empate])
+    sel = sel[np.lexsort((_rot(sel), -v[sel]))]
+    top = cont.iloc[sel]
+    resto = v.sum() - v[sel].sum()
+    if resto <= 0:
+        return top
+    return pd.concat([top, pd.Series([resto], index=[ROTULO_OUTROS], dtype=top.dtype)])
+
+
+# Painéis de ranking: rótulo do eixo, dimensão (coluna do cubo) e se conta
+# só as atrasadas
+PAINEIS_RANKING = {
+    "motivos": ("Motivo", "motivo", False),
+    "participacao": ("Responsável (análise)", "resp", False),
+    "atrasadas": ("Responsável (análise)", "resp", True),
+}
+_DIM_COLUNA = {"motivo": COL_MOTIVO, "resp": COL_RESP_ANALISE}
+
+
+def calc_ranking(painel: str, df=None, tidx=None, periodo=None, cubo=None, medida: str = "n"):
+    """Top k + "(Outros)" de um painel (chave de PAINEIS_RANKING), de uma das
+    fontes: `cubo` (qualquer medida), índice temporal (`tidx` + `periodo`; só
+    contagens) ou as linhas de `df`. O mesmo recorte dá a mesma tabela em
+    qualquer fonte. Retorna None se o índice não tem a coluna.
+    """
+    rotulo, dim, atrasadas = PAINEIS_RANKING[painel]
+    if atrasadas:
+        ycol = "Qtd. atrasada (filtro)" if medida == "qtd" else "Atrasadas (filtro)"
+        coluna = "qtd_atrasadas" if medida == "qtd" else "atrasadas"
+    else:
+        ycol, coluna = MEDIDA_ROTULO[medida], medida
+
+    if cubo is not None:
+        cont = _contagem_por(cubo, dim, coluna)
+    elif tidx is not None:
+        cont = contar_periodo_por(tidx, _DIM_COLUNA[dim], *periodo, atrasadas=atrasadas)
+        if cont is None:
+            return None
+    else:
+        serie = _serie_motivo(df) if dim == "motivo" else _serie_resp_analise(df)
+        if atrasadas:
+            serie = serie[_serie_atrasada(df).to_numpy()]
+        cont = serie.value_counts(sort=False)
+
+    cont = top_k_outros(cont, TOP_K[painel])
+    if cont.empty:
+        return pd.DataFrame({rotulo: ["SEM DADOS"], ycol: [0]})
+    return pd.DataFrame({rotulo: cont.index.tolist(), ycol: valores_medida(cont.to_numpy(), coluna)})
+
+
+def calc_paineis(df_filtrado: pd.DataFrame, df_final: pd.DataFrame, anos_sel, mes_sel: str, tidx=None, periodo=None, drill=None):
+    """Motivos / Participação / Atrasadas do painel.
+
+    Com índice temporal (filtros na visão padrão) sai das somas prefixadas, em
+    tempo constante; caso contrário, das linhas do recorte.
+    """
+    df_mot = df_resp = df_atras = None
+    if tidx is not None and periodo is not None:
+        per_final = periodo_drill(periodo, anos_sel, mes_sel, drill)
+        if per_final is not None:
+            df_mot = calc_ranking("motivos", tidx=tidx, periodo=per_final)
+            df_resp = calc_ranking("participacao", tidx=tidx, periodo=per_final)
+        df_atras = calc_ranking("atrasadas", tidx=tidx, periodo=periodo)
+
+    if df_mot is None:
+        df_mot = calc_ranking("motivos", df_final)
+    if df_resp is None:
+        df_resp = calc_ranking("participacao", df_final)
+    if df_atras is None:
+        df_atras = calc_ranking("atrasadas", df_filtrado)
+    return df_mot, df_resp, df_atras
 
 
-def calc_motivos(df_context: pd.DataFrame, top_n=12):
-    top_mot = (
-        df_context[COL_MOTIVO].fillna("").replace("", "SEM MOTIVO").value_counts().head(top_n)
-        if COL_MOTIVO in df_context.columns else pd.Series(dtype=int)
-    )
-    df_mot = top_mot.reset_index()
-    df_mot.columns = ["Motivo", "Ocorrências"]
-    if df_mot.empty:
-        df_mot = pd.DataFrame({"Motivo": ["SEM DADOS"], "Ocorrências": [0]})
-    return df_mot
+# =========================================================
+# Amostra estratificada (modo exploração)
+# - Estratos: mês de emissão x Categoria. A amostra é do próprio recorte:
+#   taxa = tamanho alvo / linhas do recorte, aplicada em cada estrato (no
+#   mínimo 1 linha); recorte que cabe no alvo fica inteiro
+# - Sorteio: chave pseudoaleatória fixa por linha (seed); a base é ordenada
+#   1x por (estrato, chave) e cada recorte só filtra essa ordem (sem sort):
+#   mesmo recorte -> mesma amostra, em qualquer processo
+# - Tamanho alvo: AMOSTRA_ORCAMENTO_S x AMOSTRA_LINHAS_POR_S (constantes)
+# - Contagens da amostra não são comparáveis aos limiares absolutos: com a
+#   amostra na tela, as cores de limiar do gráfico de ocorrências desligam
+# =========================================================
+def amostra_alvo() -> int:
+    return max(int(AMOSTRA_ORCAMENTO_S * AMOSTRA_LINHAS_POR_S), AMOSTRA_MIN_LINHAS)
+
+
+def construir_amostra(df: pd.DataFrame, n_alvo: int) -> dict:
+    """Estratos (mês x Categoria) e ordem de sorteio das linhas da base.
+
+    Retorna {"estrato" (código por linha), "ordem" (posições por estrato e
+    chave), "n_estratos", "n_alvo"}.
+    """
+    n_total = len(df)
+    d = df[COL_DATA]
+    mes = (d.dt.year * 12 + d.dt.month).fillna(-1).to_numpy(dtype=np.int64)
+    mes_cod, _ = pd.factorize(mes)
+    if COL_CATEGORIA in df.columns:
+        cat_cod, cats = pd.factorize(df[COL_CATEGORIA].fillna("").astype(str))
+    else:
+        cat_cod, cats = np.zeros(n_total, dtype=np.int64), [""]
+    estrato = mes_cod.astype(np.int64) * max(len(cats), 1) + cat_cod
 
+    chave = np.random.default_rng(AMOSTRA_SEED).random(n_total)
+    return {
+        "estrato": estrato,
+        "ordem": np.lexsort((chave, estrato)),
+        "n_estratos": int(estrato.max()) + 1 if n_total else 0,
+        "n_alvo": int(n_alvo),
+    }
 
-def calc_atrasadas_por_filtro(df_filtro_base: pd.DataFrame):
-    dfb = df_filtro_base.copy()
 
-    resp = (
-        dfb[COL_RESP_ANALISE].fillna("").replace("", "SEM RESPONSÁVEL")
-        if COL_RESP_ANALISE in dfb.columns else pd.Series(["SEM RESPONSÁVEL"] * len(dfb))
-    )
-    sit = (
-        dfb[COL_SITUACAO].fillna("").apply(normalizar_situacao)
-        if COL_SITUACAO in dfb.columns else pd.Series([""] * len(dfb))
-    )
+@st.cache_resource(show_spinner=False, max_entries=BASE_CACHE_MAX)
+def amostra_base(base_key: str, _df: pd.DataFrame):
+    """Estratos e sorteio do dataset, ou None se a base inteira já cabe no alvo."""
+    n_alvo = amostra_alvo()
+    if n_alvo >= len(_df):
+        return None
+    return construir_amostra(_df, n_alvo)
 
-    df_atras = (
-        pd.DataFrame({"Responsável (análise)": resp, "Situação": sit})
-        .query("Situação == 'ATRASADA'")["Responsável (análise)"]
-        .value_counts()
-        .reset_index()
-    )
-    df_atras.columns = ["Responsável (análise)", "Atrasadas (filtro)"]
-    if df_atras.empty:
-        df_atras = pd.DataFrame({"Responsável (análise)": ["SEM DADOS"], "Atrasadas (filtro)": [0]})
-    return df_atras
+
+def amostrar_recorte(df_recorte: pd.DataFrame, amostra: dict) -> pd.DataFrame:
+    # o índice do recorte é a posição na base
+    pos = df_recorte.index.to_numpy()
+    n = len(pos)
+    if n <= amostra["n_alvo"]:
+        return df_recorte
+
+    no_recorte = np.zeros(len(amostra["estrato"]), dtype=bool)
+    no_recorte[pos] = True
+    ordem = amostra["ordem"]
+    ordem = ordem[no_recorte[ordem]]  # linhas do recorte, já por (estrato, chave)
+    e = amostra["estrato"][ordem]
+    tam = np.bincount(e, minlength=amostra["n_estratos"])
+    cota = np.minimum(tam, np.maximum(1, np.rint(tam * (amostra["n_alvo"] / n)))).astype(np.int64)
+    inicio = np.concatenate([[0], np.cumsum(tam)[:-1]])
+    rank = np.arange(n) - inicio[e]
+
+    mascara = np.zeros(len(no_recorte), dtype=bool)
+    mascara[ordem[rank < cota[e]]] = True
+    return _recorte(df_recorte, mascara[pos])
 
 
 # =========================================================
-# Plotly styling (sem eixo Y)
+# Memória das sessões
+# - Cada sessão registra o próprio memo (recorte, recorte com drill, cubos,
+#   pirâmide) num registro do processo, com a estimativa de bytes e o último
+#   uso. Fragmentos e downloads adiados recebem o memo, não DataFrames
+# - O registro guarda só uma weakref do memo: quem mantém o memo vivo é a
+#   sessão (session_state) e o que ela ainda pode usar (fragmentos, downloads
+#   adiados). Sessão fechada -> memo coletado -> entrada removida na próxima
+#   contagem, sem segurar o recorte nem somar no teto
+# - O memo sabe a sessão dona (`sid`): o download adiado, fora do
+#   session_state, também marca uso e a sessão não é descartada no meio dele
+# - Estimativa rasa (memory_usage sem deep): textos do recorte apontam para
+#   as mesmas strings da base; o recorte igual à base não conta
+# - Passou do teto: memos de sessões ociosas são esvaziados (LRU); a sessão
+#   refaz o recorte no próximo rerun
 # =========================================================
-def _hide_yaxis(fig):
-    fig.update_yaxes(showticklabels=False, title=None, showgrid=True)
-    fig.update_layout(showlegend=False)
-    return fig
+@st.cache_resource(show_spinner=False)
+def _sessoes_registry() -> dict:
+    # Compartilhado pelo processo: {"lock", "sessoes": {id: {...}}, "descartes", "liberado"}
+    return {"lock": threading.Lock(), "sessoes": {}, "descartes": 0, "liberado": 0}
 
 
-def _common_bar_layout(fig, height=460):
-    fig.update_layout(
-        height=height,
-        margin=dict(l=10, r=10, t=55, b=10),
-    )
-    return fig
+def _sessao_id() -> str:
+    if "_sessao_id" not in st.session_state:
+        st.session_state["_sessao_id"] = uuid.uuid4().hex[:8]
+    return st.session_state["_sessao_id"]
 
 
-def _apply_threshold_colors(fig, values, threshold: int):
-    colors = [GREEN if int(v) <= threshold else RED for v in values]
-    fig.update_traces(marker_color=colors)
-    return fig
+class MemoRecorte(dict):
+    """Memo do recorte de uma sessão: dict comum que aceita weakref e guarda a
+    sessão dona em `sid`."""
+    __slots__ = ("sid", "__weakref__")
 
+    def __init__(self, sid: str, **partes):
+        super().__init__(**partes)
+        self.sid = sid
 
-def fig_ocorrencias(df_plot: pd.DataFrame, level: str):
-    if level == "ANO":
-        fig = px.bar(df_plot, x="Ano", y="Ocorrências", title="Ocorrências (clique para detalhar)")
-        fig.update_traces(text=df_plot["Ocorrências"], textposition="outside", cliponaxis=False)
-        _apply_threshold_colors(fig, df_plot["Ocorrências"].tolist(), LIMIAR_OCORRENCIAS)
-        _hide_yaxis(fig)
-        _common_bar_layout(fig, height=460)
-        return fig
 
-    if level == "MES_ANO":
-        fig = px.bar(df_plot, x="Mês/Ano", y="Ocorrências", title="Ocorrências por mês/ano (clique para detalhar por semana)")
-        fig.update_traces(text=df_plot["Ocorrências"], textposition="outside", cliponaxis=False)
-        _apply_threshold_colors(fig, df_plot["Ocorrências"].tolist(), LIMIAR_OCORRENCIAS)
-        fig.update_layout(xaxis_tickangle=-45)
-        _hide_yaxis(fig)
-        _common_bar_layout(fig, height=460)
-        return fig
+def _podar_sessoes(reg: dict):
+    # com o lock: sessões fechadas (memo já coletado) saem do registro
+    for k in [k for k, s in reg["sessoes"].items() if s["memo"]() is None]:
+        del reg["sessoes"][k]
 
-    if level == "MES":
-        fig = px.bar(df_plot, x="Mês", y="Ocorrências", title="Ocorrências por mês (clique para detalhar por semana)")
-        fig.update_traces(text=df_plot["Ocorrências"], textposition="outside", cliponaxis=False)
-        _apply_threshold_colors(fig, df_plot["Ocorrências"].tolist(), LIMIAR_OCORRENCIAS)
-        _hide_yaxis(fig)
-        _common_bar_layout(fig, height=460)
-        return fig
 
-    fig = px.bar(df_plot, x="Semana", y="Ocorrências", title="Ocorrências por semana do mês (clique para ver tabela)")
-    fig.update_traces(text=df_plot["Ocorrências"], textposition="outside", cliponaxis=False)
-    _apply_threshold_colors(fig, df_plot["Ocorrências"].tolist(), LIMIAR_SEMANAL)
-    _hide_yaxis(fig)
-    _common_bar_layout(fig, height=460)
-    return fig
+def _bytes_objeto(obj) -> int:
+    try:
+        if isinstance(obj, pd.DataFrame):
+            return int(obj.memory_usage(index=True, deep=False).sum())
+        return len(json.dumps(obj, default=str))
+    except Exception:
+        return 0
+
+
+def _descartar_memo(memo: dict):
+    # esvazia no lugar: a sessão dona acha chave=None e refaz o recorte; os
+    # fragmentos só guardam o memo, então nada do recorte fica vivo
+    memo.update(chave=None, df=None, cubo=None, comp=None)
+    memo.pop("final", None)
+    memo.pop("piramide", None)
+    memo.pop("aging", None)
+    (memo.pop("exato", None) or {}).clear()  # "exato" também é lido fora do memo
+    memo.pop("_medidos", None)
+
+
+def tocar_sessao(memo: MemoRecorte, registrar: bool = False):
+    """Marca o uso do memo (rerun, fragmento, download adiado): sessão ativa
+    não é descartada no meio de uma execução. Sem session_state; `registrar`
+    (só no rerun da sessão) faz deste o memo atual da sessão."""
+    reg = _sessoes_registry()
+    with reg["lock"]:
+        info = reg["sessoes"].get(memo.sid)
+        if info is None or info["memo"]() is not memo:
+            if not registrar:
+                return  # memo antigo (ou sessão já descartada): nada a marcar
+            info = reg["sessoes"][memo.sid] = {"memo": weakref.ref(memo), "bytes": 0, "linhas": 0}
+        info["ultimo"] = time.time()
+
+
+def contabilizar_sessao(memo: MemoRecorte, df_base: pd.DataFrame):
+    """Atualiza os bytes do memo da sessão e, se o processo passou de
+    SESSOES_MEM_MAX_MB, descarta memos de sessões ociosas (LRU)."""
+    medidos = memo.setdefault("_medidos", {})
+    for parte in ("df", "cubo", "comp"):
+        obj = memo.get(parte)
+        if obj is not None and parte not in medidos:
+            medidos[parte] = 0 if obj is df_base else _bytes_objeto(obj)
+    exato = memo.get("exato")
+    if exato is not None and "exato" not in medidos:
+        # modo exploração: recorte completo + cubo, ao lado da amostra
+        medidos["exato"] = (0 if exato["df"] is df_base else _bytes_objeto(exato["df"])) + _bytes_objeto(exato["cubo"])
+    for nome, fonte in (("final", memo), ("exato_final", exato or {})):
+        # recorte com drill (o dos fragmentos/downloads); sem drill é o próprio df
+        final = fonte.get("final")
+        ident = None if final is None else id(final[1])
+        if medidos.get(f"_{nome}_id") != ident:
+            medidos[f"_{nome}_id"] = ident
+            medidos[nome] = 0 if final is None or final[1] is fonte.get("df") or final[1] is df_base else _bytes_objeto(final[1])
+    pir = memo.get("piramide") or {}
+    if medidos.get("n_piramides") != len(pir):
+        medidos["piramide"] = _bytes_objeto(pir)
+        medidos["n_piramides"] = len(pir)
+    n_bytes = sum(v for k, v in medidos.items() if k != "n_piramides" and not k.startswith("_"))
+
+    reg = _sessoes_registry()
+    teto = SESSOES_MEM_MAX_MB * 2**20
+    sid = memo.sid
+    agora = time.time()
+    with reg["lock"]:
+        _podar_sessoes(reg)
+        info = reg["sessoes"].get(sid)
+        if info is None or info["memo"]() is not memo:
+            info = reg["sessoes"][sid] = {"memo": weakref.ref(memo), "ultimo": agora}
+        info["bytes"] = n_bytes
+        info["linhas"] = len(memo["df"]) if memo.get("df") is not None else 0
+        total = sum(s["bytes"] for s in reg["sessoes"].values())
+        if total <= teto:
+            return
+        ociosas = sorted(
+            (k for k, s in reg["sessoes"].items() if k != sid and agora - s["ultimo"] >= SESSAO_OCIOSA_S),
+            key=lambda k: reg["sessoes"][k]["ultimo"],
+        )
+        for k in ociosas:
+            if total <= teto:
+                break
+            s = reg["sessoes"].pop(k)
+            memo_ocioso = s["memo"]()
+            if memo_ocioso is not None:
+                _descartar_memo(memo_ocioso)
+            total -= s["bytes"]
+            reg["descartes"] += 1
+            reg["liberado"] += s["bytes"]
+
+
+def memoria_sessoes() -> tuple:
+    """(tabela por sessão, resumo) para a visão de administração."""
+    reg = _sessoes_registry()
+    agora = time.time()
+    sid = _sessao_id()
+    with reg["lock"]:
+        _podar_sessoes(reg)
+        linhas = [
+            (k + (" (esta)" if k == sid else ""), s["bytes"] / 2**20, s.get("linhas", 0), int(agora - s["ultimo"]))
+            for k, s in reg["sessoes"].items()
+        ]
+        resumo = {
+            "sessoes": len(linhas),
+            "total_mb": sum(x[1] for x in linhas),
+            "teto_mb": SESSOES_MEM_MAX_MB,
+            "descartes": reg["descartes"],
+            "liberado_mb": reg["liberado"] / 2**20,
+        }
+    tabela = pd.DataFrame(linhas, columns=["Sessão", "MB", "Linhas do recorte", "Sem rerun há (s)"])
+    return tabela.sort_values("MB", ascending=False), resumo
 
 
-def fig_motivos(df_mot: pd.DataFrame, titulo: str):
-    fig = px.bar(df_mot, x="Motivo", y="Ocorrências", title=titulo)
-    fig.update_traces(text=df_mot["Ocorrências"], textposition="outside", cliponaxis=False, marker_color=BLUE)
-    fig.update_layout(xaxis_tickangle=-45)
+# =========================================================
+# Filtro cruzado (clique em Motivos / Participação / Atrasadas)
+# - Cubo do recorte filtrado: (ano, mês, semana, motivo, responsável análise)
+#   -> medidas (n, qtd, atrasadas, qtd_atrasadas, abertas), todas numa única
+#   agregação, montado 1x por estado dos filtros
+# - Um clique (ou troca de medida) só re-agrega o cubo, sem refazer
+#   aplicar_filtros nem os calc_* sobre as linhas
+# =========================================================
+def init_cross_filter_state():
+    if "xf_motivo" not in st.session_state:
+        st.session_state.xf_motivo = None
+    if "xf_resp" not in st.session_state:
+        st.session_state.xf_resp = None
+    if "_xf_evt" not in st.session_state:
+        st.session_state._xf_evt = {}
+
+
+def clear_cross_filter():
+    st.session_state.xf_motivo = None
+    st.session_state.xf_resp = None
+
+
+def _serie_motivo(df: pd.DataFrame) -> pd.Series:
+    if COL_MOTIVO in df.columns:
+        return _rotulos(df[COL_MOTIVO], "SEM MOTIVO")
+    return pd.Series(["SEM MOTIVO"] * len(df), index=df.index)
+
+
+def _serie_resp_analise(df: pd.DataFrame) -> pd.Series:
+    if COL_RESP_ANALISE in df.columns:
+        return _rotulos(df[COL_RESP_ANALISE], "SEM RESPONSÁVEL")
+    return pd.Series(["SEM RESPONSÁVEL"] * len(df), index=df.index)
+
+
+def _serie_atrasada(df: pd.DataFrame) -> pd.Series:
+    if COL_SITUACAO in df.columns:
+        return df[COL_SITUACAO].fillna("").apply(normalizar_situacao) == "ATRASADA"
+    return pd.Series([False] * len(df), index=df.index)
+
+
+def _serie_qtd(df: pd.DataFrame) -> pd.Series:
+    if COL_QTD_NC in df.columns:
+        return pd.to_numeric(df[COL_QTD_NC], errors="coerce").fillna(0)
+    return pd.Series(np.zeros(len(df)), index=df.index)
+
+
+def _serie_aberta(df: pd.DataFrame) -> pd.Series:
+    if COL_STATUS in df.columns:
+        return ~df[COL_STATUS].fillna("").astype(str).str.strip().str.upper().isin(STATUS_FECHADOS)
+    return pd.Series([False] * len(df), index=df.index)
+
+
+def _agregar_cubo(d: pd.Series, motivo: pd.Series, resp: pd.Series, atrasada: pd.Series,
+                  qtd: pd.Series, aberta: pd.Series, periodo=None) -> pd.DataFrame:
+    chaves = [
+        d.dt.year.rename("_Y"),
+        d.dt.month.rename("_M"),
+        semana_do_mes(d).rename("_W"),
+        motivo.rename("motivo"),
+        resp.rename("resp"),
+    ]
+    if periodo is not None:
+        chaves.insert(0, periodo.rename("_P"))
+
+    # todas as medidas num só groupby (uma soma por coluna, mesma passada)
+    atr = atrasada.to_numpy(dtype=bool)
+    q = qtd.to_numpy(dtype=float)
+    medidas = pd.DataFrame({
+        "n": np.ones(len(d), dtype=np.int64),
+        "qtd": q,
+        "atrasadas": atr.astype(np.int64),
+        "qtd_atrasadas": np.where(atr, q, 0.0),
+        "abertas": aberta.to_numpy(dtype=bool).astype(np.int64),
+    }, index=d.index)
+    return medidas.groupby(chaves, dropna=False).sum().reset_index()
+
+
+def construir_cubo(df: pd.DataFrame) -> pd.DataFrame:
+    return _agregar_cubo(
+        df[COL_DATA], _serie_motivo(df), _serie_resp_analise(df), _serie_atrasada(df),
+        _serie_qtd(df), _serie_aberta(df),
+    )
+
+
+def _cubo_filtrar(cubo: pd.DataFrame, motivo=None, resp=None) -> pd.DataFrame:
+    m = np.ones(len(cubo), dtype=bool)
+    if motivo is not None:
+        m &= (cubo["motivo"] == str(motivo)).to_numpy()
+    if resp is not None:
+        m &= (cubo["resp"] == str(resp)).to_numpy()
+    return _recorte(cubo, m)
+
+
+def _cubo_drill(cubo: pd.DataFrame, anos_sel, mes_sel: str) -> pd.DataFrame:
+    # equivalente a apply_drill_filters, sobre o cubo
+    m = np.ones(len(cubo), dtype=bool)
+    if st.session_state.drill_year is not None and (isinstance(anos_sel, (list, tuple, set)) and len(anos_sel) > 1):
+        m &= (cubo["_Y"] == int(st.session_state.drill_year)).to_numpy()
+    if mes_sel == "(Todos)" and st.session_state.drill_month is not None:
+        m &= (cubo["_M"] == int(st.session_state.drill_month)).to_numpy()
+    return _recorte(cubo, m)
+
+
+def _contagens_cubo(cubo: pd.DataFrame, chave: str, ano=None, mes=None, medida: str = "n") -> pd.Series:
+    # Mesmo formato de _contagens_datas, somando a medida do cubo
+    c = cubo
+    if ano is not None:
+        c = c[c["_Y"] == int(ano)]
+    if mes is not None:
+        c = c[c["_M"] == int(mes)]
+    if chave == "ano":
+        g = c.groupby("_Y")[medida].sum()
+    elif chave == "mes_ano":
+        g = c.groupby(["_Y", "_M"])[medida].sum()
+    elif chave == "mes":
+        g = c.groupby("_M")[medida].sum()
+    else:
+        g = c.groupby("_W")[medida].sum()
+    return g[g > 0].sort_index()
+
+
+def _contagem_por(cubo: pd.DataFrame, col: str, medida: str = "n") -> pd.Series:
+    # sem ordenar (top_k_outros ordena só os k maiores)
+    g = cubo.groupby(col, sort=False)[medida].sum()
+    return g[g > 0]
+
+
+def datasets_cubo(cubo: pd.DataFrame, anos_sel, mes_sel: str, xf_motivo=None, xf_resp=None, medida: str = "n") -> tuple:
+    """(df_occ, nível, breadcrumb, motivos, participação, atrasadas) a partir do
+    cubo do recorte. Cada gráfico filtra pelas seleções dos outros (não pela
+    própria dimensão)."""
+    cubo_final = _cubo_drill(cubo, anos_sel, mes_sel)
+    df_occ, level, breadcrumb = occurrences_dataset(
+        None, anos_sel, mes_sel, cubo=_cubo_filtrar(cubo, motivo=xf_motivo, resp=xf_resp), medida=medida
+    )
+    return (
+        df_occ, level, breadcrumb,
+        calc_ranking("motivos", cubo=_cubo_filtrar(cubo_final, resp=xf_resp), medida=medida),
+        calc_ranking("participacao", cubo=_cubo_filtrar(cubo_final, motivo=xf_motivo), medida=medida),
+        calc_ranking("atrasadas", cubo=_cubo_filtrar(cubo, motivo=xf_motivo), medida=medida),
+    )
+
+
+def totais_cubo(cubo: pd.DataFrame) -> dict:
+    # KPIs do recorte: uma soma por medida
+    return {k: valores_medida(v, k).item() for k, v in cubo[["n", "qtd", "atrasadas", "qtd_atrasadas", "abertas"]].sum().items()}
+
+
+def aplicar_filtro_cruzado(df: pd.DataFrame, motivo=None, resp=None) -> pd.DataFrame:
+    # mesmo filtro do cubo, nas linhas (tabela e exportações)
+    m = np.ones(len(df), dtype=bool)
+    if motivo is not None:
+        m &= (_serie_motivo(df) == str(motivo)).to_numpy()
+    if resp is not None:
+        m &= (_serie_resp_analise(df) == str(resp)).to_numpy()
+    return _recorte(df, m)
+
+
+def _assinatura_filtros(*partes, linhas=None) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps(partes, default=str, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+    h.update(b"-" if linhas is None else np.asarray(linhas, dtype=np.int64).tobytes())
+    return h.hexdigest()
+
+
+def recorte_memo(chave: str, calcular) -> dict:
+    """Recorte filtrado da sessão, refeito só quando a assinatura dos filtros muda
+    (cliques de drill / filtro cruzado reaproveitam o mesmo recorte e cubo)."""
+    memo = st.session_state.get("_recorte_memo")
+    if memo is not None:
+        tocar_sessao(memo, registrar=True)
+    if memo is None or memo["chave"] != chave:
+        memo = MemoRecorte(_sessao_id(), chave=chave, df=calcular(), cubo=None, comp=None)
+        st.session_state["_recorte_memo"] = memo
+        tocar_sessao(memo, registrar=True)
+    return memo
+
+
+def recortes_memo(memo: dict, anos_sel, mes_sel: str, drill_year, drill_month, completo: bool = False):
+    """(final, filtrado) do recorte da sessão com o drill dado, ou None se o
+    memo foi descartado (memória). `completo`: no modo exploração, o recorte
+    inteiro em vez da amostra.
+
+    Sem session_state: roda nos fragmentos e nos downloads adiados, que
+    recebem o memo em vez dos DataFrames (o descarte do memo libera tudo) e
+    marcam o uso da sessão.
+    """
+    tocar_sessao(memo)
+    fonte = (memo.get("exato") or memo) if completo else memo
+    df = fonte.get("df")
+    if df is None:
+        return None
+    chave = (tuple(anos_sel or []), mes_sel, drill_year, drill_month)
+    final = fonte.get("final")
+    if final is None or final[0] != chave:
+        fonte["final"] = final = (chave, filtrar_drill(df, anos_sel, mes_sel, drill_year, drill_month))
+    return final[1], df
+
+
+def cubo_memo(memo: dict) -> pd.DataFrame:
+    if memo["cubo"] is None:
+        memo["cubo"] = construir_cubo(memo["df"])
+    return memo["cubo"]
+
+
+@fragmento
+def grafico_cruzado(fig, key: str, dim: str):
+    """Plota o gráfico com clique habilitado; clicar numa barra liga/desliga o
+    filtro cruzado da dimensão (xf_motivo / xf_resp). Cada gráfico é um
+    fragmento: eventos que não mudam o filtro reexecutam só o gráfico."""
+    try:
+        ev = st.plotly_chart(fig, use_container_width=True, key=key, on_select="rerun", selection_mode="points")
+    except TypeError:
+        st.plotly_chart(fig, use_container_width=True)
+        return
+
+    clicked = get_clicked_x(ev)
+    ultimo = st.session_state._xf_evt.get(key)
+    st.session_state._xf_evt[key] = clicked
+    # só age na mudança do evento (a seleção persiste entre reruns)
+    if clicked is None or clicked == ultimo or str(clicked) in ("SEM DADOS", ROTULO_OUTROS):
+        return
+    atual = st.session_state[dim]
+    st.session_state[dim] = None if atual == str(clicked) else str(clicked)
+    st.rerun()
+
+
+# =========================================================
+# Comparação com o mesmo período do ano anterior
+# - Um recorte sem filtro de ano/período cobre os dois períodos; cada linha
+#   vira "atual" e/ou "anterior" (datas do anterior deslocadas +1 ano, para
+#   as chaves ano/mês/semana e o drill coincidirem) e uma única agregação
+#   monta o cubo dos dois lados
+# =========================================================
+def construir_cubo_comparacao(df: pd.DataFrame, anos_sel, periodo) -> pd.DataFrame:
+    ini = pd.Timestamp(periodo[0]).normalize()
+    fim_excl = pd.Timestamp(periodo[1]).normalize() + pd.Timedelta(days=1)
+    anos = [int(a) for a in (anos_sel or [])]
+
+    d = df[COL_DATA]
+    d_prox = d + pd.DateOffset(years=1)
+    pos_a = np.flatnonzero((d.dt.year.isin(anos) & (d >= ini) & (d < fim_excl)).to_numpy())
+    pos_b = np.flatnonzero((d_prox.dt.year.isin(anos) & (d_prox >= ini) & (d_prox < fim_excl)).to_numpy())
+    pos = np.concatenate([pos_a, pos_b])
+
+    # uma linha pode estar nos dois lados (ex.: 2025 atual e anterior de 2026)
+    datas = np.concatenate([d.to_numpy()[pos_a], d_prox.to_numpy()[pos_b]])
+    lado = np.repeat(np.array(["atual", "anterior"]), [len(pos_a), len(pos_b)])
+
+    def _tomar(serie):
+        return pd.Series(serie.to_numpy()[pos])
+
+    return _agregar_cubo(
+        pd.Series(datas),
+        _tomar(_serie_motivo(df)),
+        _tomar(_serie_resp_analise(df)),
+        _tomar(_serie_atrasada(df)),
+        _tomar(_serie_qtd(df)),
+        _tomar(_serie_aberta(df)),
+        periodo=pd.Series(lado),
+    )
+
+
+def cubo_comparacao_memo(memo: dict, calcular) -> pd.DataFrame:
+    if memo.get("comp") is None:
+        memo["comp"] = calcular()
+    return memo["comp"]
+
+
+def separar_periodos(cubo_cmp: pd.DataFrame):
+    lado = cubo_cmp["_P"].to_numpy()
+    return _recorte(cubo_cmp, lado == "atual"), _recorte(cubo_cmp, lado == "anterior")
+
+
+def _tabela_comparacao(rotulo: str, rotulos: list, atual: pd.Series, anterior: pd.Series, medida: str = "n") -> pd.DataFrame:
+    a = valores_medida(atual.reindex(rotulos, fill_value=0).to_numpy(), medida)
+    b = valores_medida(anterior.reindex(rotulos, fill_value=0).to_numpy(), medida)
+    return pd.DataFrame({rotulo: rotulos, "Atual": a, "Anterior": b, "Δ": a - b})
+
+
+def comparacao_ocorrencias(df_atual: pd.DataFrame, df_anterior: pd.DataFrame, level: str) -> pd.DataFrame:
+    rotulo, ycol = df_atual.columns[0], df_atual.columns[1]
+    a = df_atual.set_index(rotulo)[ycol]
+    b = df_anterior.set_index(rotulo)[ycol]
+    rotulos = list(dict.fromkeys(a.index.tolist() + b.index.tolist()))
+    if level == "ANO":
+        rotulos = sorted(rotulos)
+    elif level == "MES_ANO":
+        def _ordem(lab):
+            mes_ab, ano_txt = str(lab).split("/", 1)
+            return int(ano_txt), INV_MESES_ABREV.get(mes_ab, 0)
+        rotulos = sorted(rotulos, key=_ordem)
+    return _tabela_comparacao(rotulo, rotulos, a, b, MEDIDAS.get(ycol, "n"))
+
+
+def comparacao_por(cubo_atual: pd.DataFrame, cubo_anterior: pd.DataFrame, col: str, rotulo: str, top_n=None, medida: str = "n") -> pd.DataFrame:
+    # ranking pelo período atual (k maiores); sem k, quem só aparece no
+    # anterior entra no fim; com k, o resto dos dois períodos vai para "(Outros)"
+    a = _contagem_por(cubo_atual, col, medida)
+    b = _contagem_por(cubo_anterior, col, medida)
+    if top_n is not None:
+        rotulos = [r for r in top_k_outros(a, top_n).index if r != ROTULO_OUTROS]
+        resto_a = a.sum() - a.reindex(rotulos, fill_value=0).sum()
+        resto_b = b.sum() - b.reindex(rotulos, fill_value=0).sum()
+        if resto_a > 0 or resto_b > 0:
+            a = pd.concat([a, pd.Series([resto_a], index=[ROTULO_OUTROS])])
+            b = pd.concat([b, pd.Series([resto_b], index=[ROTULO_OUTROS])])
+            rotulos = rotulos + [ROTULO_OUTROS]
+    else:
+        rotulos = list(dict.fromkeys(top_k_outros(a).index.tolist() + top_k_outros(b).index.tolist()))
+    if not rotulos:
+        return pd.DataFrame({rotulo: ["SEM DADOS"], "Atual": [0], "Anterior": [0], "Δ": [0]})
+    return _tabela_comparacao(rotulo, rotulos, a, b, medida)
+
+# =========================================================
+# Aging (idade das pendências em atraso / em aberto)
+# - Parte que não depende do dia, 1x por recorte: pendências ordenadas por
+#   (responsável, data de emissão) e somas acumuladas das flags em
+#   atraso / em aberto. Situação/Status viram flags pelos valores distintos
+#   (fatoração), sem apply por linha
+# - Por dia: idade > limite <=> emissão antes de (hoje - limite), então cada
+#   corte de faixa é um searchsorted por responsável na chave ordenada; as
+#   contagens saem das somas acumuladas, sem passar pelas linhas de novo
+# - Memo no recorte da sessão (e por motivo do filtro cruzado, no Excel): o
+#   painel e o Resumo Excel usam o mesmo; virar o dia só refaz os cortes
+# =========================================================
+def _flags_por_valor(s: pd.Series, regra) -> np.ndarray:
+    # regra avaliada 1x por valor distinto; vazio/NaN -> False
+    codes, valores = pd.factorize(s)
+    flags = np.append(np.array([bool(regra(v)) for v in valores], dtype=bool), False)
+    return flags[codes]
+
+
+def preparar_aging(df: pd.DataFrame) -> dict:
+    """Parte do aging que não muda com o dia: {"resp" (rótulos), "chave"
+    (resp x dia, ordenada), "inicio" (1ª posição de cada resp na chave),
+    "cum_atraso"/"cum_aberto" (somas acumuladas, com 0 na frente),
+    "dia0"/"span" (dias da chave)}."""
+    n = len(df)
+    atrasada = (
+        _flags_por_valor(df[COL_SITUACAO], lambda v: normalizar_situacao(v) == "ATRASADA")
+        if COL_SITUACAO in df.columns else np.zeros(n, dtype=bool)
+    )
+    aberta = (
+        _flags_por_valor(df[COL_STATUS], lambda v: str(v).strip().upper() not in STATUS_FECHADOS)
+        if COL_STATUS in df.columns else np.zeros(n, dtype=bool)
+    )
+    datas = df[COL_DATA].to_numpy().astype("datetime64[D]")
+    pend = (atrasada | aberta) & ~np.isnat(datas)
+
+    dias = datas[pend].astype(np.int64)
+    resp_cod, resp_rot = pd.factorize(_serie_resp_analise(df).to_numpy()[pend])
+    dia0 = int(dias.min()) if len(dias) else 0
+    span = int(dias.max()) - dia0 + 1 if len(dias) else 1
+    chave = resp_cod.astype(np.int64) * span + (dias - dia0)
+    ordem = np.argsort(chave, kind="stable")
+
+    def _acumulado(flags):
+        return np.concatenate([[0], np.cumsum(flags[pend][ordem], dtype=np.int64)])
+
+    return {
+        "resp": np.asarray(resp_rot, dtype=object),
+        "chave": chave[ordem],
+        "inicio": np.arange(len(resp_rot), dtype=np.int64) * span,
+        "cum_atraso": _acumulado(atrasada),
+        "cum_aberto": _acumulado(aberta),
+        "dia0": dia0,
+        "span": span,
+    }
+
+
+def aging_no_dia(base: dict, hoje=None) -> pd.DataFrame:
+    """Pendências por responsável (análise) x faixa de idade no dia `hoje`.
+
+    Colunas: 'Responsável (análise)', 'Faixa', 'Em atraso', 'Em aberto'.
+    """
+    hoje = pd.Timestamp.today() if hoje is None else pd.Timestamp(hoje)
+    d_hoje = int(np.datetime64(hoje.date(), "D").astype(np.int64)) - base["dia0"]
+    n_resp, nf, span = len(base["resp"]), len(AGING_FAIXAS), base["span"]
+
+    # posições na chave: [fim do resp, emissão < hoje-L para L crescente, início do resp];
+    # idade <= 0 (emissão no futuro) cai na 1ª faixa, como idade 0
+    cortes = np.concatenate([[span], d_hoje - np.asarray(AGING_LIMITES, dtype=np.int64), [0]])
+    alvos = base["inicio"][:, None] + np.clip(cortes, 0, span)[None, :]
+    pos = np.searchsorted(base["chave"], alvos, side="left")
+
+    def _por_faixa(cum):
+        acum = cum[pos]
+        return (acum[:, :-1] - acum[:, 1:]).reshape(-1)  # faixa 0 (mais nova) .. última
+
+    return pd.DataFrame({
+        "Responsável (análise)": np.repeat(base["resp"], nf),
+        "Faixa": np.tile(np.asarray(AGING_FAIXAS, dtype=object), n_resp),
+        "Em atraso": _por_faixa(base["cum_atraso"]),
+        "Em aberto": _por_faixa(base["cum_aberto"]),
+    })
+
+
+def construir_aging(df: pd.DataFrame, hoje=None) -> pd.DataFrame:
+    return aging_no_dia(preparar_aging(df), hoje)
+
+
+def aging_tabela(aging: pd.DataFrame, coluna: str = "Em atraso", top_n=TOP_K["aging"]) -> pd.DataFrame:
+    # Responsável x faixas (+ Total), k maiores primeiro e a cauda somada em
+    # "(Outros)"; sem pendências -> SEM DADOS
+    t = aging.pivot(index="Responsável (análise)", columns="Faixa", values=coluna).reindex(columns=AGING_FAIXAS)
+    t["Total"] = t.sum(axis=1)
+    t = t[t["Total"] > 0]
+    manter = [r for r in top_k_outros(t["Total"], top_n).index if r != ROTULO_OUTROS]
+    cauda = t.drop(index=manter)
+    t = t.loc[manter]
+    if len(cauda):
+        t.loc[ROTULO_OUTROS] = cauda.sum()
+    if t.empty:
+        return pd.DataFrame([["SEM DADOS"] + [0] * (len(AGING_FAIXAS) + 1)], columns=["Responsável (análise)"] + AGING_FAIXAS + ["Total"])
+    return t.reset_index().rename_axis(columns=None)
+
+
+def aging_memo(memo: dict, hoje=None, completo: bool = False, motivo=None) -> pd.DataFrame:
+    """Aging do recorte da sessão no dia (`completo`: no modo exploração, do
+    recorte inteiro; `motivo`: com o filtro cruzado de motivo). Sem
+    session_state: também roda no download adiado do Resumo Excel."""
+    dia = (pd.Timestamp.today() if hoje is None else pd.Timestamp(hoje)).date()
+    fonte = (memo.get("exato") or memo) if completo else memo
+    por_motivo = fonte.setdefault("aging", {})
+    atual = por_motivo.get(motivo)
+    if atual is None:
+        df = fonte["df"] if motivo is None else aplicar_filtro_cruzado(fonte["df"], motivo)
+        por_motivo[motivo] = atual = {"base": preparar_aging(df), "dia": None, "aging": None}
+    if atual["dia"] != dia:
+        atual.update(dia=dia, aging=aging_no_dia(atual["base"], dia))
+    return atual["aging"]
+
+
+# =========================================================
+# Mapa Turno/Horário x dia da semana
+# - Na carga, cada linha vira um código inteiro de célula (dia da semana x
+#   turno) e o motivo vira código; um único bincount monta o histograma
+#   2-D acumulado por dia (células x dias), como o índice temporal
+# - Visão padrão: o mapa do período é a diferença de duas colunas do
+#   acumulado (tempo constante, qualquer número de anos)
+# - Demais filtros / motivo escolhido: bincount dos códigos das linhas do
+#   recorte (o índice do recorte é a posição na base), sem groupby
+# =========================================================
+def _serie_turno(df: pd.DataFrame) -> pd.Series:
+    if COL_TURNO in df.columns:
+        return _rotulos(df[COL_TURNO], "SEM TURNO")
+    return pd.Series(["SEM TURNO"] * len(df), index=df.index)
+
+
+def construir_mapa_turnos(df: pd.DataFrame, acumulado: bool = True) -> dict:
+    turno_cod, turnos = pd.factorize(_serie_turno(df).to_numpy(), sort=True)
+    motivo_cod, motivos = pd.factorize(_serie_motivo(df).to_numpy(), sort=True)
+    n_turnos = len(turnos)
+
+    # 1970-01-01 foi quinta (3): dia da semana = (dias desde a época + 3) % 7
+    datas = df[COL_DATA].to_numpy().astype("datetime64[D]")
+    valida = ~np.isnat(datas)
+    dias_epoca = datas.astype(np.int64)
+    celula = np.where(valida, ((dias_epoca + 3) % 7) * n_turnos + turno_cod, -1).astype(np.int32)
+
+    mapa = {
+        "turnos": [str(t) for t in turnos],
+        "motivos": [str(m) for m in motivos],
+        "celula": celula,                          # -1 = sem data
+        "motivo": motivo_cod.astype(np.int32),
+        "d0": None, "n": 0, "cum": None,           # acumulado da visão padrão
+    }
+
+    m = _mask_filtros_padrao(df) & valida if acumulado else None
+    if m is not None and m.any():
+        d0 = int(dias_epoca[m].min())
+        n_dias = int(dias_epoca[m].max()) - d0 + 1
+        if 7 * n_turnos * n_dias <= TIME_INDEX_MAX_CELLS:
+            mapa["d0"] = pd.Timestamp(np.datetime64(d0, "D"))
+            mapa["n"] = n_dias
+            mapa["cum"] = _cum_2d(celula[m], dias_epoca[m] - d0, 7 * n_turnos, n_dias)
+    return mapa
+
+
+@st.cache_resource(show_spinner=False, max_entries=BASE_CACHE_MAX)
+def mapa_turnos_base(base_key: str, _df: pd.DataFrame) -> dict:
+    return construir_mapa_turnos(_df)
+
+
+def matriz_turnos(mapa: dict, df: pd.DataFrame, periodo=None, motivo=None) -> np.ndarray:
+    """Ocorrências por dia da semana x turno (7 x turnos).
+
+    Com período (visão padrão, sem motivo) sai do acumulado; senão, das linhas
+    de df — que precisam ser um recorte da base de onde saiu o mapa.
+    """
+    n_cel = 7 * len(mapa["turnos"])
+    if periodo is not None and motivo is None and mapa["cum"] is not None:
+        lo, hi = _faixa_dias(mapa, *periodo)
+        return (mapa["cum"][:, hi] - mapa["cum"][:, lo]).reshape(7, -1)
+
+    pos = df.index.to_numpy()
+    cel = mapa["celula"][pos]
+    if motivo is not None:
+        cod = mapa["motivos"].index(str(motivo)) if str(motivo) in mapa["motivos"] else -2
+        cel = cel[mapa["motivo"][pos] == cod]
+    return np.bincount(cel[cel >= 0], minlength=n_cel).reshape(7, -1)
+
+
+def tabela_turnos(mapa: dict, matriz: np.ndarray) -> pd.DataFrame:
+    # Turno x dia da semana (+ Total); turnos sem ocorrência saem; vazio -> SEM DADOS
+    t = pd.DataFrame(matriz.T.astype(int), columns=DIAS_SEMANA)
+    t.insert(0, COL_TURNO, mapa["turnos"])
+    t["Total"] = t[DIAS_SEMANA].sum(axis=1)
+    t = t[t["Total"] > 0].reset_index(drop=True)
+    if t.empty:
+        return pd.DataFrame([["SEM DADOS"] + [0] * (len(DIAS_SEMANA) + 1)], columns=[COL_TURNO] + DIAS_SEMANA + ["Total"])
+    return t
+
+
+def turnos_recorte(df: pd.DataFrame) -> pd.DataFrame:
+    # Exportações: uma passada sobre as linhas do próprio recorte
+    mapa = construir_mapa_turnos(df, acumulado=False)
+    return tabela_turnos(mapa, matriz_turnos(mapa, df.reset_index(drop=True)))
+
+
+# =========================================================
+# Varredura de limiares (base inteira, sem desenhar nada)
+# - Conta ocorrências em toda (semana, mês) x (total, responsável, motivo,
+#   cliente) com uma única ordenação das chaves (np.unique) sobre as 4
+#   dimensões empilhadas; o mês sai da soma das semanas
+# - Contagens ficam em cache por dataset; trocar o limiar é só uma máscara
+# - Roda também sem interface: python app.py --help
+# =========================================================
+def _serie_cliente(df: pd.DataFrame) -> pd.Series:
+    if COL_CLIENTE in df.columns:
+        return _rotulos(df[COL_CLIENTE], "SEM CLIENTE")
+    return pd.Series(["SEM CLIENTE"] * len(df), index=df.index)
+
+
+VARREDURA_DIMS = {
+    "Total": lambda df: pd.Series(["(todos)"] * len(df), index=df.index),
+    "Responsável (análise)": _serie_resp_analise,
+    "Motivo": _serie_motivo,
+    "Cliente": _serie_cliente,
+}
+
+
+def construir_contagens_varredura(df: pd.DataFrame) -> pd.DataFrame:
+    dfe = _recorte(df, _mask_filtros_padrao(df))
+    dfe = _recorte(dfe, dfe[COL_DATA].notna().to_numpy())
+    if dfe.empty:
+        return pd.DataFrame(columns=["Granularidade", "Ano", "Mês", "Semana", "Dimensão", "Valor", "Ocorrências", "Atrasadas"])
+
+    d = dfe[COL_DATA]
+    ano0 = int(d.dt.year.min())
+    mes_idx = ((d.dt.year - ano0) * 12 + d.dt.month - 1).to_numpy(dtype=np.int64)
+    sem = (semana_do_mes(d) - 1).to_numpy(dtype=np.int64)  # 0..4
+    atras = _serie_atrasada(dfe).to_numpy(dtype=bool)
+
+    # rótulos de todas as dimensões num só espaço de códigos
+    dims, rotulos, codigos, base = [], [], [], 0
+    for dim, serie in VARREDURA_DIMS.items():
+        c, vals = pd.factorize(serie(dfe))
+        codigos.append(c.astype(np.int64) + base)
+        rotulos.extend(str(v) for v in vals)
+        dims.extend([dim] * len(vals))
+        base += len(vals)
+    n_dims = len(codigos)
+
+    # chave = ((mês, rótulo), semana): mês/rótulo = chave // 5
+    chave = (np.tile(mes_idx, n_dims) * base + np.concatenate(codigos)) * 5 + np.tile(sem, n_dims)
+    uniq, inv = np.unique(chave, return_inverse=True)
+    n_sem = np.bincount(inv)
+    a_sem = np.bincount(inv, weights=np.tile(atras, n_dims)).astype(np.int64)
+
+    uniq_mes, inv_mes = np.unique(uniq // 5, return_inverse=True)
+    n_mes = np.bincount(inv_mes, weights=n_sem).astype(np.int64)
+    a_mes = np.bincount(inv_mes, weights=a_sem).astype(np.int64)
+
+    dims = np.array(dims, dtype=object)
+    rotulos = np.array(rotulos, dtype=object)
+
+    def _tabela(gran, chave_mes, semana, n, a):
+        cod, mi = chave_mes % base, chave_mes // base
+        return pd.DataFrame({
+            "Granularidade": gran,
+            "Ano": ano0 + mi // 12,
+            "Mês": mi % 12 + 1,
+            "Semana": semana,
+            "Dimensão": dims[cod],
+            "Valor": rotulos[cod],
+            "Ocorrências": n,
+            "Atrasadas": a,
+        })
+
+    return pd.concat([
+        _tabela("Semana", uniq // 5, uniq % 5 + 1, n_sem, a_sem),
+        _tabela("Mês", uniq_mes, 0, n_mes, a_mes),
+    ], ignore_index=True)
+
+
+@st.cache_resource(show_spinner=False, max_entries=BASE_CACHE_MAX)
+def contagens_varredura(base_key: str, _df: pd.DataFrame) -> pd.DataFrame:
+    return construir_contagens_varredura(_df)
+
+
+def varredura_limiares(cont: pd.DataFrame, limiares: dict, desde=None) -> pd.DataFrame:
+    """Todo grupo acima do limiar da sua granularidade, do período mais recente para o mais antigo."""
+    lim = cont["Granularidade"].map(limiares)
+    m = (cont["Ocorrências"] > lim).to_numpy()
+    if desde is not None:
+        # período que terminou antes de "desde" fica de fora (checagem diária)
+        inicio = pd.to_datetime(pd.DataFrame({"year": cont["Ano"], "month": cont["Mês"], "day": 1}))
+        dias_mes = inicio.dt.days_in_month.to_numpy()
+        semana = cont["Semana"].to_numpy()
+        ult_dia = np.where(semana == 0, dias_mes, np.minimum(semana * 7, dias_mes))
+        fim = inicio + pd.to_timedelta(ult_dia - 1, unit="D")
+        m = m & (fim >= pd.Timestamp(desde).normalize()).to_numpy()
+    out = _recorte(cont, m)
+    lim = lim[m].astype(int).to_numpy()
+    periodo = [MESES_ABREV[int(mm)] + f"/{int(a)}" for a, mm in zip(out["Ano"], out["Mês"])]
+    out = out.assign(
+        Período=[f"S{int(s)} {p}" if s else p for s, p in zip(out["Semana"], periodo)],
+        Limiar=lim,
+        Excesso=out["Ocorrências"].to_numpy() - lim,
+    )
+    out = out.sort_values(["Ano", "Mês", "Semana", "Excesso"], ascending=[False, False, False, False], kind="stable")
+    return out[["Período", "Granularidade", "Dimensão", "Valor", "Ocorrências", "Limiar", "Excesso", "Atrasadas"]].reset_index(drop=True)
+
+
+# =========================================================
+# Drill no navegador (pirâmide pré-calculada)
+# - Todos os níveis do filtro atual (ANO, MES_ANO, MES por ano, SEMANA por
+#   mês) saem de um groupby no cubo do recorte e vão ao navegador uma vez
+# - Clique nas barras e "Voltar" trocam o nível no próprio navegador (Plotly
+#   num componente estático), sem falar com o servidor; o servidor só é
+#   chamado quando o filtro muda ou em "📌 Aplicar ao painel", que devolve o
+#   nível como valor do componente -> 1 rerun, que aplica o drill antes de
+#   montar Motivos, Participação, Atrasadas e a tabela
+# - index.html fica em componentes/drill_ocorrencias, ao lado do app; o
+#   plotly.min.js é o do pacote plotly instalado (mesma versão do gráfico do
+#   servidor), copiado com ele para DRILL_DIR; sem algum dos dois, volta o
+#   gráfico com rerun
+# =========================================================
+@st.cache_resource(show_spinner=False)
+def _componente_drill():
+    try:
+        spec = importlib.util.find_spec("plotly")
+        plotly_js = Path(spec.origin).parent / "package_data" / "plotly.min.js"
+        if not (plotly_js.exists() and DRILL_HTML.exists()):
+            return None
+        DRILL_DIR.mkdir(parents=True, exist_ok=True)
+        for origem in (DRILL_HTML, plotly_js):
+            destino = DRILL_DIR / origem.name
+            o = origem.stat()
+            if destino.exists() and (destino.stat().st_size, destino.stat().st_mtime_ns) == (o.st_size, o.st_mtime_ns):
+                continue
+            # cópia com o mtime da origem, trocada com os.replace (outro
+            # processo pode estar servindo o arquivo)
+            tmp = destino.with_name(f"{destino.name}.{os.getpid()}.tmp")
+            shutil.copy2(origem, tmp)
+            os.replace(tmp, destino)
+        import streamlit.components.v1 as components
+        return components.declare_component("drill_ocorrencias", path=str(DRILL_DIR))
+    except Exception:
+        return None
+
+
+def piramide_drill(cubo: pd.DataFrame, medida: str = "n") -> dict:
+    # 1 groupby (ano, mês, semana); os níveis de cima são somas dele
+    g = cubo.groupby(["_Y", "_M", "_W"])[medida].sum()
+    por_mes = g.groupby(level=[0, 1]).sum()
+    por_ano = por_mes.groupby(level=0).sum()
+    por_ano, por_mes_pos = por_ano[por_ano > 0], por_mes[por_mes > 0]
+
+    mes = {
+        str(int(y)): valores_medida(por_mes.loc[y].reindex(range(1, 13), fill_value=0), medida).tolist()
+        for y in por_ano.index
+    }
+    semana = {
+        f"{int(y)}-{int(m)}": valores_medida(g.loc[(y, m)].reindex(range(1, 6), fill_value=0), medida).tolist()
+        for y, m in por_mes_pos.index
+    }
+    return {
+        "ano": {"x": [str(int(y)) for y in por_ano.index], "y": valores_medida(por_ano, medida).tolist()},
+        "mes_ano": {
+            "x": [f"{MESES_ABREV[int(m)]}/{int(y)}" for y, m in por_mes_pos.index],
+            "y": valores_medida(por_mes_pos, medida).tolist(),
+        },
+        "mes": mes,
+        "semana": semana,
+    }
+
+
+def piramide_memo(memo: dict, medida: str, motivo=None, resp=None) -> dict:
+    # reruns sem mudança de filtro reaproveitam a pirâmide do recorte
+    pir = memo.setdefault("piramide", {})
+    k = (medida, motivo, resp)
+    if k not in pir:
+        pir[k] = piramide_drill(_cubo_filtrar(cubo_memo(memo), motivo=motivo, resp=resp), medida)
+    return pir[k]
+
+
+def no_drill_atual(anos_sel, mes_sel: str) -> dict:
+    # mesmo nível/alvo que occurrences_dataset montaria com o drill da sessão
+    level = st.session_state.drill_level
+    if level == "AUTO":
+        level = resolve_initial_level(anos_sel, mes_sel)
+    if level == "MES_ANO":
+        return {"nivel": "MES_ANO"}
+
+    anos_list = [int(a) for a in (anos_sel or [])]
+    ano_alvo = anos_list[0] if len(anos_list) == 1 else st.session_state.drill_year
+    if ano_alvo is None:
+        return {"nivel": "ANO"}
+    if level == "MES":
+        return {"nivel": "MES", "ano": int(ano_alvo)}
+
+    mes_alvo = INV_MESES_ABREV.get(mes_sel) if mes_sel != "(Todos)" else st.session_state.drill_month
+    if mes_alvo is None:
+        return {"nivel": "MES", "ano": int(ano_alvo)}
+    return {"nivel": "SEMANA", "ano": int(ano_alvo), "mes": int(mes_alvo)}
+
+
+def dados_drill(piramide: dict, anos_sel, mes_sel: str, medida: str, figura: dict, chave: str, limiares: bool = True) -> dict:
+    ycol = MEDIDA_ROTULO[medida]
+    inicio = no_drill_atual(anos_sel, mes_sel)
+    foco = None
+    if st.session_state.table_focus_level and st.session_state.table_focus_value is not None:
+        foco = {"nivel": st.session_state.table_focus_level, "valor": str(st.session_state.table_focus_value)}
+    return {
+        "chave": f"{chave}|{medida}|{json.dumps(inicio, sort_keys=True)}",
+        "inicio": inicio,
+        "foco": foco,
+        "piramide": piramide,
+        "meses": [MESES_ABREV[m] for m in range(1, 13)],
+        "mes_fixo": INV_MESES_ABREV.get(mes_sel) if mes_sel != "(Todos)" else None,
+        "multi_anos": len(anos_sel or []) > 1,
+        "niveis": {k: [eixo, titulo.format(y=ycol)] for k, (eixo, titulo) in NIVEIS_OCORRENCIAS.items()},
+        "ycol": ycol,
+        "limiar": LIMIAR_OCORRENCIAS,
+        "limiar_semanal": LIMIAR_SEMANAL,
+        "limiares_ativos": medida == "n" and limiares,
+        "cores": {"ok": GREEN, "alerta": RED, "neutra": BLUE, "destaque": HIGHLIGHT},
+        "figura": figura,
+    }
+
+
+def aplicar_drill_navegador(valor):
+    # "📌 Aplicar ao painel" no navegador: o nível escolhido vira o drill da
+    # sessão antes dos datasets serem montados (sem st.rerun extra)
+    if not isinstance(valor, dict) or valor.get("seq") == st.session_state.get("_drill_seq"):
+        return
+    st.session_state["_drill_seq"] = valor.get("seq")
+    nivel = valor.get("nivel")
+    st.session_state.drill_level = nivel
+    st.session_state.drill_year = int(valor["ano"]) if valor.get("ano") else None
+    st.session_state.drill_month = int(valor["mes"]) if (nivel == "SEMANA" and valor.get("mes")) else None
+    foco = valor.get("foco") or {}
+    st.session_state.table_focus_level = foco.get("nivel")
+    st.session_state.table_focus_value = foco.get("valor")
+
+
+# =========================================================
+# Plotly styling (sem eixo Y)
+# =========================================================
+def _hide_yaxis(fig):
+    fig.update_yaxes(showticklabels=False, title=None, showgrid=True)
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+def _common_bar_layout(fig, height=460):
+    fig.update_layout(
+        height=height,
+        margin=dict(l=10, r=10, t=55, b=10),
+    )
+    return fig
+
+
+def _apply_threshold_colors(fig, values, threshold: int):
+    colors = [GREEN if int(v) <= threshold else RED for v in values]
+    fig.update_traces(marker_color=colors)
+    return fig
+
+
+def _apply_highlight(fig, labels, destaque, base_color: str):
+    # filtro cruzado: barra selecionada em destaque, demais na cor do gráfico;
+    # "(Outros)" (soma da cauda, sem clique) em cinza
+    if destaque is None and ROTULO_OUTROS not in labels:
+        return fig
+    colors = [
+        HIGHLIGHT if (destaque is not None and str(v) == str(destaque)) else GREY if v == ROTULO_OUTROS else base_color
+        for v in labels
+    ]
+    fig.update_traces(marker_color=colors)
+    return fig
+
+
+def _bar_figure(df_plot: pd.DataFrame, x: str, y: str, title: str):
+    # graph_objects direto: bem mais leve que plotly.express para barras simples
+    fig = go.Figure(
+        go.Bar(
+            x=df_plot[x].tolist(),
+            y=df_plot[y].tolist(),
+            hovertemplate=f"{x}=%{{x}}<br>{y}=%{{y}}<extra></extra>",
+        )
+    )
+    fig.update_layout(title=title, xaxis_title=x, barmode="relative")
+    return fig
+
+
+def _build_fig_ocorrencias(df_plot: pd.DataFrame, level: str, limiares: bool = True):
+    # Medida na 2ª coluna ("Ocorrências" ou "Quantidade"); limiares valem só para
+    # contagem da base (limiares=False: contagem de amostra, cor neutra)
+    ycol = df_plot.columns[1]
+    vals = df_plot[ycol].tolist()
+
+    def _cores(fig, limiar):
+        if ycol == "Ocorrências" and limiares:
+            _apply_threshold_colors(fig, vals, limiar)
+        else:
+            fig.update_traces(marker_color=BLUE)
+
+    if level == "ANO":
+        fig = _bar_figure(df_plot, "Ano", ycol, NIVEIS_OCORRENCIAS["ANO"][1].format(y=ycol))
+        fig.update_traces(text=vals, textposition="outside", cliponaxis=False)
+        _cores(fig, LIMIAR_OCORRENCIAS)
+        _hide_yaxis(fig)
+        _common_bar_layout(fig, height=460)
+        return fig
+
+    if level == "MES_ANO":
+        fig = _bar_figure(df_plot, "Mês/Ano", ycol, NIVEIS_OCORRENCIAS["MES_ANO"][1].format(y=ycol))
+        fig.update_traces(text=vals, textposition="outside", cliponaxis=False)
+        _cores(fig, LIMIAR_OCORRENCIAS)
+        fig.update_layout(xaxis_tickangle=-45)
+        _hide_yaxis(fig)
+        _common_bar_layout(fig, height=460)
+        return fig
+
+    if level == "MES":
+        fig = _bar_figure(df_plot, "Mês", ycol, NIVEIS_OCORRENCIAS["MES"][1].format(y=ycol))
+        fig.update_traces(text=vals, textposition="outside", cliponaxis=False)
+        _cores(fig, LIMIAR_OCORRENCIAS)
+        _hide_yaxis(fig)
+        _common_bar_layout(fig, height=460)
+        return fig
+
+    fig = _bar_figure(df_plot, "Semana", ycol, NIVEIS_OCORRENCIAS["SEMANA"][1].format(y=ycol))
+    fig.update_traces(text=vals, textposition="outside", cliponaxis=False)
+    _cores(fig, LIMIAR_SEMANAL)
     _hide_yaxis(fig)
     _common_bar_layout(fig, height=460)
     return fig
 
 
-def fig_participacao_barras(df_resp: pd.DataFrame, titulo: str):
-    # Participação por responsável (análise) no recorte atual
-    dff = df_resp.copy()
-    try:
-        dff = dff.sort_values("Ocorrências", ascending=False)
-    except Exception:
-        pass
-    fig = px.bar(dff, x="Responsável (análise)", y="Ocorrências", title=titulo)
-    fig.update_traces(text=dff["Ocorrências"], textposition="outside", cliponaxis=False, marker_color=BLUE)
+def _build_fig_motivos(df_mot: pd.DataFrame, titulo: str, destaque=None):
+    ycol = df_mot.columns[1]
+    fig = _bar_figure(df_mot, "Motivo", ycol, titulo)
+    fig.update_traces(text=df_mot[ycol].tolist(), textposition="outside", cliponaxis=False, marker_color=BLUE)
+    _apply_highlight(fig, df_mot["Motivo"].tolist(), destaque, BLUE)
+    fig.update_layout(xaxis_tickangle=-45)
+    _hide_yaxis(fig)
+    _common_bar_layout(fig, height=460)
+    return fig
+
+
+def _build_fig_participacao_barras(df_resp: pd.DataFrame, titulo: str, destaque=None):
+    # Participação por responsável (análise) no recorte atual (já vem em
+    # ordem decrescente, com "(Outros)" no fim)
+    dff = df_resp
+    ycol = dff.columns[1]
+    fig = _bar_figure(dff, "Responsável (análise)", ycol, titulo)
+    fig.update_traces(text=dff[ycol].tolist(), textposition="outside", cliponaxis=False, marker_color=BLUE)
+    _apply_highlight(fig, dff["Responsável (análise)"].tolist(), destaque, BLUE)
     fig.update_layout(xaxis_tickangle=-45)
     _hide_yaxis(fig)
     fig.update_layout(height=420, margin=dict(l=10, r=10, t=55, b=10), showlegend=False)
     return fig
 
-def fig_atrasadas_vermelho(df_atras: pd.DataFrame, titulo: str):
+
+def _build_fig_atrasadas_vermelho(df_atras: pd.DataFrame, titulo: str, destaque=None):
     ycol = df_atras.columns[1]
-    fig = px.bar(df_atras, x="Responsável (análise)", y=ycol, title=titulo)
-    fig.update_traces(text=df_atras[ycol], textposition="outside", cliponaxis=False, marker_color=RED)
+    fig = _bar_figure(df_atras, "Responsável (análise)", ycol, titulo)
+    fig.update_traces(text=df_atras[ycol].tolist(), textposition="outside", cliponaxis=False, marker_color=RED)
+    _apply_highlight(fig, df_atras["Responsável (análise)"].tolist(), destaque, RED)
     fig.update_layout(xaxis_tickangle=-45)
     _hide_yaxis(fig)
     fig.update_layout(height=420, margin=dict(l=10, r=10, t=55, b=10))
     return fig
 
 
+def _build_fig_comparacao(df_cmp: pd.DataFrame, titulo: str):
+    # Atual x anterior lado a lado; Δ (e %) no rótulo da barra atual
+    x = df_cmp.columns[0]
+    labels = df_cmp[x].astype(str).tolist()
+    atual = df_cmp["Atual"].tolist()
+    anterior = df_cmp["Anterior"].tolist()
+    delta_txt = []
+    for a, b in zip(atual, anterior):
+        pct = f" ({(a - b) / b:+.0%})" if b else ""
+        delta_txt.append(f"{fmt_num(a)} | Δ {fmt_num(a - b, sinal=True)}{pct}")
+
+    fig = go.Figure([
+        go.Bar(
+            name="Ano anterior", x=labels, y=anterior, text=anterior, textposition="outside",
+            cliponaxis=False, marker_color=GREY,
+            hovertemplate=f"{x}=%{{x}}<br>Ano anterior=%{{y}}<extra></extra>",
+        ),
+        go.Bar(
+            name="Atual", x=labels, y=atual, text=delta_txt, textposition="outside",
+            cliponaxis=False, marker_color=BLUE,
+            hovertemplate=f"{x}=%{{x}}<br>Atual=%{{y}}<extra></extra>",
+        ),
+    ])
+    fig.update_layout(title=titulo, xaxis_title=x, barmode="group", showlegend=True,
+                      legend=dict(orientation="h", y=1.02, x=1, xanchor="right", yanchor="bottom"))
+    fig.update_yaxes(showticklabels=False, title=None, showgrid=True)
+    if len(labels) > 6:
+        fig.update_layout(xaxis_tickangle=-45)
+    _common_bar_layout(fig, height=460)
+    return fig
+
+
+def _build_fig_aging(df_aging: pd.DataFrame, titulo: str):
+    # Faixas empilhadas por responsável (verde -> vermelho conforme envelhece)
+    labels = df_aging["Responsável (análise)"].astype(str).tolist()
+    fig = go.Figure([
+        go.Bar(
+            name=faixa, x=labels, y=df_aging[faixa].tolist(), marker_color=cor,
+            hovertemplate=f"%{{x}}<br>{faixa}: %{{y}}<extra></extra>",
+        )
+        for faixa, cor in zip(AGING_FAIXAS, AGING_CORES)
+    ])
+    fig.add_trace(go.Scatter(
+        x=labels, y=df_aging["Total"].tolist(), text=df_aging["Total"].tolist(), mode="text",
+        textposition="top center", showlegend=False, hoverinfo="skip", cliponaxis=False,
+    ))
+    fig.update_layout(title=titulo, xaxis_title="Responsável (análise)", barmode="stack", showlegend=True,
+                      legend=dict(orientation="h", y=1.02, x=1, xanchor="right", yanchor="bottom"))
+    fig.update_yaxes(showticklabels=False, title=None, showgrid=True)
+    if len(labels) > 6:
+        fig.update_layout(xaxis_tickangle=-45)
+    _common_bar_layout(fig, height=440)
+    return fig
+
+
+def _build_fig_turnos(df_turnos: pd.DataFrame, titulo: str):
+    # Mapa de calor: turno (linhas) x dia da semana (colunas), valor em cada célula
+    z = df_turnos[DIAS_SEMANA].to_numpy()
+    turnos = df_turnos[COL_TURNO].astype(str).tolist()
+    fig = go.Figure(go.Heatmap(
+        z=z, x=DIAS_SEMANA, y=turnos, text=z, texttemplate="%{text}",
+        colorscale="Reds", showscale=False, xgap=2, ygap=2,
+        hovertemplate="%{y} — %{x}: %{z}<extra></extra>",
+    ))
+    fig.update_layout(title=titulo, xaxis_title="Dia da semana", plot_bgcolor="white")
+    fig.update_xaxes(side="bottom", showgrid=False)
+    fig.update_yaxes(autorange="reversed", showgrid=False, title=None)
+    _common_bar_layout(fig, height=min(640, max(260, 120 + 48 * len(turnos))))
+    return fig
+
+
+_FIG_BUILDERS = {
+    "aging": _build_fig_aging,
+    "turnos": _build_fig_turnos,
+    "ocorrencias": _build_fig_ocorrencias,
+    "comparacao": _build_fig_comparacao,
+    "motivos": _build_fig_motivos,
+    "participacao": _build_fig_participacao_barras,
+    "atrasadas": _build_fig_atrasadas_vermelho,
+}
+
+
+# =========================================================
+# Cache de figuras
+# - Chave: hash do dataset do gráfico + as opções que o construtor recebe
+#   (título, nível, destaque, limiares)
+# - Guarda a própria go.Figure (cache_resource, compartilhada): o
+#   st.plotly_chart não revalida um objeto Figure, só dict/JSON. Quem recebe
+#   a figura não a altera
+# =========================================================
+def _df_digest(df: pd.DataFrame) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update("|".join(str(c) for c in df.columns).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+def _fig_to_spec(fig) -> str:
+    spec = fig.to_plotly_json()
+    layout = dict(spec.get("layout", {}))
+    layout.pop("template", None)
+    return json.dumps({"data": spec.get("data", []), "layout": layout}, cls=_PlotlyJSONEncoder, ensure_ascii=False)
+
+
+def _fig_from_spec(spec: str):
+    return go.Figure(json.loads(spec))
+
+
+@st.cache_resource(show_spinner=False, max_entries=FIG_CACHE_MAX)
+def _fig_cached(kind: str, digest: str, opcoes: tuple, _df_plot: pd.DataFrame):
+    # _df_plot não entra no hash do cache (a chave é o digest)
+    return _FIG_BUILDERS[kind](_df_plot, **dict(opcoes))
+
+
+@st.cache_data(show_spinner=False, max_entries=FIG_CACHE_MAX)
+def _fig_png_cached(spec: str) -> bytes:
+    # PNG para o PDF (kaleido) — mesmo spec, mesma imagem
+    return _fig_from_spec(spec).to_image(format="png", scale=2)
+
+
+def _cached_fig(kind: str, df_plot: pd.DataFrame, **opcoes):
+    return _fig_cached(kind, _df_digest(df_plot), tuple(sorted(opcoes.items())), df_plot)
+
+
+def fig_ocorrencias(df_plot: pd.DataFrame, level: str, limiares: bool = True):
+    return _cached_fig("ocorrencias", df_plot, level=level, limiares=limiares)
+
+
+def fig_comparacao(df_cmp: pd.DataFrame, titulo: str):
+    return _cached_fig("comparacao", df_cmp, titulo=titulo)
+
+
+def fig_motivos(df_mot: pd.DataFrame, titulo: str, destaque=None):
+    return _cached_fig("motivos", df_mot, titulo=titulo, destaque=destaque)
+
+
+def fig_participacao_barras(df_resp: pd.DataFrame, titulo: str, destaque=None):
+    return _cached_fig("participacao", df_resp, titulo=titulo, destaque=destaque)
+
+
+def fig_atrasadas_vermelho(df_atras: pd.DataFrame, titulo: str, destaque=None):
+    return _cached_fig("atrasadas", df_atras, titulo=titulo, destaque=destaque)
+
+
+def fig_aging(df_aging: pd.DataFrame, titulo: str):
+    return _cached_fig("aging", df_aging, titulo=titulo)
+
+
+def fig_turnos(df_turnos: pd.DataFrame, motivo=None):
+    titulo = "Ocorrências por turno x dia da semana — recorte (filtro + drill)"
+    if motivo is not None:
+        titulo += f" | Motivo: {motivo}"
+    return _cached_fig("turnos", df_turnos, titulo=titulo)
+
+
+def figura_atrasadas(df_atras: pd.DataFrame, anos_sel, destaque=None):
+    titulo_ano = ", ".join(anos_sel) if anos_sel else "Nenhum"
+    return fig_atrasadas_vermelho(df_atras, f"Atrasadas por responsável (análise) — conforme filtro (Ano(s): {titulo_ano})", destaque=destaque)
+
+
+def figuras_painel(df_occ_plot, level_now: str, df_mot, df_resp, df_atras, anos_sel, xf_motivo=None, xf_resp=None, limiares: bool = True) -> tuple:
+    """Os 4 gráficos do painel (fora do modo comparação). O aquecimento monta
+    os mesmos, com os mesmos títulos, e deixa o cache de figuras pronto."""
+    return (
+        fig_ocorrencias(df_occ_plot, level_now, limiares),
+        fig_motivos(df_mot, f"Motivos (Top {TOP_K['motivos']}) — seguindo seleção do gráfico Ocorrências", destaque=xf_motivo),
+        fig_participacao_barras(df_resp, "Participação por responsável (análise) — seleção do gráfico Ocorrências", destaque=xf_resp),
+        figura_atrasadas(df_atras, anos_sel, destaque=xf_resp),
+    )
+
+
 # =========================================================
 # Resumo Excel (DASHBOARD + DADOS + RECORTE) — com Participação (barras)
 # (mesmo da sua versão anterior; mantido para não quebrar export)
 # =========================================================
-def build_resumo_excel_bytes(df_filtrado_final: pd.DataFrame, df_filtro_base: pd.DataFrame, titulo_filtro: str) -> bytes:
-    dff = df_filtrado_final.copy()
+def build_resumo_excel_bytes(df_filtrado_final: pd.DataFrame, df_filtro_base: pd.DataFrame, titulo_filtro: str, aging=None) -> bytes:
+    # aging: o do memo da sessão (aging_memo), já calculado para o painel
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, Alignment, PatternFill
+    from openpyxl.formatting.rule import CellIsRule, ColorScaleRule
+
+    dff = df_filtrado_final
     theme = _excel_theme()
 
     total_rec = int(len(dff))
@@ -845,14 +3178,13 @@ def build_resumo_excel_bytes(df_filtrado_final: pd.DataFrame, df_filtro_base: pd
     else:
         total_atras_rec = 0
 
-    dff_mes = dff.copy()
-    dff_mes["MesNum"] = dff_mes[COL_DATA].dt.month.astype(int)
-    g_mes = dff_mes.groupby("MesNum").size().reindex(range(1, 13), fill_value=0)
+    d_rec = dff[COL_DATA]
+    g_mes = d_rec.groupby(d_rec.dt.month.rename("MesNum")).size().reindex(range(1, 13), fill_value=0)
     df_mes = pd.DataFrame({"Mês": [MESES_ABREV[m] for m in range(1, 13)], "Ocorrências": g_mes.values.astype(int)})
 
-    df_resp = calc_resp_analise(dff)
-    df_atras = calc_atrasadas_por_filtro(df_filtro_base)
-    df_mot = calc_motivos(dff, top_n=12)
+    df_resp = calc_ranking("participacao", dff)
+    df_atras = calc_ranking("atrasadas", df_filtro_base)
+    df_mot = calc_ranking("motivos", dff)
 
     wb = Workbook()
     ws = wb.active
@@ -898,7 +3230,7 @@ def build_resumo_excel_bytes(df_filtrado_final: pd.DataFrame, df_filtro_base: pd
     r1s, _, r1e, _, _ = _add_table(wsd, r + 1, 2, df_mes, table_name="T_MES", style="TableStyleMedium9")
 
     r = r1e + 3
-    wsd[f"B{r}"] = "2) Motivos (Top 12) — recorte final"; wsd[f"B{r}"].font = Font(bold=True)
+    wsd[f"B{r}"] = f"2) Motivos (Top {TOP_K['motivos']}) — recorte final"; wsd[f"B{r}"].font = Font(bold=True)
     r2s, _, r2e, _, _ = _add_table(wsd, r + 1, 2, df_mot, table_name="T_MOT", style="TableStyleMedium9")
 
     r = r2e + 3
@@ -919,13 +3251,52 @@ def build_resumo_excel_bytes(df_filtrado_final: pd.DataFrame, df_filtro_base: pd
 
     _add_bar_chart_from_sheet(wsd, ws, "Ocorrências por mês (recorte)", 2, 3, r1s, r1e, "B12",
                               rotate_x_45=False, height=7.2, width=12.5, solid_fill_hex=BLUE)
-    _add_bar_chart_from_sheet(wsd, ws, "Motivos (Top 12) — recorte", 2, 3, r2s, r2e, "D12",
+    _add_bar_chart_from_sheet(wsd, ws, f"Motivos (Top {TOP_K['motivos']}) — recorte", 2, 3, r2s, r2e, "D12",
                               rotate_x_45=True, height=7.2, width=12.5, solid_fill_hex=BLUE)
     _add_bar_chart_from_sheet(wsd, ws, "Participação por responsável (análise) — recorte", 2, 3, r3s, r3e, "B28",
                               rotate_x_45=True, height=7.2, width=12.5, solid_fill_hex=BLUE)
     _add_bar_chart_from_sheet(wsd, ws, "Atrasadas por responsável (análise) — conforme filtro", 2, 3, r4s, r4e, "D28",
                               rotate_x_45=True, height=7.2, width=12.5, solid_fill_hex=RED)
 
+    # Aging das pendências: conforme filtro (sem drill), como as Atrasadas
+    aging = construir_aging(df_filtro_base) if aging is None else aging
+    n_faixas = len(AGING_FAIXAS)
+    wsa = wb.create_sheet("AGING")
+    wsa.sheet_view.showGridLines = True
+    _set_col_widths(wsa, {"A": 2, "B": 34, "C": 12, "D": 12, "E": 12, "F": 12, "G": 12, "H": 10, "I": 2})
+    _merge_title(wsa, "B2:H2", "AGING — PENDÊNCIAS POR IDADE (DIAS DESDE A EMISSÃO)")
+    wsa.row_dimensions[2].height = 22
+    wsa["B3"] = f"Idade em {br_date_str(pd.Timestamp.today())} | conforme filtro (sem drill)"
+
+    r = 5
+    wsa[f"B{r}"] = "1) Em atraso (Situação ATRASADA)"; wsa[f"B{r}"].font = Font(bold=True)
+    a1s, _, a1e, _, _ = _add_table(wsa, r + 1, 2, aging_tabela(aging, "Em atraso"), table_name="T_AGING_ATRASO", style="TableStyleMedium7")
+
+    r = a1e + 3
+    wsa[f"B{r}"] = "2) Em aberto (Status não concluído)"; wsa[f"B{r}"].font = Font(bold=True)
+    _add_table(wsa, r + 1, 2, aging_tabela(aging, "Em aberto"), table_name="T_AGING_ABERTO", style="TableStyleMedium9")
+
+    _add_stacked_bar_chart_from_sheet(wsa, wsa, "Aging — em atraso por responsável (análise)", 2, 3, 2 + n_faixas, a1s, a1e,
+                                      "K5", AGING_CORES)
+
+    # Turno/Horário x dia da semana: recorte final (filtro + drill), mapa de
+    # calor pela escala de cores do próprio Excel
+    df_turnos = turnos_recorte(dff)
+    wst = wb.create_sheet("TURNOS")
+    wst.sheet_view.showGridLines = True
+    _set_col_widths(wst, {"A": 2, "B": 22, **{_xl_col(3 + i): 10 for i in range(len(DIAS_SEMANA) + 1)}})
+    _merge_title(wst, f"B2:{_xl_col(3 + len(DIAS_SEMANA))}2", "OCORRÊNCIAS POR TURNO/HORÁRIO x DIA DA SEMANA")
+    wst.row_dimensions[2].height = 22
+    wst["B3"] = "Recorte final (filtro + drill)"
+    t1s, _, t1e, _, _ = _add_table(wst, 5, 2, df_turnos, table_name="T_TURNOS", style="TableStyleLight9")
+    try:
+        wst.conditional_formatting.add(
+            f"C{t1s+1}:{_xl_col(2 + len(DIAS_SEMANA))}{t1e}",
+            ColorScaleRule(start_type="min", start_color="FFFFFF", end_type="max", end_color="E57373"),
+        )
+    except Exception:
+        pass
+
     ws2 = wb.create_sheet("RECORTE")
     ws2.sheet_view.showGridLines = True
     _merge_title(ws2, "A1:H1", "LISTA DE OCORRÊNCIAS — RECORTE FINAL (FILTRO + DRILL)")
@@ -934,12 +3305,10 @@ def build_resumo_excel_bytes(df_filtrado_final: pd.DataFrame, df_filtro_base: pd
     cols_doc = [COL_CODIGO, COL_TITULO, COL_STATUS, COL_DATA, COL_CATEGORIA, COL_MOTIVO, COL_RESP_ANALISE, COL_SITUACAO]
     cols_doc = [c for c in cols_doc if c in dff.columns]
 
-    dff_out = dff.copy()
+    dff_out = dff[cols_doc] if cols_doc else dff
     if COL_DATA in dff_out.columns:
-        dff_out = dff_out.sort_values(COL_DATA, ascending=False).copy()
+        dff_out = dff_out.sort_values(COL_DATA, ascending=False)
         dff_out[COL_DATA] = dff_out[COL_DATA].apply(br_date_str)
-    if cols_doc:
-        dff_out = dff_out[cols_doc].copy()
 
     _add_table(ws2, 3, 1, dff_out, table_name="T_RECORTE", style="TableStyleMedium9")
 
@@ -950,289 +3319,1003 @@ def build_resumo_excel_bytes(df_filtrado_final: pd.DataFrame, df_filtro_base: pd
 
 
 # =========================================================
-# UI Streamlit
+# Exportação bruta (CSV / Parquet) do recorte
+# - Convertida em blocos de EXPORT_CHUNK_ROWS linhas: nunca existe uma cópia
+#   inteira do recorte (nem o texto CSV completo) além do arquivo final
+# - Gerada só no clique do botão (download adiado), não a cada rerun
 # =========================================================
-st.set_page_config(page_title=APP_NAME, page_icon="📊", layout="wide")
-require_login()
-init_drill_state()
+def _blocos(df: pd.DataFrame, ordem=None, tamanho: int = EXPORT_CHUNK_ROWS):
+    n = len(df)
+    for i in range(0, n, tamanho):
+        if ordem is None:
+            yield df.iloc[i:i + tamanho]
+        else:
+            yield df.iloc[ordem[i:i + tamanho]]
 
-st.title(f"📊 {APP_NAME}")
-st.caption("Painel interativo (Ocorrências) lado a lado com Motivos + Participação (barras) + Atrasadas + Tabela por barra clicada.")
 
-with st.sidebar:
-    st.header("📥 Entrada")
+def _ordem_recente(df: pd.DataFrame):
+    # mesma ordem da tabela (mais recentes primeiro), sem ordenar o DataFrame todo;
+    # tabela sem data (ex.: estouros de limiar) sai na ordem em que veio
+    if COL_DATA not in df.columns:
+        return None
+    return np.argsort(-df[COL_DATA].to_numpy().astype("int64"), kind="stable")
+
+
+def exportar_csv_bytes(df: pd.DataFrame) -> bytes:
+    # UTF-8 com BOM + ";" e vírgula decimal: abre direto no Excel pt-BR
+    buf = io.BytesIO()
+    out = io.TextIOWrapper(buf, encoding="utf-8-sig", newline="")
+    ordem = _ordem_recente(df)
+    if not len(df):
+        df.to_csv(out, sep=";", decimal=",", index=False)
+    for i, bloco in enumerate(_blocos(df, ordem)):
+        bloco.to_csv(out, sep=";", decimal=",", index=False, header=(i == 0))
+    out.flush()
+    out.detach()
+    return buf.getvalue()
+
+
+def exportar_parquet_bytes(df: pd.DataFrame) -> bytes:
+    buf = pa.BufferOutputStream()
+    ordem = _ordem_recente(df)
+    schema = pa.Schema.from_pandas(df.iloc[:EXPORT_CHUNK_ROWS], preserve_index=False)
+    with pa_pq.ParquetWriter(buf, schema, compression="zstd") as w:
+        for bloco in _blocos(df, ordem):
+            w.write_table(pa.Table.from_pandas(bloco, schema=schema, preserve_index=False))
+    return buf.getvalue().to_pybytes()
+
+
+def botao_download_adiado(label: str, gerar, file_name: str, mime: str, key: str, ajuda: str | None = None):
+    """download_button que só gera o arquivo no clique (`data` chamável,
+    Streamlit >= 1.52).
+
+    A geração adiada roda depois do script, fora do try/except de quem chama:
+    numa falha o download traz só um texto curto com o erro, que fica anotado
+    na sessão; o próximo rerun mostra o st.error (com `ajuda` embaixo).
+    """
+    # dict comum guardado na sessão: a thread do download só escreve nele
+    erros = st.session_state.setdefault("_erros_download", {})
+    erro = erros.pop(key, None)
+    if erro:
+        st.error(f"Erro ao gerar {file_name}. Detalhe: {erro}")
+        if ajuda:
+            st.caption(ajuda)
+
+    def _gerar_seguro():
+        try:
+            return gerar()
+        except Exception as e:
+            erros[key] = str(e) or type(e).__name__
+            return f"Erro ao gerar {file_name}: {erros[key]}\n".encode("utf-8")
 
-    # tenta ler último arquivo salvo
-    last_bytes, last_meta = _load_last_upload()
-    last_name = last_meta.get("filename", "último arquivo")
-    last_sheet_default = last_meta.get("sheet", DEFAULT_SHEET)
+    st.download_button(label=label, data=_gerar_seguro, file_name=file_name, mime=mime, key=key, on_click="ignore")
 
-    up = st.file_uploader("Envie o Excel (ex.: Consultas_RNC.xlsx)", type=["xlsx", "xlsm", "xls"])
-    sheet = st.text_input("Nome da aba (sheet)", value=last_sheet_default)
 
-    st.divider()
-    st.caption("Senha do app: QualidadeRS")
-
-# Decide a fonte do Excel (upload atual ou último salvo)
-upload_bytes = None
-upload_name = None
-
-if up is not None:
-    upload_bytes = up.getvalue()
-    upload_name = up.name
-else:
-    # se não enviou nada agora, usa o último salvo (se existir)
-    if last_bytes:
-        upload_bytes = last_bytes
-        upload_name = last_name
-        st.info(f"Usando o último arquivo salvo: {upload_name}")
-    else:
-        st.info("Envie o arquivo Excel para começar (ou rode uma vez para gravar o último arquivo).")
-        st.stop()
+# =========================================================
+# Cache de exportações em disco (PDF / Resumo Excel)
+# - Chave: versão do app + tipo + estado normalizado do recorte (assinatura
+#   dos filtros, que já inclui o digest do dataset, + drill efetivo + filtro
+#   cruzado) + o que o arquivo imprime (texto do filtro/busca, dia): o mesmo
+#   relatório pedido por outra sessão sai direto do disco
+# - Gravação atômica (tmp + replace); um acerto renova o mtime e, acima de
+#   EXPORT_CACHE_MAX_MB, os arquivos menos usados saem primeiro
+# - Mesma chave pedida ao mesmo tempo no processo: um gera, os outros esperam
+# =========================================================
+@st.cache_resource(show_spinner=False)
+def _exportacoes_registry() -> dict:
+    # Compartilhado pelo processo: {"lock": Lock, "chaves": {chave: Lock}}
+    return {"lock": threading.Lock(), "chaves": {}}
 
-try:
-    df_base = carregar_df(upload_bytes, sheet)
-    # persiste o último carregamento com sucesso
-    _save_last_upload(upload_bytes, upload_name or "ultimo.xlsx", sheet)
-except Exception as e:
-    st.error(f"Erro ao carregar: {e}")
-    st.stop()
 
-anos_all = sorted(df_base[COL_DATA].dt.year.dropna().unique().tolist())
-anos = [a for a in anos_all if int(a) >= 2025]
-if not anos:
-    st.warning('Não há dados a partir de 2025 para análise. Ajuste a base ou o filtro de período.')
-    st.stop()
-c1, c2, c3, c4, c5 = st.columns([1.4, 1, 1.6, 1.2, 1.1])
-
-with c1:
-    # ✅ Multi-seleção de anos (por padrão, todos selecionados)
-    anos_sel = st.multiselect("Ano(s)", options=[str(a) for a in anos], default=[str(a) for a in anos])  # >=2025
-with c2:
-    mes_sel = st.selectbox("Mês", ["(Todos)"] + [MESES_ABREV[m] for m in range(1, 13)], index=0)
-with c3:
-    if COL_RESP_OCORRENCIA in df_base.columns:
-        resp_vals = sorted(df_base[COL_RESP_OCORRENCIA].dropna().astype(str).replace("nan", "").unique().tolist())
-        resp_vals = [v for v in resp_vals if v != ""]
-    else:
-        resp_vals = []
-    resp_occ_sel = st.selectbox("Resp. ocorrência", ["(Todos)"] + resp_vals, index=0)
-with c4:
-    show_table = st.toggle("Mostrar tabela", value=True)
-with c5:
-    if st.button("🔄 Reset drill"):
-        reset_drill()
-        st.rerun()
-with st.expander("Filtros por marcar (clique para abrir)", expanded=False):
-    cols = st.columns(4)
-    multi_filters = {}
-    for i, col in enumerate(FILTROS_COLS):
-        if col not in df_base.columns:
-            continue
-        vals = sorted(df_base[col].dropna().astype(str).replace("nan", "").unique().tolist())
-        vals = [v for v in vals if v != ""]
-        with cols[i % 4]:
-            sel = st.multiselect(col, options=vals, default=vals)
-        multi_filters[col] = sel
-
-df_filtrado = aplicar_filtros(df_base, anos_sel, mes_sel, resp_occ_sel, multi_filters)
-
-total = int(len(df_filtrado))
-situ = df_filtrado[COL_SITUACAO].apply(normalizar_situacao) if (COL_SITUACAO in df_filtrado.columns and total) else pd.Series([], dtype=str)
-atras = int((situ == "ATRASADA").sum()) if total else 0
-p_ini = br_date_str(df_filtrado[COL_DATA].min()) if total else "-"
-p_fim = br_date_str(df_filtrado[COL_DATA].max()) if total else "-"
-
-k1, k2, k3, k4 = st.columns(4)
-k1.metric("Total ocorrências", total)
-k2.metric("Em atraso (filtro)", atras)
-k3.metric("Período", f"{p_ini} → {p_fim}")
-k4.metric("Versão", APP_VERSION)
-
-st.divider()
-tab1, tab2 = st.tabs(["📈 Dashboard", "📦 Exportações (Excel/PDF)"])
-
-with tab1:
-    if not total:
-        st.warning("Sem registros no filtro atual.")
-        st.stop()
+def _chave_exportacao(tipo: str, estado) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps([APP_VERSION, EXPORT_FORMATO, tipo, estado], default=str, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
 
-    # Ocorrências (dataset + figura)
-    df_occ_plot, level_now, breadcrumb = occurrences_dataset(df_filtrado, anos_sel, mes_sel)
-    fig_occ = fig_ocorrencias(df_occ_plot, level_now)
 
-    # Base final (filtros + drill) para Motivos + Participação (barras)
-    df_final = apply_drill_filters(df_filtrado, anos_sel, mes_sel)
-    df_mot_sel = calc_motivos(df_final, top_n=12)
-    df_resp_sel = calc_resp_analise(df_final)
-    df_atras_filtro = calc_atrasadas_por_filtro(df_filtrado)
+def _podar_cache_exportacoes():
+    try:
+        arquivos = [(p.stat(), p) for p in EXPORT_CACHE_DIR.glob("*.bin")]
+    except OSError:
+        return
+    total = sum(info.st_size for info, _ in arquivos)
+    teto = EXPORT_CACHE_MAX_MB * 2**20
+    for info, p in sorted(arquivos, key=lambda x: x[0].st_mtime):
+        if total <= teto:
+            break
+        try:
+            p.unlink()
+            total -= info.st_size
+        except OSError:
+            pass
 
-    fig_mot = fig_motivos(df_mot_sel, "Motivos (Top 12) — seguindo seleção do gráfico Ocorrências")
-    fig_pie = fig_participacao_barras(df_resp_sel, "Participação por responsável (análise) — seleção do gráfico Ocorrências")
-    titulo_ano = ", ".join(anos_sel) if anos_sel else "Nenhum"
-    fig_atras = fig_atrasadas_vermelho(df_atras_filtro, f"Atrasadas por responsável (análise) — conforme filtro (Ano(s): {titulo_ano})")
-
-    # Barra superior (controles drill/tabela)
-    topbar1, topbar2, topbar3 = st.columns([1.2, 1.4, 3.4])
-    with topbar1:
-        if can_go_back(level_now, anos_sel, mes_sel):
-            if st.button("⬅ Voltar (um nível)"):
-                if go_back_one_level(level_now, anos_sel, mes_sel):
-                    st.rerun()
-    with topbar2:
-        if st.button("🧹 Limpar seleção da tabela"):
-            clear_table_focus()
-            st.rerun()
-    with topbar3:
-        st.caption(f"📌 {breadcrumb}")
 
-    # ✅ Linha 1: INTERATIVO (Ocorrências) lado a lado com Motivos
-    colL, colR = st.columns(2)
+def exportacao_cacheada(tipo: str, estado, gerar) -> bytes:
+    """Bytes do relatório: do disco, se alguma sessão já gerou o mesmo estado;
+    senão gera, grava e devolve."""
+    chave = _chave_exportacao(tipo, estado)
+    arq = EXPORT_CACHE_DIR / f"{chave}.bin"
+    reg = _exportacoes_registry()
+    with reg["lock"]:
+        trava = reg["chaves"].setdefault(chave, threading.Lock())
 
-    with colL:
-        occ_event = None
-        click_supported = True
+    with trava:
         try:
-            occ_event = st.plotly_chart(
-                fig_occ,
-                use_container_width=True,
-                key="occ_chart",
-                on_select="rerun",
-                selection_mode="points",
-            )
-        except TypeError:
-            click_supported = False
-            st.plotly_chart(fig_occ, use_container_width=True)
-
-        if click_supported:
-            clicked = get_clicked_x(occ_event)
-            if clicked is not None:
-                # seleção para tabela
-                st.session_state.table_focus_level = level_now
-                st.session_state.table_focus_value = clicked
-
-                # drill
-                if level_now == "ANO":
-                    # Drill Ano -> Mês (quando o gráfico está em nível Ano)
-                    try:
-                        st.session_state.drill_year = int(clicked)
-                        st.session_state.drill_level = "MES"
-                        st.session_state.drill_month = None
-                        st.rerun()
-                    except Exception:
-                        pass
-
-                elif level_now == "MES_ANO":
-                    # Drill Mês/Ano -> Semana
-                    try:
-                        lab = str(clicked).strip()
-                        # formato esperado: "Jan/2025"
-                        if "/" in lab:
-                            mes_ab, ano_txt = lab.split("/", 1)
-                            mes_num = INV_MESES_ABREV.get(mes_ab.strip())
-                            ano_num = int(ano_txt.strip())
-                            if mes_num:
-                                st.session_state.drill_year = ano_num
-                                st.session_state.drill_month = int(mes_num)
-                                st.session_state.drill_level = "SEMANA"
-                                st.rerun()
-                    except Exception:
-                        pass
-
-                elif level_now == "MES" and mes_sel == "(Todos)":
-                    mes_num = INV_MESES_ABREV.get(str(clicked))
-                    if mes_num:
-                        st.session_state.drill_month = int(mes_num)
-                        st.session_state.drill_level = "SEMANA"
-                        st.rerun()
-                else:
-                    st.rerun()
+            dados = arq.read_bytes()
+            os.utime(arq)
+            return dados
+        except OSError:
+            pass
 
-    with colR:
-        st.plotly_chart(fig_mot, use_container_width=True)
+        dados = gerar()
+        try:
+            EXPORT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp = arq.with_name(f"{chave}.{uuid.uuid4().hex[:8]}.tmp")
+            tmp.write_bytes(dados)
+            os.replace(tmp, arq)
+            _podar_cache_exportacoes()
+        except OSError:
+            # Se falhar (permissão, disco cheio...), apenas não guarda.
+            pass
+    with reg["lock"]:
+        reg["chaves"].pop(chave, None)
+    return dados
 
-    # Linha 2: Participação (barras) + Atrasadas
-    row2_left, row2_right = st.columns(2)
-    with row2_left:
-        st.plotly_chart(fig_pie, use_container_width=True)
-    with row2_right:
-        st.plotly_chart(fig_atras, use_container_width=True)
 
-    # Tabela final (barra clicada)
-    if show_table:
-        df_table_base = apply_drill_filters(df_filtrado, anos_sel, mes_sel)
-        df_table = apply_table_focus(df_table_base)
+# =========================================================
+# Aquecimento (último Excel salvo)
+# - Na 1ª execução do script no processo depois do login, uma
+#   thread carrega o último Excel salvo e monta o que a visão padrão usa:
+#   dataset, índices, opções dos filtros, varredura, datasets e figuras
+# - Usa os mesmos caches das sessões: o primeiro visitante encontra tudo
+#   pronto (ou espera a chave que está sendo montada, sem refazer)
+# - Disparado só depois do login; a thread não toca em st.session_state
+#   (fora de uma sessão ele é um estado global do processo): o drill padrão
+#   vai explícito (DRILL_PADRAO) para as funções
+# =========================================================
+@st.cache_resource(show_spinner=False)
+def iniciar_aquecimento() -> dict:
+    # 1x por processo; estado["status"]: "running" / "done" / "sem_dados" / "error"
+    estado = {"status": "running", "etapa": "Na fila", "inicio": time.time(), "duracao": None, "erro": ""}
+    threading.Thread(target=_aquecer, args=(estado,), daemon=True).start()
+    return estado
 
-        info_sel = ""
-        if st.session_state.table_focus_level and st.session_state.table_focus_value is not None:
-            info_sel = f" | Seleção: {st.session_state.table_focus_level}={st.session_state.table_focus_value}"
-        st.subheader(f"Recorte (tabela) — filtros + drill + barra clicada{info_sel}")
-        st.dataframe(df_table.sort_values(COL_DATA, ascending=False), use_container_width=True, height=380)
 
-with tab2:
-    if not total:
-        st.info("Quando houver registros no filtro, as exportações ficam disponíveis.")
-        st.stop()
+def _aquecer(estado: dict):
+    try:
+        last_bytes, meta = _load_last_upload()
+        if not last_bytes:
+            estado["status"] = "sem_dados"
+            return
+        sheet = meta.get("sheet", DEFAULT_SHEET)
+
+        estado["etapa"] = "Carregando o último arquivo"
+        digest = _bytes_digest(last_bytes)
+        job = iniciar_ingestao(last_bytes, meta.get("filename", "último arquivo"), sheet, digest=digest)
+        while job["status"] == "running":
+            time.sleep(INGEST_POLL_S)
+        if job["status"] == "error":
+            raise RuntimeError(job["error"])
+        df_base = carregar_df(last_bytes, sheet, digest)
+        base_key = f"{digest}|{sheet}"
+
+        estado["etapa"] = "Índices e opções dos filtros"
+        tidx = indice_tempo(base_key, df_base)
+        indice_texto(base_key, df_base)
+        opcoes = opcoes_filtros(base_key, df_base)
+        contagens_varredura(base_key, df_base)
+
+        # Visão padrão (todos os anos >= 2025, período inteiro, sem drill)
+        anos = opcoes["anos"]
+        if anos and tidx is not None:
+            estado["etapa"] = "Visão padrão"
+            anos_sel = [str(a) for a in anos]
+            periodo = periodo_total_base(df_base, anos)
+            periodo_idx = (pd.Timestamp(periodo[0]), pd.Timestamp(periodo[1]))
+            df_filtrado = aplicar_filtros(df_base, anos_sel, "(Todos)", "(Todos)", opcoes["multi"])
+            df_final = filtrar_drill(df_filtrado, anos_sel, "(Todos)", *DRILL_PADRAO[1:])
+            df_occ_plot, level_now, _ = occurrences_dataset(df_filtrado, anos_sel, "(Todos)", tidx, periodo_idx, drill=DRILL_PADRAO)
+            paineis = calc_paineis(df_filtrado, df_final, anos_sel, "(Todos)", tidx, periodo_idx, drill=DRILL_PADRAO)
+            figuras_painel(df_occ_plot, level_now, *paineis, anos_sel)
+            mapa = mapa_turnos_base(base_key, df_base)
+            fig_turnos(tabela_turnos(mapa, matriz_turnos(mapa, df_final, periodo_drill(periodo_idx, anos_sel, "(Todos)", DRILL_PADRAO))))
+
+        estado["status"] = "done"
+    except Exception as e:
+        estado["erro"] = str(e)
+        estado["status"] = "error"
+    finally:
+        estado["etapa"] = ""
+        estado["duracao"] = time.time() - estado["inicio"]
 
-    df_final_export = apply_drill_filters(df_filtrado, anos_sel, mes_sel)
 
-    filtro_txt = _titulo_filtro(anos_sel, mes_sel, resp_occ_sel)
-    drill_txt = []
-    if st.session_state.drill_year is not None and (isinstance(anos_sel, (list, tuple, set)) and len(anos_sel) > 1):
-        drill_txt.append(f"Ano(clicado)={st.session_state.drill_year}")
-    if mes_sel == "(Todos)" and st.session_state.drill_month is not None:
-        drill_txt.append(f"Mês(clicado)={MESES_ABREV.get(int(st.session_state.drill_month), st.session_state.drill_month)}")
-    if drill_txt:
-        filtro_txt = filtro_txt + " | Drill: " + " ; ".join(drill_txt)
+# =========================================================
+# Painéis (fragmentos)
+# - Interação dentro de um painel reexecuta só o painel (recebe os dados da
+#   última execução completa). Recorte e aging chegam pelo memo da sessão
+#   (os argumentos ficam guardados pelo Streamlit até o próximo rerun
+#   completo); memo descartado -> rerun do app, que refaz o recorte
+# - Filtros/KPIs ficam no corpo do app: mudam todos os painéis
+# - Drill e filtro cruzado também mudam os outros painéis: st.rerun() do app
+# =========================================================
+@fragmento
+def painel_ocorrencias(fig_occ, level_now, mes_sel: str):
+    try:
+        occ_event = st.plotly_chart(
+            fig_occ,
+            use_container_width=True,
+            key="occ_chart",
+            on_select="rerun",
+            selection_mode="points",
+        )
+    except TypeError:
+        st.plotly_chart(fig_occ, use_container_width=True)
+        return
 
-    total_final = int(len(df_final_export))
-    situ_final = df_final_export[COL_SITUACAO].apply(normalizar_situacao) if (COL_SITUACAO in df_final_export.columns and total_final) else pd.Series([], dtype=str)
-    atras_final = int((situ_final == "ATRASADA").sum()) if total_final else 0
-    p_ini_final = br_date_str(df_final_export[COL_DATA].min()) if total_final else "-"
-    p_fim_final = br_date_str(df_final_export[COL_DATA].max()) if total_final else "-"
+    clicked = get_clicked_x(occ_event)
+    ultimo = st.session_state._xf_evt.get("occ_chart")
+    st.session_state._xf_evt["occ_chart"] = clicked
+    # só age na mudança do evento (a seleção persiste entre reruns)
+    if clicked is None or clicked == ultimo:
+        return
 
-    kpis_pdf = {"total": total_final, "atras": atras_final, "periodo": f"{p_ini_final} → {p_fim_final}"}
+    # seleção para tabela
+    st.session_state.table_focus_level = level_now
+    st.session_state.table_focus_value = clicked
+
+    # drill
+    if level_now == "ANO":
+        # Drill Ano -> Mês (quando o gráfico está em nível Ano)
+        try:
+            st.session_state.drill_year = int(clicked)
+            st.session_state.drill_level = "MES"
+            st.session_state.drill_month = None
+        except Exception:
+            pass
+
+    elif level_now == "MES_ANO":
+        # Drill Mês/Ano -> Semana
+        try:
+            lab = str(clicked).strip()
+            # formato esperado: "Jan/2025"
+            if "/" in lab:
+                mes_ab, ano_txt = lab.split("/", 1)
+                mes_num = INV_MESES_ABREV.get(mes_ab.strip())
+                ano_num = int(ano_txt.strip())
+                if mes_num:
+                    st.session_state.drill_year = ano_num
+                    st.session_state.drill_month = int(mes_num)
+                    st.session_state.drill_level = "SEMANA"
+        except Exception:
+            pass
+
+    elif level_now == "MES" and mes_sel == "(Todos)":
+        mes_num = INV_MESES_ABREV.get(str(clicked))
+        if mes_num:
+            st.session_state.drill_month = int(mes_num)
+            st.session_state.drill_level = "SEMANA"
+
+    # drill e seleção mudam os outros painéis (a tabela inclusive, em SEMANA)
+    st.rerun()
+
+
+def _recorte_fragmento(memo: dict, recorte_sel: tuple):
+    r = recortes_memo(memo, *recorte_sel)
+    if r is None:
+        st.rerun()  # memo descartado enquanto a sessão estava parada
+    return r
+
+
+@fragmento
+def painel_aging(memo: dict):
+    # Trocar a população só redesenha este gráfico
+    if memo.get("df") is None:
+        st.rerun()
+    aging = aging_memo(memo)
+    pop = st.radio("Aging das pendências", ["Em atraso", "Em aberto"], horizontal=True, key="aging_pop")
+    st.plotly_chart(
+        fig_aging(aging_tabela(aging, pop), f"Aging — {pop.lower()} por responsável (análise), em dias desde a emissão (conforme filtro)"),
+        use_container_width=True,
+    )
 
-    st.subheader("📄 PDF do Dashboard (1 página, 4 gráficos)")
-    try:
-        df_occ_plot2, level_now2, _ = occurrences_dataset(df_filtrado, anos_sel, mes_sel)
-        fig1 = fig_ocorrencias(df_occ_plot2, level_now2)
 
-        df_mot_pdf = calc_motivos(df_final_export, top_n=12)
-        df_resp_pdf = calc_resp_analise(df_final_export)
-        df_atras_pdf = calc_atrasadas_por_filtro(df_filtrado)
+@fragmento
+def painel_turnos(mapa: dict, memo: dict, recorte_sel: tuple, xf_motivo, xf_resp, df_turnos: pd.DataFrame):
+    # Escolher o motivo só refaz este mapa (bincount das linhas do recorte)
+    mot = st.selectbox("Turno x dia da semana — motivo", ["(Todos)"] + mapa["motivos"], key="turnos_motivo")
+    if mot != "(Todos)":
+        df_final, _ = _recorte_fragmento(memo, recorte_sel)
+        df_turnos = tabela_turnos(mapa, matriz_turnos(mapa, aplicar_filtro_cruzado(df_final, xf_motivo, xf_resp), motivo=mot))
+    st.plotly_chart(fig_turnos(df_turnos, None if mot == "(Todos)" else mot), use_container_width=True)
 
-        titulo_ano_pdf = ", ".join(anos_sel) if anos_sel else "Nenhum"
-        fig2 = fig_motivos(df_mot_pdf, "Motivos (Top 12) — seleção do gráfico Ocorrências")
-        fig3 = fig_participacao_barras(df_resp_pdf, "Participação por responsável (análise) — seleção do gráfico Ocorrências")
-        fig4 = fig_atrasadas_vermelho(df_atras_pdf, f"Atrasadas por responsável (análise) — conforme filtro (Ano(s): {titulo_ano_pdf})")
 
-        pdf_bytes = build_dashboard_pdf_bytes(
+@fragmento
+def painel_tabela(memo: dict, recorte_sel: tuple, xf_motivo, xf_resp, show_table: bool, filtro_txt: str, amostrado: bool = False):
+    # A seleção (barra clicada) só vale para a tabela e o recorte bruto: os
+    # dois ficam neste painel e "Limpar" não reexecuta o restante da página
+    if st.button("🧹 Limpar seleção da tabela"):
+        clear_table_focus()
+
+    # Recorte: filtros + drill + barra clicada + filtro cruzado
+    foco = (st.session_state.table_focus_level, st.session_state.table_focus_value)
+    df_final, _ = _recorte_fragmento(memo, recorte_sel)
+    df_table = aplicar_filtro_cruzado(filtrar_foco(df_final, *foco), xf_motivo, xf_resp)
+    if show_table:
+        info_sel = ""
+        if foco[0] and foco[1] is not None:
+            info_sel = f" | Seleção: {foco[0]}={foco[1]}"
+        if amostrado:
+            info_sel += " | 🧪 amostra"
+        st.subheader(f"Recorte (tabela) — filtros + drill + barra clicada{info_sel}")
+        st.dataframe(df_table.sort_values(COL_DATA, ascending=False), use_container_width=True, height=380)
+
+    st.subheader("🧾 Dados brutos do recorte (CSV / Parquet)")
+
+    def df_bruto():
+        # no clique (outra thread): relê o memo; no modo exploração, o recorte completo
+        r = recortes_memo(memo, *recorte_sel, completo=True)
+        if r is None:
+            raise RuntimeError("o recorte desta sessão foi descartado; recarregue a página")
+        return aplicar_filtro_cruzado(filtrar_foco(r[0], *foco), xf_motivo, xf_resp)
+
+    if amostrado:
+        st.caption(f"Recorte completo (a tabela acima é a amostra) — {filtro_txt}")
+    else:
+        st.caption(f"{len(df_table)} registro(s) — {filtro_txt}")
+    nome_bruto = f"Recorte_{APP_NAME.replace(' ', '_')}"
+    e1, e2 = st.columns(2)
+    with e1:
+        botao_download_adiado(
+            "📥 Baixar CSV",
+            lambda: exportar_csv_bytes(df_bruto()),
+            file_name=f"{nome_bruto}.csv",
+            mime="text/csv",
+            key="dl_csv",
+        )
+    with e2:
+        if pa_pq is not None:
+            botao_download_adiado(
+                "📥 Baixar Parquet",
+                lambda: exportar_parquet_bytes(df_bruto()),
+                file_name=f"{nome_bruto}.parquet",
+                mime="application/vnd.apache.parquet",
+                key="dl_parquet",
+            )
+        else:
+            st.caption("Parquet indisponível (instale pyarrow).")
+
+
+@fragmento
+def painel_varredura(base_key: str, df_base):
+    # Varredura: base inteira (visão padrão), independe de filtros/drill
+    with st.expander("🚨 Varredura de limiares — todas as semanas/meses da base"):
+        lv1, lv2, lv3 = st.columns([1, 1, 2])
+        with lv1:
+            lim_sem = st.number_input("Limiar semanal (>)", min_value=0, value=LIMIARES_VARREDURA["Semana"], step=1)
+        with lv2:
+            lim_mes = st.number_input("Limiar mensal (>)", min_value=0, value=LIMIARES_VARREDURA["Mês"], step=1)
+        with lv3:
+            dims_sel = st.multiselect("Dimensões", list(VARREDURA_DIMS), default=list(VARREDURA_DIMS))
+        alertas = varredura_limiares(contagens_varredura(base_key, df_base), {"Semana": int(lim_sem), "Mês": int(lim_mes)})
+        alertas = alertas[alertas["Dimensão"].isin(dims_sel)]
+        st.caption(
+            f"{len(alertas)} estouro(s) — "
+            + " | ".join(f"{k}: {v}" for k, v in alertas["Dimensão"].value_counts().items())
+        )
+        st.dataframe(alertas, use_container_width=True, height=320, hide_index=True)
+        botao_download_adiado(
+            "⬇️ Baixar estouros (CSV)", lambda: exportar_csv_bytes(alertas),
+            "estouros_limiares.csv", "text/csv", key="dl_varredura",
+        )
+
+
+@fragmento
+def painel_exportacoes(memo: dict, recorte_sel: tuple, xf_motivo, xf_resp, filtro_txt: str, datasets_pdf, medida: str, estado_export: list):
+    df_occ_plot, level_now, df_mot_sel, df_resp_sel, df_atras_filtro, titulo_ano, df_turnos = datasets_pdf
+
+    def _recortes_export():
+        # (final, filtrado) com o filtro cruzado, relidos do memo no clique
+        # (fora da thread do script); no modo exploração, do recorte completo
+        r = recortes_memo(memo, *recorte_sel, completo=True)
+        if r is None:
+            raise RuntimeError("o recorte desta sessão foi descartado; recarregue a página")
+        df_f, df_filt = r
+        return (
+            aplicar_filtro_cruzado(df_f, xf_motivo, xf_resp),
+            aplicar_filtro_cruzado(df_filt, xf_motivo) if xf_motivo is not None else df_filt,
+        )
+
+    # PDF e Excel são gerados só no clique (download adiado): rerun do painel
+    # não paga kaleido/reportlab/openpyxl (nem os KPIs do PDF)
+    st.subheader("📄 PDF do Dashboard (4 gráficos + mapa Turno x dia da semana)")
+
+    def _gerar_pdf(hoje):
+        df_final_export, _ = _recortes_export()
+        total_final = int(len(df_final_export))
+        situ_final = df_final_export[COL_SITUACAO].apply(normalizar_situacao) if (COL_SITUACAO in df_final_export.columns and total_final) else pd.Series([], dtype=str)
+        atras_final = int((situ_final == "ATRASADA").sum()) if total_final else 0
+        p_ini_final = br_date_str(df_final_export[COL_DATA].min()) if total_final else "-"
+        p_fim_final = br_date_str(df_final_export[COL_DATA].max()) if total_final else "-"
+        kpis_pdf = {"total": total_final, "atras": atras_final, "periodo": f"{p_ini_final} → {p_fim_final}"}
+
+        fig1 = fig_ocorrencias(df_occ_plot, level_now)
+        fig2 = fig_motivos(df_mot_sel, f"Motivos (Top {TOP_K['motivos']}) — seleção do gráfico Ocorrências")
+        fig3 = fig_participacao_barras(df_resp_sel, "Participação por responsável (análise) — seleção do gráfico Ocorrências")
+        fig4 = fig_atrasadas_vermelho(df_atras_filtro, f"Atrasadas por responsável (análise) — conforme filtro (Ano(s): {titulo_ano})")
+        return build_dashboard_pdf_bytes(
             app_name=APP_NAME,
             filtro_txt=filtro_txt,
             kpis=kpis_pdf,
-            figs_plotly=[fig1, fig2, fig3, fig4],
+            figs_plotly=[fig1, fig2, fig3, fig4, fig_turnos(df_turnos if df_turnos is not None else turnos_recorte(df_final_export))],
+            gerado_em=hoje,
         )
 
-        st.download_button(
-            label="📄 Baixar PDF do Dashboard",
-            data=pdf_bytes,
-            file_name=f"Dashboard_{APP_NAME.replace(' ', '_')}.pdf",
-            mime="application/pdf",
-        )
-    except Exception as e:
-        st.error(f"Erro ao gerar PDF. Detalhe: {e}")
+    def _baixar_pdf():
+        # a data do rodapé entra na chave: o arquivo cacheado nunca mostra outro dia
+        hoje = pd.Timestamp.today().normalize()
+        return exportacao_cacheada("pdf", estado_export + [level_now, medida, str(hoje.date())], lambda: _gerar_pdf(hoje))
+
+    if importlib.util.find_spec("kaleido") is None or importlib.util.find_spec("reportlab") is None:
+        st.error("Erro ao gerar PDF: kaleido/reportlab não instalados.")
         st.caption("Se citar kaleido/Chrome, mantenha plotly==5.24.1 e kaleido==0.2.1 no requirements.txt")
+    else:
+        try:
+            botao_download_adiado(
+                "📄 Baixar PDF do Dashboard",
+                _baixar_pdf,
+                file_name=f"Dashboard_{APP_NAME.replace(' ', '_')}.pdf",
+                mime="application/pdf",
+                key="dl_pdf",
+                ajuda="Se citar kaleido/Chrome, mantenha plotly==5.24.1 e kaleido==0.2.1 no requirements.txt",
+            )
+        except Exception as e:
+            st.error(f"Erro ao gerar PDF. Detalhe: {e}")
+            st.caption("Se citar kaleido/Chrome, mantenha plotly==5.24.1 e kaleido==0.2.1 no requirements.txt")
 
     st.divider()
-    st.subheader("📊 Resumo Excel (DASHBOARD + DADOS + RECORTE) — com Participação (barras)")
+    st.subheader("📊 Resumo Excel (DASHBOARD + DADOS + AGING + TURNOS + RECORTE) — com Participação (barras)")
 
     titulo_filtro = f"Reclamações — Filtro atual | {filtro_txt}"
-    resumo_bytes = build_resumo_excel_bytes(df_final_export, df_filtrado, titulo_filtro)
 
-    st.download_button(
-        label="📥 Baixar Resumo Excel",
-        data=resumo_bytes,
+    def _gerar_excel(hoje):
+        df_final_export, df_filtro_export = _recortes_export()
+        # mesmo recorte do filtro (com o motivo do filtro cruzado): aging do memo
+        aging = aging_memo(memo, hoje, completo=True, motivo=xf_motivo)
+        return build_resumo_excel_bytes(df_final_export, df_filtro_export, titulo_filtro, aging=aging)
+
+    def _baixar_excel():
+        hoje = pd.Timestamp.today().normalize()
+        return exportacao_cacheada("resumo_excel", estado_export + [str(hoje.date())], lambda: _gerar_excel(hoje))
+
+    botao_download_adiado(
+        "📥 Baixar Resumo Excel",
+        _baixar_excel,
         file_name=f"Resumo_{APP_NAME.replace(' ', '_')}.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
\ No newline at end of file
+        key="dl_resumo",
+    )
+
+
+# =========================================================
+# Execução sem interface (checagem diária da varredura de limiares)
+#   python app.py [arquivo.xlsx] [--aba Sheet1] [--limiar-semana 2]
+#                 [--limiar-mes 8] [--desde dd/mm/aaaa] [--saida alertas.csv]
+# - Sem arquivo: usa o último Excel carregado no app
+# - Código de saída 1 quando há estouro (0 quando não há)
+# =========================================================
+def _em_streamlit() -> bool:
+    try:
+        from streamlit import runtime
+        return runtime.exists()
+    except Exception:
+        return True
+
+
+def _cli_varredura(argv) -> int:
+    import argparse
+
+    ap = argparse.ArgumentParser(prog="app.py", description="Varredura de limiares (semana/mês x responsável/motivo/cliente).")
+    ap.add_argument("excel", nargs="?", help="Excel do Qualiex (padrão: último carregado no app)")
+    ap.add_argument("--aba", default=None, help="nome da aba (sheet)")
+    ap.add_argument("--limiar-semana", type=int, default=LIMIARES_VARREDURA["Semana"])
+    ap.add_argument("--limiar-mes", type=int, default=LIMIARES_VARREDURA["Mês"])
+    ap.add_argument("--desde", default=None, help="ignora períodos encerrados antes desta data (dd/mm/aaaa)")
+    ap.add_argument("--saida", default=None, help="grava os estouros em CSV (mesmo formato da exportação)")
+    args = ap.parse_args(argv)
+
+    if args.excel:
+        xls_bytes, aba = Path(args.excel).read_bytes(), args.aba or DEFAULT_SHEET
+    else:
+        xls_bytes, meta = _load_last_upload()
+        if not xls_bytes:
+            ap.error("nenhum arquivo informado e nenhum Excel salvo pelo app")
+        aba = args.aba or meta.get("sheet", DEFAULT_SHEET)
+
+    desde = pd.to_datetime(args.desde, format=DATE_FMT_BR) if args.desde else None
+    df = _materializar_base(_bytes_digest(xls_bytes), aba, xls_bytes)
+    alertas = varredura_limiares(
+        construir_contagens_varredura(df),
+        {"Semana": args.limiar_semana, "Mês": args.limiar_mes},
+        desde=desde,
+    )
+
+    if args.saida:
+        Path(args.saida).write_bytes(exportar_csv_bytes(alertas))
+    print(f"{len(alertas)} estouro(s) de limiar (semana > {args.limiar_semana}, mês > {args.limiar_mes})")
+    if not alertas.empty:
+        print(alertas.to_string(index=False))
+    return 1 if len(alertas) else 0
+
+
+# =========================================================
+# UI Streamlit
+# - main() é um rerun completo; importar o módulo (testes, CLI) não executa
+#   a UI
+# - Variáveis do rerun são locais de main(): somem ao fim da execução
+# =========================================================
+def main():
+    st.set_page_config(page_title=APP_NAME, page_icon="📊", layout="wide")
+    require_login()
+    if AQUECER_NA_PARTIDA:
+        iniciar_aquecimento()
+    init_drill_state()
+    init_cross_filter_state()
+
+    st.title(f"📊 {APP_NAME}")
+    st.caption("Painel interativo (Ocorrências) lado a lado com Motivos + Participação (barras) + Atrasadas + Tabela por barra clicada.")
+
+    with st.sidebar:
+        st.header("📥 Entrada")
+
+        # tenta ler último arquivo salvo
+        last_ident = _ident_last_upload()
+        last_bytes, last_meta = _load_last_upload()
+        last_name = last_meta.get("filename", "último arquivo")
+        last_sheet_default = last_meta.get("sheet", DEFAULT_SHEET)
+
+        up = st.file_uploader("Envie o Excel (ex.: Consultas_RNC.xlsx)", type=["xlsx", "xlsm", "xls"])
+        sheet = st.text_input("Nome da aba (sheet)", value=last_sheet_default)
+
+        st.divider()
+        st.caption("Senha do app: QualidadeRS")
+
+    # Decide a fonte do Excel (upload atual ou último salvo)
+    upload_bytes = None
+    upload_name = None
+    fonte_bytes, fonte_name = None, None
+    # sha256 de cada arquivo: 1x por arquivo na sessão (ingestão, cache da base, chaves)
+    last_digest = digest_sessao(last_bytes, last_ident) if last_bytes else None
+
+    if up is not None:
+        fonte_bytes, fonte_name = up.getvalue(), up.name
+        fonte_digest = digest_sessao(fonte_bytes, f"upload:{up.file_id}")
+    elif last_bytes:
+        # se não enviou nada agora, usa o último salvo (se existir)
+        fonte_bytes, fonte_name, fonte_digest = last_bytes, last_name, last_digest
+    else:
+        st.info("Envie o arquivo Excel para começar (ou rode uma vez para gravar o último arquivo).")
+        st.stop()
+
+    # Cada upload (mesmo do mesmo arquivo) e cada "Tentar novamente" é uma nova tentativa
+    tentativa = f"{getattr(up, 'file_id', None) or 'salvo'}:{st.session_state.get('ingest_tentativa', 0)}"
+    job = iniciar_ingestao(fonte_bytes, fonte_name, sheet, tentativa, digest=fonte_digest)
+
+    if job["status"] == "done":
+        upload_bytes, upload_name, digest_base = fonte_bytes, fonte_name, fonte_digest
+        if up is None:
+            st.info(f"Usando o último arquivo salvo: {upload_name}")
+    else:
+        with st.sidebar:
+            if job["status"] == "error":
+                st.error(f"Erro ao carregar {fonte_name}: {job['error']}")
+                if st.button("Tentar novamente", key="ingest_retry"):
+                    st.session_state["ingest_tentativa"] = st.session_state.get("ingest_tentativa", 0) + 1
+                    st.rerun()
+            else:
+                _acompanhar_ingestao(job)
+
+        # Enquanto o novo arquivo processa (ou se falhou), segue com o anterior
+        tem_anterior = bool(last_bytes) and (up is not None or sheet != last_sheet_default)
+        if tem_anterior and iniciar_ingestao(last_bytes, last_name, last_sheet_default, digest=last_digest)["status"] == "done":
+            upload_bytes, upload_name, digest_base = last_bytes, last_name, last_digest
+            sheet = last_sheet_default
+            if job["status"] == "running":
+                st.info(f"Processando {fonte_name} em segundo plano — exibindo o anterior: {upload_name}")
+        elif job["status"] == "error":
+            st.error(f"Erro ao carregar: {job['error']}")
+            st.stop()
+        else:
+            st.info(f"Processando {fonte_name}… o painel abre assim que terminar.")
+            st.stop()
+
+    try:
+        df_base = carregar_df(upload_bytes, sheet, digest_base)
+    except Exception as e:
+        st.error(f"Erro ao carregar: {e}")
+        st.stop()
+
+    base_key = f"{digest_base}|{sheet}"
+
+    # Relatório de carga (linhas descartadas/ajustadas na leitura, e por quê)
+    rel_carga = relatorio_carga(digest_base, sheet)
+    if rel_carga:
+        with st.sidebar:
+            with st.expander(f"🧾 Relatório de carga ({rel_carga.get('linhas_validas', 0)}/{rel_carga.get('linhas_lidas', 0)} linhas)"):
+                st.caption(
+                    f"Leitor: {rel_carga.get('motor', '-')} | datas em {DATE_FMT_BR}: {rel_carga.get('datas_formato_padrao', 0)}"
+                )
+                linhas_rel = [(k, v, "descartada") for k, v in rel_carga.get("descartadas", {}).items() if v]
+                linhas_rel += [(k, v, "ajustada") for k, v in rel_carga.get("ajustes", {}).items() if v]
+                if linhas_rel:
+                    st.dataframe(pd.DataFrame(linhas_rel, columns=["Motivo", "Linhas", "Efeito"]), hide_index=True, use_container_width=True)
+                else:
+                    st.caption("Nenhuma linha descartada ou ajustada.")
+                if rel_carga.get("colunas_ausentes"):
+                    st.caption("Colunas do esquema ausentes: " + ", ".join(rel_carga["colunas_ausentes"]))
+                if rel_carga.get("colunas_extras"):
+                    st.caption("Colunas fora do esquema (mantidas como texto): " + ", ".join(rel_carga["colunas_extras"]))
+    tidx = indice_tempo(base_key, df_base)
+    tx_idx = indice_texto(base_key, df_base)
+
+    opcoes = opcoes_filtros(base_key, df_base)
+    anos = opcoes["anos"]
+    if not anos:
+        st.warning('Não há dados a partir de 2025 para análise. Ajuste a base ou o filtro de período.')
+        st.stop()
+    c1, c2, c3, c4, c5 = st.columns([1.4, 1, 1.6, 1.2, 1.1])
+
+    with c1:
+        # ✅ Multi-seleção de anos (por padrão, todos selecionados)
+        anos_sel = st.multiselect("Ano(s)", options=[str(a) for a in anos], default=[str(a) for a in anos])  # >=2025
+    with c2:
+        mes_sel = st.selectbox("Mês", ["(Todos)"] + [MESES_ABREV[m] for m in range(1, 13)], index=0)
+    with c3:
+        resp_occ_sel = st.selectbox("Resp. ocorrência", ["(Todos)"] + opcoes["resp"], index=0)
+    with c4:
+        show_table = st.toggle("Mostrar tabela", value=True)
+        comparar = st.toggle("Comparar c/ ano anterior", value=False, help="Ocorrências, Motivos e Participação: período atual x mesmo período do ano anterior.")
+        explorar = st.toggle("🧪 Modo exploração", value=False, help="Bases grandes: gráficos e tabela numa amostra estratificada (mês x Categoria); KPIs e exportações seguem exatos.")
+    with c5:
+        if st.button("🔄 Reset drill"):
+            reset_drill()
+            st.rerun()
+
+    # Período livre (datas) — a partir de 01/01 do primeiro ano analisado
+    cb, cd, cm, cp = st.columns([1.4, 1.0, 1.1, 2.5])
+    with cb:
+        busca = st.text_input("🔎 Buscar em Título/Descrição", value="", placeholder="ex.: embalagem rasgada")
+    with cd:
+        colapsar_dup = st.toggle("Colapsar duplicadas", value=False, help="Mesma reclamação aberta mais de uma vez (texto semelhante, mesmo cliente): mantém a mais antiga.")
+    with cm:
+        medida = MEDIDAS[st.radio("Medida dos gráficos", list(MEDIDAS), horizontal=True, help=f"Quantidade = soma de '{COL_QTD_NC}'.")]
+    busca_pos = buscar_texto(tx_idx, busca)
+
+    linhas_sel = busca_pos
+    if colapsar_dup:
+        dups = duplicatas(base_key, df_base)
+        manter_pos = np.flatnonzero(dups["manter"])
+        linhas_sel = manter_pos if busca_pos is None else np.intersect1d(busca_pos, manter_pos, assume_unique=True)
+
+    periodo_total = periodo_total_base(df_base, anos)
+    if periodo_total[0] < periodo_total[1]:
+        with cp:
+            periodo_sel = st.slider(
+                "Período (datas)",
+                min_value=periodo_total[0],
+                max_value=periodo_total[1],
+                value=periodo_total,
+                format="DD/MM/YYYY",
+            )
+    else:
+        periodo_sel = periodo_total
+    periodo_filtro = None if tuple(periodo_sel) == periodo_total else tuple(periodo_sel)
+    periodo_idx = (pd.Timestamp(periodo_sel[0]), pd.Timestamp(periodo_sel[1]))
+
+    with st.expander("Filtros por marcar (clique para abrir)", expanded=False):
+        cols = st.columns(4)
+        multi_filters = {}
+        multi_opts = {}
+        for i, col in enumerate(FILTROS_COLS):
+            if col not in opcoes["multi"]:
+                continue
+            vals = opcoes["multi"][col]
+            with cols[i % 4]:
+                sel = st.multiselect(col, options=vals, default=vals)
+            multi_filters[col] = sel
+            multi_opts[col] = vals
+
+    # Recorte + cubo ficam na sessão: cliques (drill / filtro cruzado) não refiltram a base
+    chave_filtros = _assinatura_filtros(
+        base_key, anos_sel, mes_sel, resp_occ_sel, multi_filters, periodo_filtro, linhas=linhas_sel
+    )
+    amostra = amostra_base(base_key, df_base) if explorar else None
+    if amostra is None:
+        memo = recorte_memo(
+            chave_filtros,
+            lambda: aplicar_filtros(
+                df_base, anos_sel, mes_sel, resp_occ_sel, multi_filters, periodo=periodo_filtro, linhas=linhas_sel
+            ),
+        )
+    else:
+        # Modo exploração: o memo guarda a amostra do recorte (gráficos, tabela,
+        # drill) e, em "exato", o recorte completo + cubo (KPIs e exportações)
+        completo = {}
+
+        def _recorte_amostrado():
+            completo["df"] = aplicar_filtros(
+                df_base, anos_sel, mes_sel, resp_occ_sel, multi_filters, periodo=periodo_filtro, linhas=linhas_sel
+            )
+            return amostrar_recorte(completo["df"], amostra)
+
+        memo = recorte_memo(f"{chave_filtros}|amostra:{amostra['n_alvo']}", _recorte_amostrado)
+        if "df" in completo and memo["df"] is not completo["df"]:
+            d_ex = completo["df"][COL_DATA]
+            memo["exato"] = {"df": completo["df"], "cubo": construir_cubo(completo["df"]), "periodo": (d_ex.min(), d_ex.max())}
+    df_filtrado = memo["df"]
+    exato = memo.get("exato")
+    if busca_pos is not None:
+        st.caption(f"🔎 {len(busca_pos)} registro(s) com \"{busca}\" na base (antes dos demais filtros).")
+    if colapsar_dup:
+        st.caption(f"🧬 Duplicatas colapsadas: {dups['n_colapsadas']} registro(s) em {dups['n_grupos']} grupo(s) na base.")
+
+    # Visão padrão (só o período mudou): KPIs e gráficos saem do índice temporal
+    filtros_padrao = (
+        sorted(anos_sel) == sorted(str(a) for a in anos)
+        and mes_sel == "(Todos)"
+        and resp_occ_sel == "(Todos)"
+        and all(len(multi_filters[c]) == len(multi_opts[c]) for c in multi_filters)
+        and linhas_sel is None
+    )
+    tidx_ativo = tidx if (tidx is not None and filtros_padrao and exato is None) else None
+
+    # Totais das medidas (qtd., em aberto...) saem do cubo do recorte (1 agregação)
+    totais = totais_cubo(cubo_memo(memo) if exato is None else exato["cubo"])
+    if exato is not None:
+        # Amostra na tela: KPIs do recorte completo
+        total = totais["n"]
+        atras = totais["atrasadas"]
+        p_ini = br_date_str(exato["periodo"][0]) if total else "-"
+        p_fim = br_date_str(exato["periodo"][1]) if total else "-"
+    elif tidx_ativo is not None:
+        total = contar_periodo(tidx_ativo, *periodo_idx)
+        atras = contar_periodo(tidx_ativo, *periodo_idx, atrasadas=True)
+        d_ini, d_fim = extremos_periodo(tidx_ativo, *periodo_idx)
+        p_ini = br_date_str(d_ini) if total else "-"
+        p_fim = br_date_str(d_fim) if total else "-"
+    else:
+        total = totais["n"]
+        atras = totais["atrasadas"]
+        p_ini = br_date_str(df_filtrado[COL_DATA].min()) if total else "-"
+        p_fim = br_date_str(df_filtrado[COL_DATA].max()) if total else "-"
+
+    # Comparação: os dois períodos saem de um único cubo (memo da sessão)
+    delta_total = delta_atras = None
+    if comparar:
+        cubo_cmp = cubo_comparacao_memo(
+            memo,
+            lambda: construir_cubo_comparacao(
+                aplicar_filtros(df_base, None, mes_sel, resp_occ_sel, multi_filters, linhas=linhas_sel),
+                anos_sel,
+                periodo_idx,
+            ),
+        )
+        cubo_atual, cubo_anterior = separar_periodos(cubo_cmp)
+        totais_ant = totais_cubo(cubo_anterior)
+        total_ant, atras_ant = totais_ant["n"], totais_ant["atrasadas"]
+        delta_total = f"{total - total_ant:+d} vs ano anterior ({total_ant})"
+        delta_atras = f"{atras - atras_ant:+d} vs ano anterior ({atras_ant})"
+
+    k1, k2, k5, k6, k3, k4 = st.columns([1, 1, 1, 1, 1.6, 0.8])
+    sufixo_kpi = " · exato" if exato is not None else ""
+    k1.metric("Total ocorrências" + sufixo_kpi, total, delta=delta_total, delta_color="inverse")
+    k2.metric("Em atraso (filtro)" + sufixo_kpi, atras, delta=delta_atras, delta_color="inverse")
+    k5.metric("Em aberto (filtro)" + sufixo_kpi, totais["abertas"])
+    k6.metric("Qtd. não conforme" + sufixo_kpi, fmt_num(totais["qtd"]))
+    k3.metric("Período" + sufixo_kpi, f"{p_ini} → {p_fim}")
+    k4.metric("Versão", APP_VERSION)
+    if exato is not None:
+        st.warning(
+            f"🧪 Modo exploração: {'Atrasadas, aging, mapa' if comparar else 'gráficos, mapa'} e tabela mostram números de uma amostra estratificada "
+            f"(mês x Categoria) — {len(df_filtrado)} de {len(exato['df'])} registros do recorte "
+            f"(~1:{len(exato['df']) / max(len(df_filtrado), 1):.0f}). KPIs (exato) e exportações usam o recorte completo."
+        )
+    elif explorar:
+        st.caption("🧪 Modo exploração: o recorte cabe no orçamento de tempo — gráficos e tabela com todos os registros.")
+
+    # Datasets dos 4 gráficos (1x por rerun; dashboard e PDF usam os mesmos)
+    xf_motivo = st.session_state.xf_motivo
+    xf_resp = st.session_state.xf_resp
+    xf_ativo = xf_motivo is not None or xf_resp is not None
+    xf_txt = []
+    if xf_motivo is not None:
+        xf_txt.append(f"Motivo={xf_motivo}")
+    if xf_resp is not None:
+        xf_txt.append(f"Resp. análise={xf_resp}")
+    # Drill no navegador (fora do modo comparação): o "Aplicar" chega como valor do componente
+    drill_comp = None if comparar else _componente_drill()
+    if drill_comp is not None:
+        aplicar_drill_navegador(st.session_state.get("occ_drill"))
+
+    if total:
+        # seleção do recorte (filtros + drill) que os fragmentos recebem no lugar dos DataFrames
+        recorte_sel = (anos_sel, mes_sel, st.session_state.drill_year, st.session_state.drill_month)
+        df_final = recortes_memo(memo, *recorte_sel)[0]
+        if tidx_ativo is not None and not xf_ativo and medida == "n":
+            df_occ_plot, level_now, breadcrumb = occurrences_dataset(df_filtrado, anos_sel, mes_sel, tidx_ativo, periodo_idx)
+            df_mot_sel, df_resp_sel, df_atras_filtro = calc_paineis(
+                df_filtrado, df_final, anos_sel, mes_sel, tidx_ativo, periodo_idx
+            )
+        else:
+            df_occ_plot, level_now, breadcrumb, df_mot_sel, df_resp_sel, df_atras_filtro = datasets_cubo(
+                cubo_memo(memo), anos_sel, mes_sel, xf_motivo, xf_resp, medida
+            )
+
+        if xf_txt:
+            breadcrumb = f"{breadcrumb} | Filtro cruzado: " + " ; ".join(xf_txt)
+
+        # Turno x dia da semana do recorte (filtro + drill + filtro cruzado):
+        # visão padrão sem filtro cruzado -> fatia do acumulado; senão, linhas
+        mapa_turnos = mapa_turnos_base(base_key, df_base)
+        per_turnos = periodo_drill(periodo_idx, anos_sel, mes_sel) if (tidx_ativo is not None and not xf_ativo) else None
+        df_turnos = tabela_turnos(
+            mapa_turnos,
+            matriz_turnos(mapa_turnos, df_final if per_turnos is not None else aplicar_filtro_cruzado(df_final, xf_motivo, xf_resp), per_turnos),
+        )
+
+        if comparar:
+            cubo_atual_final = _cubo_drill(cubo_atual, anos_sel, mes_sel)
+            cubo_anterior_final = _cubo_drill(cubo_anterior, anos_sel, mes_sel)
+            df_occ_ant, _, _ = occurrences_dataset(
+                df_filtrado, anos_sel, mes_sel, cubo=_cubo_filtrar(cubo_anterior, motivo=xf_motivo, resp=xf_resp), medida=medida
+            )
+            df_occ_cmp = comparacao_ocorrencias(df_occ_plot, df_occ_ant, level_now)
+            df_mot_cmp = comparacao_por(
+                _cubo_filtrar(cubo_atual_final, resp=xf_resp), _cubo_filtrar(cubo_anterior_final, resp=xf_resp),
+                "motivo", "Motivo", top_n=TOP_K["motivos"], medida=medida,
+            )
+            df_resp_cmp = comparacao_por(
+                _cubo_filtrar(cubo_atual_final, motivo=xf_motivo), _cubo_filtrar(cubo_anterior_final, motivo=xf_motivo),
+                "resp", "Responsável (análise)", top_n=TOP_K["participacao"], medida=medida,
+            )
+            breadcrumb = f"{breadcrumb} | Comparando com o mesmo período do ano anterior"
+
+        if medida != "n":
+            breadcrumb = f"{breadcrumb} | Medida: {MEDIDA_ROTULO[medida]}"
+        if exato is not None and not comparar:
+            breadcrumb = f"{breadcrumb} | 🧪 Amostra ({len(df_filtrado)} de {len(exato['df'])})"
+
+    # Memória desta sessão no registro do processo (descarta ociosas acima do teto)
+    contabilizar_sessao(memo, df_base)
+    with st.sidebar:
+        with st.expander("🧮 Memória das sessões (admin)"):
+            tab_mem, res_mem = memoria_sessoes()
+            st.caption(
+                f"{res_mem['sessoes']} sessão(ões) | {res_mem['total_mb']:.1f} de {res_mem['teto_mb']} MB"
+                f" | descartes: {res_mem['descartes']} ({res_mem['liberado_mb']:.1f} MB liberados)"
+            )
+            st.dataframe(tab_mem.round({"MB": 2}), hide_index=True, use_container_width=True)
+            if AQUECER_NA_PARTIDA:
+                aq = iniciar_aquecimento()
+                aq_txt = {"running": f"em andamento ({aq['etapa']})", "done": "pronto", "sem_dados": "sem Excel salvo", "error": f"erro: {aq['erro']}"}
+                aq_dur = f" em {aq['duracao']:.1f}s" if aq["duracao"] is not None else ""
+                st.caption(f"♨️ Aquecimento do último Excel: {aq_txt.get(aq['status'], aq['status'])}{aq_dur}")
+
+
+    # Texto do filtro (caption do recorte bruto, PDF e Excel)
+    filtro_txt = _titulo_filtro(anos_sel, mes_sel, resp_occ_sel, periodo_filtro, busca.strip())
+    if colapsar_dup:
+        filtro_txt += " | Duplicatas colapsadas"
+    if xf_txt:
+        filtro_txt += " | Filtro cruzado: " + " ; ".join(xf_txt)
+    drill_txt = []
+    if st.session_state.drill_year is not None and (isinstance(anos_sel, (list, tuple, set)) and len(anos_sel) > 1):
+        drill_txt.append(f"Ano(clicado)={st.session_state.drill_year}")
+    if mes_sel == "(Todos)" and st.session_state.drill_month is not None:
+        drill_txt.append(f"Mês(clicado)={MESES_ABREV.get(int(st.session_state.drill_month), st.session_state.drill_month)}")
+    if drill_txt:
+        filtro_txt = filtro_txt + " | Drill: " + " ; ".join(drill_txt)
+
+
+    st.divider()
+    tab1, tab2 = st.tabs(["📈 Dashboard", "📦 Exportações (Excel/PDF)"])
+
+    with tab1:
+        if not total:
+            st.warning("Sem registros no filtro atual.")
+            st.stop()
+
+        if comparar:
+            fig_occ = fig_comparacao(df_occ_cmp, "Ocorrências — atual x ano anterior (clique para detalhar)")
+            fig_mot = fig_comparacao(df_mot_cmp, f"Motivos (Top {TOP_K['motivos']} atuais) — atual x ano anterior")
+            fig_pie = fig_comparacao(df_resp_cmp, "Participação por responsável (análise) — atual x ano anterior")
+            fig_atras = figura_atrasadas(df_atras_filtro, anos_sel, destaque=xf_resp)
+        else:
+            fig_occ, fig_mot, fig_pie, fig_atras = figuras_painel(
+                df_occ_plot, level_now, df_mot_sel, df_resp_sel, df_atras_filtro, anos_sel, xf_motivo, xf_resp,
+                limiares=exato is None,
+            )
+        titulo_ano = ", ".join(anos_sel) if anos_sel else "Nenhum"
+
+        # Barra superior (controles drill/filtro cruzado)
+        topbar1, topbar2, topbar3 = st.columns([1.2, 1.4, 3.4])
+        with topbar1:
+            if drill_comp is None and can_go_back(level_now, anos_sel, mes_sel):
+                if st.button("⬅ Voltar (um nível)"):
+                    if go_back_one_level(level_now, anos_sel, mes_sel):
+                        st.rerun()
+        with topbar2:
+            if xf_ativo and st.button("🧹 Limpar filtro cruzado"):
+                clear_cross_filter()
+                st.rerun()
+        with topbar3:
+            st.caption(f"📌 {breadcrumb}")
+
+        # ✅ Linha 1: INTERATIVO (Ocorrências) lado a lado com Motivos
+        colL, colR = st.columns(2)
+
+        with colL:
+            if drill_comp is not None:
+                # clique/Voltar ficam no navegador; fora de fragmento, o
+                # "Aplicar" roda o app uma vez e o drill chega a todos os painéis
+                dados_occ = dados_drill(
+                    piramide_memo(memo, medida, xf_motivo, xf_resp), anos_sel, mes_sel,
+                    medida, json.loads(_fig_to_spec(fig_occ)), memo["chave"], limiares=exato is None,
+                )
+                drill_comp(dados=dados_occ, key="occ_drill", default=None)
+            else:
+                painel_ocorrencias(fig_occ, level_now, mes_sel)
+
+        # Motivos / Participação / Atrasadas: clique liga/desliga o filtro cruzado
+        with colR:
+            grafico_cruzado(fig_mot, "mot_chart", "xf_motivo")
+
+        # Linha 2: Participação (barras) + Atrasadas
+        row2_left, row2_right = st.columns(2)
+        with row2_left:
+            grafico_cruzado(fig_pie, "resp_chart", "xf_resp")
+        with row2_right:
+            grafico_cruzado(fig_atras, "atras_chart", "xf_resp")
+
+        # Linha 3: Aging das pendências (filtros, sem drill — como Atrasadas)
+        painel_aging(memo)
+
+        # Linha 4: Turno/Horário x dia da semana (filtros + drill + filtro cruzado)
+        painel_turnos(mapa_turnos, memo, recorte_sel, xf_motivo, xf_resp, df_turnos)
+
+        # Tabela final (barra clicada) + recorte bruto
+        painel_tabela(memo, recorte_sel, xf_motivo, xf_resp, show_table, filtro_txt, amostrado=exato is not None)
+
+        painel_varredura(base_key, df_base)
+
+    with tab2:
+        if not total:
+            st.info("Quando houver registros no filtro, as exportações ficam disponíveis.")
+            st.stop()
+
+        # Estado normalizado do recorte (chave do cache de exportações em disco):
+        # só o drill que de fato filtra entra
+        drill_export = [
+            st.session_state.drill_year if len(anos_sel or []) > 1 else None,
+            st.session_state.drill_month if mes_sel == "(Todos)" else None,
+        ]
+        if exato is None:
+            datasets_pdf = (df_occ_plot, level_now, df_mot_sel, df_resp_sel, df_atras_filtro, titulo_ano, df_turnos)
+        else:
+            # Amostra na tela: os gráficos do PDF saem do cubo do recorte completo
+            occ_ex, level_ex, _, mot_ex, resp_ex, atras_ex = datasets_cubo(exato["cubo"], anos_sel, mes_sel, xf_motivo, xf_resp, medida)
+            datasets_pdf = (occ_ex, level_ex, mot_ex, resp_ex, atras_ex, titulo_ano, None)
+        painel_exportacoes(
+            memo, recorte_sel, xf_motivo, xf_resp, filtro_txt,
+            datasets_pdf,
+            medida,
+            # tudo o que o relatório imprime: recorte + texto do filtro e da busca
+            [chave_filtros, drill_export, xf_motivo, xf_resp, filtro_txt, busca.strip()],
+        )
+
+
+# `streamlit run app.py` também roda como __main__: só vira CLI fora do runtime
+if __name__ == "__main__":
+    if _em_streamlit():
+        main()
+    else:
+        raise SystemExit(_cli_varredura(sys.argv[1:]))
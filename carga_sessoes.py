@@ -0,0 +1,405 @@
+# carga_sessoes.py — teste de carga do app.py (sessões simultâneas, sem navegador)
+#
+# Uso:
+#   python carga_sessoes.py --sessoes 1,2,4,8,16 --linhas 20000 --rodadas 2
+#
+# - Gera uma planilha sintética no esquema da consulta Qualiex (ver README) e
+#   deixa como "último arquivo carregado" numa pasta de trabalho temporária
+# - Cada sessão simulada é um AppTest (streamlit.testing) rodando o app.py no
+#   MESMO processo, como no servidor: caches (cache_resource/cache_data) e GIL
+#   são compartilhados entre as sessões
+# - Roteiro de cada sessão: login -> filtros (mês, período, busca) -> drill
+#   Ano -> Mês -> Semana pelo gráfico Ocorrências (no navegador: só o
+#   "Aplicar ao painel" chega ao servidor) -> exportações (CSV, Parquet,
+#   Excel, PDF), como o clique no botão de download faria
+# - Relata, por nível de concorrência: latência por rerun (p50/p90/p99/máx,
+#   % acima de 1 s) e memória do processo (RSS no fim e pico)
+# - Os números são só do servidor: o AppTest não roda o iframe do drill, então
+#   o "Aplicar" é gravado direto em session_state["occ_drill"]; a ida e volta
+#   do componente (postMessage, websocket) e o desenho no navegador ficam de fora
+# - Remenda internos do Streamlit (ver _instrumentar_streamlit): só roda com a
+#   versão STREAMLIT_CARGA (pip install -r requirements-carga.txt)
+
+import argparse
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+APP_PATH = Path(__file__).resolve().parent / "app.py"
+SENHA_PADRAO = "QualidadeRS"
+RERUN_ALVO_S = 1.0     # meta: rerun abaixo de 1 s
+TIMEOUT_RERUN_S = 300  # por rerun (AppTest)
+AMOSTRA_RSS_S = 0.2    # intervalo do amostrador de memória
+# Versão do Streamlit em que os remendos de _instrumentar_streamlit foram
+# conferidos (a mesma de requirements-carga.txt); ao subir, revisar os remendos
+STREAMLIT_CARGA = "1.66.0"
+
+# Colunas da consulta Qualiex (mesma ordem do README / SCHEMA_QUALIEX)
+COLUNAS_QUALIEX = [
+    "Código", "Título", "Status", "Situação", "Data de emissão", "Responsável",
+    "Categoria", "Local", "Cliente", "Descrição", "Responsável da análise de causa",
+    "Link", "Embalagem", "Motivo Reclamação", "Quantidade não conforme", "Turno/Horário",
+]
+
+PALAVRAS = [
+    "embalagem", "rasgada", "contaminação", "corpo", "estranho", "rótulo", "errado",
+    "peso", "abaixo", "lacre", "violado", "vazamento", "validade", "odor", "cor",
+    "textura", "amassada", "falta", "produto", "lote", "cliente", "entrega", "atraso",
+]
+
+
+# =========================================================
+# Planilha sintética
+# =========================================================
+def planilha_sintetica(linhas: int, seed: int = 42) -> bytes:
+    rng = np.random.default_rng(seed)
+    ini = pd.Timestamp("2025-01-01")
+    dias = max((pd.Timestamp.today().normalize() - ini).days, 1)
+
+    def _textos(n_palavras):
+        idx = rng.integers(0, len(PALAVRAS), size=(linhas, n_palavras))
+        return [" ".join(PALAVRAS[i] for i in linha) for linha in idx]
+
+    def _rotulos(prefixo, n):
+        return [f"{prefixo} {i}" for i in rng.integers(1, n + 1, size=linhas)]
+
+    datas = ini + pd.to_timedelta(rng.integers(0, dias, size=linhas), unit="D")
+    df = pd.DataFrame({
+        "Código": [f"RNC-{i:06d}" for i in range(1, linhas + 1)],
+        "Título": _textos(4),
+        "Status": rng.choice(["ABERTA", "EM ANÁLISE", "CONCLUÍDA", "CANCELADA"], size=linhas, p=[0.4, 0.25, 0.3, 0.05]),
+        "Situação": rng.choice(["ATRASADA", "NO PRAZO"], size=linhas),
+        "Data de emissão": datas.strftime("%d/%m/%Y"),
+        "Responsável": _rotulos("Resp", 12),
+        "Categoria": rng.choice(["Reclamação", "Desvio", "Não conformidade"], size=linhas),
+        "Local": _rotulos("Local", 6),
+        "Cliente": _rotulos("Cliente", 300),
+        "Descrição": _textos(12),
+        "Responsável da análise de causa": _rotulos("Resp", 12),
+        "Link": "",
+        "Embalagem": rng.choice(["Caixa", "Saco", "Pote", "Fardo"], size=linhas),
+        "Motivo Reclamação": _rotulos("Motivo", 30),
+        "Quantidade não conforme": rng.integers(1, 100, size=linhas),
+        "Turno/Horário": rng.choice(["1º turno", "2º turno", "3º turno"], size=linhas),
+    }, columns=COLUNAS_QUALIEX)
+
+    buf = io.BytesIO()
+    df.to_excel(buf, index=False, sheet_name="Sheet1")
+    return buf.getvalue()
+
+
+def preparar_pasta(pasta: Path, xls_bytes: bytes):
+    # mesmo formato de _save_last_upload: o app abre direto com esse arquivo
+    last = pasta / ".last_input"
+    last.mkdir(parents=True, exist_ok=True)
+    (last / "last_excel.bin").write_bytes(xls_bytes)
+    (last / "last_excel_meta.json").write_text(
+        json.dumps({"filename": "sintetica.xlsx", "sheet": "Sheet1", "digest": ""}),
+        encoding="utf-8",
+    )
+
+
+# =========================================================
+# AppTest em várias threads (um processo = um servidor)
+# - AppTest foi feito para uma sessão por vez: cada run troca e depois zera o
+#   Runtime global e recompila o script. Aqui as sessões compartilham o último
+#   runtime criado e um único bytecode do app.py (como o servidor faz; o
+#   ast.parse do Python 3.11 não é seguro entre threads)
+# - Downloads adiados: guarda o callable de cada botão para "clicar" depois
+# =========================================================
+_ADIADOS = {}
+
+
+def _instrumentar_streamlit():
+    import streamlit
+
+    if streamlit.__version__ != STREAMLIT_CARGA:
+        raise SystemExit(
+            f"carga_sessoes.py remenda internos do Streamlit {STREAMLIT_CARGA} (Runtime, ScriptCache, "
+            f"MediaFileManager) e o instalado é {streamlit.__version__}: pip install -r requirements-carga.txt"
+        )
+
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    add_deferred_original = MediaFileManager.add_deferred
+
+    def add_deferred(self, data_callable, *args, **kwargs):
+        file_id = add_deferred_original(self, data_callable, *args, **kwargs)
+        _ADIADOS[file_id] = data_callable
+        return file_id
+
+    MediaFileManager.add_deferred = add_deferred
+
+    ultimo = [None]
+
+    def instance(cls):
+        if cls._instance is not None:
+            ultimo[0] = cls._instance
+        if ultimo[0] is None:
+            raise RuntimeError("Runtime hasn't been created!")
+        return ultimo[0]
+
+    def exists(cls):
+        return cls._instance is not None or ultimo[0] is not None
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(exists)
+
+    bytecode, trava = {}, threading.Lock()
+    get_bytecode_original = ScriptCache.get_bytecode
+
+    def get_bytecode(self, script_path):
+        with trava:
+            if script_path not in bytecode:
+                bytecode[script_path] = get_bytecode_original(self, script_path)
+            return bytecode[script_path]
+
+    ScriptCache.get_bytecode = get_bytecode
+
+
+# =========================================================
+# Memória do processo
+# =========================================================
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for linha in f:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1]) / 1024
+    except Exception:
+        pass
+    import resource  # sem /proc: pico do processo (ru_maxrss em KB no Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _amostrar_rss(parar: threading.Event, pico: list):
+    while not parar.is_set():
+        pico[0] = max(pico[0], rss_mb())
+        parar.wait(AMOSTRA_RSS_S)
+
+
+# =========================================================
+# Sessão simulada
+# =========================================================
+def _rerun(at, passo: str, reg: list, acao=None):
+    t = time.perf_counter()
+    (acao or at).run(timeout=TIMEOUT_RERUN_S)
+    reg.append((passo, time.perf_counter() - t))
+    if at.exception:
+        raise RuntimeError(f"{passo}: {at.exception[0].message}")
+
+
+def _aguardar_painel(at):
+    # Excel novo: a ingestão roda em segundo plano e o app pede reruns até
+    # terminar (fora da medição, como o navegador esperando a barra de progresso)
+    limite = time.monotonic() + TIMEOUT_RERUN_S
+    while not at.metric:
+        if at.exception or time.monotonic() > limite:
+            raise RuntimeError("login: painel não abriu (senha ou dataset)")
+        time.sleep(AMOSTRA_RSS_S)
+        at.run(timeout=TIMEOUT_RERUN_S)
+
+
+def _widget(lista, rotulo: str):
+    for w in lista:
+        if w.label == rotulo:
+            return w
+    raise LookupError(f"widget não encontrado: {rotulo}")
+
+
+def _clicar_ocorrencias(at, reg: list, passo: str, escolher):
+    # clique numa barra = seleção no widget do gráfico (key="occ_chart")
+    spec = json.loads(at.get("plotly_chart")[0].proto.spec)
+    xs = [str(x) for x in spec["data"][0]["x"]]
+    x = escolher(xs)
+    at.session_state["occ_chart"] = {"selection": {"points": [{"x": x}], "point_indices": [xs.index(x)], "box": [], "lasso": []}}
+    _rerun(at, passo, reg)
+
+
+def _drill_navegador(at, reg: list):
+    # drill no navegador: Ano -> Mês -> Semana e a barra da semana não chegam
+    # ao servidor; só o "📌 Aplicar ao painel" vira rerun. O valor que o
+    # componente mandaria é gravado direto na sessão: o tempo medido é o do
+    # rerun, sem a ida e volta do navegador
+    dados = json.loads(at.get("component_instance")[0].proto.json_args)["dados"]
+    ano = int(dados["piramide"]["ano"]["x"][0])
+    meses = [m for m, v in zip(dados["meses"], dados["piramide"]["mes"][str(ano)]) if v]
+    mes = dados["meses"].index("Mar" if "Mar" in meses else meses[0]) + 1
+    at.session_state["occ_drill"] = {
+        "nivel": "SEMANA", "ano": ano, "mes": mes,
+        "foco": {"nivel": "SEMANA", "valor": "2ª"}, "seq": time.time_ns(),
+    }
+    _rerun(at, "drill aplicado (semana)", reg)
+
+
+def _exportar(at, reg: list, erros: list):
+    for botao in at.get("download_button"):
+        file_id = botao.proto.deferred_file_id
+        gerar = _ADIADOS.get(file_id)
+        if not file_id or gerar is None:
+            continue
+        t = time.perf_counter()
+        try:
+            gerar()
+            reg.append((f"export {botao.proto.label}", time.perf_counter() - t))
+        except Exception as e:
+            erros.append(f"export {botao.proto.label}: {e}")
+
+
+def sessao(senha: str, reg: list, erros: list):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(APP_PATH), default_timeout=TIMEOUT_RERUN_S)
+    try:
+        _rerun(at, "abrir", reg)
+        _widget(at.text_input, "Senha").input(senha)
+        _rerun(at, "login", reg, _widget(at.button, "Entrar").click())
+        _aguardar_painel(at)
+
+        # filtros
+        _rerun(at, "filtro mês", reg, _widget(at.selectbox, "Mês").select("Mar"))
+        _rerun(at, "filtro mês", reg, _widget(at.selectbox, "Mês").select("(Todos)"))
+        sl = at.slider[0]
+        ini, fim = sl.value
+        _rerun(at, "filtro período", reg, sl.set_value((ini + (fim - ini) / 4, fim - (fim - ini) / 4)))
+        _rerun(at, "busca", reg, _widget(at.text_input, "🔎 Buscar em Título/Descrição").input("embalagem rasgada"))
+        _rerun(at, "busca", reg, _widget(at.text_input, "🔎 Buscar em Título/Descrição").input(""))
+
+        # drill Ano -> Mês -> Semana pelo gráfico Ocorrências
+        if at.get("component_instance"):
+            _drill_navegador(at, reg)
+        else:
+            at.session_state["drill_level"] = "ANO"
+            _rerun(at, "drill ano", reg)
+            _clicar_ocorrencias(at, reg, "drill mês", lambda xs: xs[0])
+            _clicar_ocorrencias(at, reg, "drill semana", lambda xs: "Mar" if "Mar" in xs else xs[0])
+            _clicar_ocorrencias(at, reg, "barra semana (tabela)", lambda xs: xs[1])
+
+        _exportar(at, reg, erros)
+    except Exception as e:
+        erros.append(str(e))
+
+
+# =========================================================
+# Níveis de concorrência
+# =========================================================
+def _percentis(valores):
+    if not valores:
+        return {"p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+    p50, p90, p99 = np.percentile(valores, [50, 90, 99])
+    return {"p50": p50, "p90": p90, "p99": p99, "max": max(valores)}
+
+
+def nivel(n_sessoes: int, rodadas: int, senha: str) -> dict:
+    reg, erros = [], []
+    parar, pico = threading.Event(), [rss_mb()]
+    amostrador = threading.Thread(target=_amostrar_rss, args=(parar, pico), daemon=True)
+    amostrador.start()
+
+    t = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_sessoes) as ex:
+        for _ in range(rodadas):
+            list(ex.map(lambda _i: sessao(senha, reg, erros), range(n_sessoes)))
+    duracao = time.perf_counter() - t
+
+    parar.set()
+    amostrador.join()
+
+    reruns = [dt for passo, dt in reg if not passo.startswith("export")]
+    exports = [dt for passo, dt in reg if passo.startswith("export")]
+    return {
+        "sessoes": n_sessoes,
+        "reruns": len(reruns),
+        "rerun": _percentis(reruns),
+        "acima_alvo": float(np.mean(np.array(reruns) > RERUN_ALVO_S)) if reruns else 0.0,
+        "export": _percentis(exports),
+        "rss_fim_mb": rss_mb(),
+        "rss_pico_mb": pico[0],
+        "duracao_s": duracao,
+        "erros": erros,
+        "por_passo": {
+            passo: _percentis([dt for p, dt in reg if p == passo])
+            for passo in dict.fromkeys(p for p, _ in reg)
+        },
+    }
+
+
+def _imprimir(resultados: list, por_passo: bool):
+    print()
+    print(f"{'sessões':>7} {'reruns':>6} {'p50':>7} {'p90':>7} {'p99':>7} {'máx':>7} {'>1s':>6} "
+          f"{'export p90':>10} {'RSS fim':>8} {'RSS pico':>9} {'erros':>5}")
+    for r in resultados:
+        q = r["rerun"]
+        print(
+            f"{r['sessoes']:>7} {r['reruns']:>6} {q['p50']:>6.2f}s {q['p90']:>6.2f}s {q['p99']:>6.2f}s "
+            f"{q['max']:>6.2f}s {r['acima_alvo']:>6.0%} {r['export']['p90']:>9.2f}s "
+            f"{r['rss_fim_mb']:>6.0f}MB {r['rss_pico_mb']:>7.0f}MB {len(r['erros']):>5}"
+        )
+    if por_passo:
+        for r in resultados:
+            print(f"\n{r['sessoes']} sessão(ões) — por passo (p50 / p90 / máx)")
+            for passo, q in r["por_passo"].items():
+                print(f"  {passo:<32} {q['p50']:>6.2f}s {q['p90']:>6.2f}s {q['max']:>6.2f}s")
+    for r in resultados:
+        for e in dict.fromkeys(r["erros"]):
+            print(f"[{r['sessoes']} sessões] erro: {e}")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Teste de carga do app.py com sessões simultâneas (AppTest).")
+    ap.add_argument("--sessoes", default="1,2,4,8", help="níveis de concorrência, ex.: 1,2,4,8,16")
+    ap.add_argument("--rodadas", type=int, default=1, help="roteiros completos por sessão em cada nível")
+    ap.add_argument("--linhas", type=int, default=20_000, help="linhas da planilha sintética")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--senha", default=SENHA_PADRAO)
+    ap.add_argument("--pasta", default=None, help="pasta de trabalho (padrão: temporária)")
+    ap.add_argument("--por-passo", action="store_true", help="detalha a latência de cada passo do roteiro")
+    ap.add_argument("--json", default=None, help="grava os resultados em JSON")
+    args = ap.parse_args(argv)
+
+    niveis = [int(n) for n in args.sessoes.split(",") if n.strip()]
+    saida_json = Path(args.json).resolve() if args.json else None
+    pasta = Path(args.pasta or tempfile.mkdtemp(prefix="carga_app_"))
+    pasta.mkdir(parents=True, exist_ok=True)
+    _instrumentar_streamlit()
+
+    t = time.perf_counter()
+    preparar_pasta(pasta, planilha_sintetica(args.linhas, args.seed))
+    print(f"Planilha sintética: {args.linhas} linhas em {time.perf_counter() - t:.1f}s ({pasta})")
+    os.chdir(pasta)  # o app lê/grava .last_input relativo ao diretório atual
+
+    # aquecimento: ingestão do Excel + caches do dataset (fora da medição)
+    reg, erros = [], []
+    t = time.perf_counter()
+    sessao(args.senha, reg, erros)
+    print(f"Aquecimento (1ª sessão, cache frio): {time.perf_counter() - t:.1f}s | RSS {rss_mb():.0f}MB")
+    if erros:
+        print(f"erro no aquecimento: {erros[0]}")
+        return 2
+
+    resultados = []
+    for n in niveis:
+        r = nivel(n, args.rodadas, args.senha)
+        resultados.append(r)
+        q = r["rerun"]
+        print(f"{n:>3} sessão(ões): p50 {q['p50']:.2f}s | p90 {q['p90']:.2f}s | p99 {q['p99']:.2f}s | "
+              f"RSS pico {r['rss_pico_mb']:.0f}MB | {r['duracao_s']:.1f}s")
+
+    _imprimir(resultados, args.por_passo)
+    if saida_json:
+        saida_json.write_text(json.dumps(resultados, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 1 if any(r["erros"] for r in resultados) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
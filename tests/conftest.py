@@ -0,0 +1,35 @@
+"""Fixtures dos testes: o módulo app (sem a UI) e uma base sintética."""
+import importlib
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+RAIZ = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(RAIZ))
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    # importar não executa a UI (main()); o módulo cria .last_input/ no
+    # diretório atual, então a importação roda num diretório temporário
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("app"))
+    try:
+        return importlib.import_module("app")
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture(scope="session")
+def base(app):
+    """Planilha do teste de carga lida pelo app, com alguns vazios nos filtros."""
+    from carga_sessoes import planilha_sintetica
+
+    df = app._ler_excel(planilha_sintetica(3000, seed=7), "Sheet1")
+    rng = np.random.default_rng(7)
+    for col in (app.COL_CATEGORIA, app.COL_MOTIVO):
+        df.loc[df.index[rng.choice(len(df), 40, replace=False)], col] = np.nan
+    return df
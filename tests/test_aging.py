@@ -0,0 +1,88 @@
+"""Aging: faixas de idade, só pendências e cortes por dia x cálculo linha a linha."""
+import numpy as np
+import pandas as pd
+import pytest
+
+HOJE = pd.Timestamp("2026-06-30")
+DIAS = ["2025-01-01", "2025-06-15", "2025-12-31", "2026-06-30", "2027-03-01"]
+
+
+def _faixas_por_linha(app, df, hoje):
+    # referência: idade e faixa de cada pendência, direto das linhas
+    situacao = df[app.COL_SITUACAO].map(lambda v: app.normalizar_situacao(v) == "ATRASADA").astype(bool)
+    status = df[app.COL_STATUS].map(lambda v: str(v).strip().upper() not in app.STATUS_FECHADOS).astype(bool)
+    pend = (situacao | status) & df[app.COL_DATA].notna()
+    idade = (pd.Timestamp(hoje).normalize() - df.loc[pend, app.COL_DATA].dt.normalize()).dt.days.clip(lower=0)
+    linhas = pd.DataFrame({
+        "Responsável (análise)": app._serie_resp_analise(df)[pend].to_numpy(),
+        "Faixa": np.asarray(app.AGING_FAIXAS, dtype=object)[np.searchsorted(app.AGING_LIMITES, idade, side="left")],
+        "Em atraso": situacao[pend].astype(int).to_numpy(),
+        "Em aberto": status[pend].astype(int).to_numpy(),
+    })
+    return linhas.groupby(["Responsável (análise)", "Faixa"])[["Em atraso", "Em aberto"]].sum()
+
+
+def _sem_zeros(aging):
+    t = aging.set_index(["Responsável (análise)", "Faixa"])[["Em atraso", "Em aberto"]]
+    return t[t.sum(axis=1) > 0]
+
+
+def test_aging_limites_das_faixas(app):
+    idades = [0, 7, 8, 15, 16, 30, 31, 60, 61, 400, -3]
+    faixas = [0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 0]
+    df = pd.DataFrame({
+        app.COL_DATA: [HOJE - pd.Timedelta(days=d) for d in idades],
+        app.COL_SITUACAO: "ATRASADA",
+        app.COL_STATUS: "ABERTA",
+        app.COL_RESP_ANALISE: [f"Resp {i}" for i in range(len(idades))],
+    })
+    aging = app.construir_aging(df, HOJE)
+    for i, faixa in enumerate(faixas):
+        linha = aging[aging["Responsável (análise)"] == f"Resp {i}"].set_index("Faixa")["Em atraso"]
+        assert linha[app.AGING_FAIXAS[faixa]] == 1, idades[i]
+        assert linha.sum() == 1
+
+
+def test_aging_so_pendencias(app):
+    df = pd.DataFrame({
+        app.COL_DATA: [HOJE - pd.Timedelta(days=10)] * 3,
+        app.COL_SITUACAO: ["ATRASADA", "NO PRAZO", "NO PRAZO"],
+        app.COL_STATUS: ["CONCLUÍDA", "ABERTA", "CONCLUÍDA"],
+        app.COL_RESP_ANALISE: ["A", "B", "C"],
+    })
+    soma = app.construir_aging(df, HOJE).groupby("Responsável (análise)")[["Em atraso", "Em aberto"]].sum()
+    assert soma.loc["A"].tolist() == [1, 0]
+    assert soma.loc["B"].tolist() == [0, 1]
+    assert "C" not in soma.index or soma.loc["C"].sum() == 0
+
+
+@pytest.mark.parametrize("hoje", DIAS)
+def test_aging_por_dia_igual_linhas(app, base, hoje):
+    # a mesma preparação serve para qualquer dia
+    prep = app.preparar_aging(base)
+    obtido = _sem_zeros(app.aging_no_dia(prep, hoje))
+    esperado = _faixas_por_linha(app, base, hoje)
+    pd.testing.assert_frame_equal(obtido.sort_index(), esperado.sort_index(), check_dtype=False)
+
+
+def test_aging_memo_so_refaz_os_cortes_no_outro_dia(app, base, monkeypatch):
+    memo = {"df": base}
+    primeiro = app.aging_memo(memo, DIAS[0])
+    assert app.aging_memo(memo, DIAS[0]) is primeiro
+
+    def _nao_prepara(df):
+        raise AssertionError("preparar_aging refeito")
+
+    monkeypatch.setattr(app, "preparar_aging", _nao_prepara)
+    outro = app.aging_memo(memo, DIAS[1])
+    pd.testing.assert_frame_equal(outro, app.aging_no_dia(memo["aging"][None]["base"], DIAS[1]))
+
+
+def test_resumo_excel_usa_o_aging_recebido(app, base, monkeypatch):
+    aging = app.aging_memo({"df": base}, HOJE)
+
+    def _nao_constroi(df, hoje=None):
+        raise AssertionError("construir_aging chamado no export")
+
+    monkeypatch.setattr(app, "construir_aging", _nao_constroi)
+    assert app.build_resumo_excel_bytes(base, base, "Teste", aging=aging)[:2] == b"PK"
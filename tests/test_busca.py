@@ -0,0 +1,33 @@
+"""Busca textual (índice invertido + trigramas) x str.contains."""
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope="module")
+def tx(app, base):
+    return app.construir_indice_texto(base)
+
+
+@pytest.mark.parametrize("consulta", ["contam", "Contaminação", "rasgada lote", "co", "a", "EMBALAGEM  atraso", "xyz", "  "])
+def test_busca_igual_str_contains(app, base, tx, consulta):
+    texto = (
+        app._normalizar_serie_texto(base[app.COL_TITULO]) + " " + app._normalizar_serie_texto(base[app.COL_DESCRICAO])
+    )
+    termos = app._TOKEN_RE.findall(app.normalizar_texto(consulta))
+
+    obtido = app.buscar_texto(tx, consulta)
+    if not termos:
+        assert obtido is None
+        return
+    mask = np.ones(len(base), dtype=bool)
+    for termo in termos:
+        mask &= texto.str.contains(termo, regex=False).to_numpy()
+    np.testing.assert_array_equal(obtido, np.flatnonzero(mask))
+
+
+def test_termo_curto_e_longo_mesma_regra(app, tx):
+    # termo de 1-2 letras (sem trigrama) também casa trecho da palavra
+    vocab = tx["vocab"]
+    for termo in ("ra", "ras", "rasg"):
+        codigos = app._codigos_termo(tx, termo)
+        assert sorted(vocab[c] for c in codigos) == sorted(v for v in vocab if termo in v)
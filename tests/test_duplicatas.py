@@ -0,0 +1,22 @@
+"""Detecção de duplicatas (mesmo cliente, texto quase igual)."""
+import pandas as pd
+
+
+def test_duplicatas_mesmo_cliente_texto_igual(app):
+    texto = "embalagem rasgada com vazamento de produto no lote entregue ao cliente"
+    df = pd.DataFrame({
+        app.COL_TITULO: ["Vazamento", "Vazamento", "Vazamento", "Rótulo errado"],
+        app.COL_DESCRICAO: [texto, texto, texto, "rótulo com validade errada na caixa"],
+        app.COL_CLIENTE: ["Cliente 1", "Cliente 1", "Cliente 2", "Cliente 1"],
+        app.COL_DATA: pd.to_datetime(["2025-03-05", "2025-03-01", "2025-03-02", "2025-03-03"]),
+    })
+
+    dup = app.construir_duplicatas(df)
+
+    assert dup["n_grupos"] == 1
+    assert dup["n_colapsadas"] == 1
+    assert dup["grupo"][0] == dup["grupo"][1]
+    assert len({dup["grupo"][1], dup["grupo"][2], dup["grupo"][3]}) == 3  # outro cliente / outro texto
+    # fica a ocorrência mais antiga do grupo
+    assert dup["manter"].tolist() == [False, True, True, True]
+    assert dup["tam_grupo"].tolist() == [2, 2, 1, 1]
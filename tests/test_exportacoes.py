@@ -0,0 +1,29 @@
+"""Chave do cache das exportações em disco."""
+
+
+def test_chave_exportacao(app):
+    estado = [["k"], [None, None], None, None, "Ano(s) 2025", "lote", "2026-06-30"]
+    chave = app._chave_exportacao("pdf", estado)
+
+    assert chave == app._chave_exportacao("pdf", list(estado))
+    assert chave != app._chave_exportacao("xlsx", estado)
+    for i, outro in [(4, "Ano(s) 2026"), (5, "lote 2"), (6, "2026-07-01"), (2, "Motivo 1")]:
+        mudado = list(estado)
+        mudado[i] = outro
+        assert app._chave_exportacao("pdf", mudado) != chave, i
+    # dicionários: a ordem das chaves não muda o arquivo
+    assert app._chave_exportacao("pdf", {"a": 1, "b": 2}) == app._chave_exportacao("pdf", {"b": 2, "a": 1})
+
+
+def test_exportacao_cacheada_gera_uma_vez(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "EXPORT_CACHE_DIR", tmp_path)
+    chamadas = []
+
+    def gerar():
+        chamadas.append(1)
+        return b"relatorio"
+
+    assert app.exportacao_cacheada("pdf", ["a"], gerar) == b"relatorio"
+    assert app.exportacao_cacheada("pdf", ["a"], gerar) == b"relatorio"
+    assert app.exportacao_cacheada("pdf", ["b"], gerar) == b"relatorio"
+    assert len(chamadas) == 2
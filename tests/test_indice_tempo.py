@@ -0,0 +1,56 @@
+"""Índice temporal (somas prefixadas por dia) x varredura das linhas."""
+import pandas as pd
+import pytest
+
+PERIODOS = [
+    ("2025-01-01", "2030-12-31"),  # tudo
+    ("2025-03-01", "2025-03-31"),  # um mês
+    ("2025-06-15", "2025-06-15"),  # um dia
+    ("2025-02-10", "2025-09-03"),  # faixa qualquer
+    ("2020-01-01", "2024-12-31"),  # antes da base
+]
+
+
+def _filtros_todos(app, df):
+    # "Filtros por marcar" com tudo marcado (visão padrão)
+    return {c: app._valores_distintos(df[c]) for c in app.FILTROS_COLS if c in df.columns}
+
+
+@pytest.fixture(scope="module")
+def tidx(app, base):
+    return app.construir_indice_tempo(base)
+
+
+@pytest.mark.parametrize("periodo", PERIODOS)
+def test_indice_tempo_igual_varredura(app, base, tidx, periodo):
+    linhas = app.aplicar_filtros(base, None, "(Todos)", "(Todos)", _filtros_todos(app, base), periodo=periodo)
+
+    assert app.contar_periodo(tidx, *periodo) == len(linhas)
+    atrasadas = (linhas[app.COL_SITUACAO].astype(str) == "ATRASADA").sum()
+    assert app.contar_periodo(tidx, *periodo, atrasadas=True) == atrasadas
+
+    for col in app.TIME_INDEX_COLS:
+        esperado = linhas[col].astype(str).value_counts()
+        obtido = app.contar_periodo_por(tidx, col, *periodo)
+        pd.testing.assert_series_equal(obtido.sort_index(), esperado.sort_index(), check_names=False)
+
+
+@pytest.mark.parametrize("periodo", PERIODOS[:4])
+def test_paineis_do_indice_iguais_aos_das_linhas(app, base, tidx, periodo):
+    linhas = app.aplicar_filtros(base, None, "(Todos)", "(Todos)", _filtros_todos(app, base), periodo=periodo)
+
+    for painel in app.PAINEIS_RANKING:
+        pd.testing.assert_frame_equal(
+            app.calc_ranking(painel, tidx=tidx, periodo=periodo), app.calc_ranking(painel, linhas), obj=painel
+        )
+
+
+def test_indice_tempo_exclui_vazios_dos_filtros(app, base, tidx):
+    # a visão padrão (tudo marcado) não tem as linhas com filtro vazio
+    vazias = int((~app._mask_filtros_padrao(base)).sum())
+    assert vazias > 0
+    assert app.contar_periodo(tidx, *PERIODOS[0]) == len(base) - vazias
+
+
+def test_aplicar_filtros_sem_filtro_devolve_a_base(app, base):
+    assert app.aplicar_filtros(base, None, "(Todos)", "(Todos)", {}) is base
@@ -0,0 +1,52 @@
+"""Medidas do cubo (ocorrências / quantidade) x linhas do recorte."""
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture(scope="module")
+def base_qtd(app, base):
+    # quantidade com fração: a soma não pode truncar
+    df = base.copy()
+    df[app.COL_QTD_NC] = np.random.default_rng(3).integers(1, 400, len(df)) / 4
+    return df
+
+
+@pytest.mark.parametrize("painel", ["motivos", "participacao", "atrasadas"])
+def test_ranking_do_cubo_igual_ao_das_linhas(app, base, painel):
+    cubo = app.construir_cubo(base)
+    pd.testing.assert_frame_equal(app.calc_ranking(painel, cubo=cubo), app.calc_ranking(painel, base))
+
+
+@pytest.mark.parametrize("painel", ["motivos", "participacao", "atrasadas"])
+def test_quantidade_nao_trunca(app, base_qtd, painel):
+    rotulo, dim, atrasadas = app.PAINEIS_RANKING[painel]
+    serie = app._serie_motivo(base_qtd) if dim == "motivo" else app._serie_resp_analise(base_qtd)
+    qtd = app._serie_qtd(base_qtd)
+    if atrasadas:
+        qtd = qtd.where(app._serie_atrasada(base_qtd), 0.0)
+
+    tab = app.calc_ranking(painel, cubo=app.construir_cubo(base_qtd), medida="qtd")
+
+    ycol = tab.columns[1]
+    assert tab[ycol].dtype == float
+    assert tab[ycol].sum() == pytest.approx(qtd.sum())
+    cabeca = tab[tab[rotulo] != app.ROTULO_OUTROS].set_index(rotulo)[ycol]
+    esperado = qtd.groupby(serie).sum().reindex(cabeca.index)
+    np.testing.assert_allclose(cabeca.to_numpy(), esperado.to_numpy())
+
+
+def test_totais_do_cubo(app, base_qtd):
+    totais = app.totais_cubo(app.construir_cubo(base_qtd))
+
+    assert totais["n"] == len(base_qtd) and isinstance(totais["n"], int)
+    assert totais["qtd"] == pytest.approx(app._serie_qtd(base_qtd).sum())
+    assert app.fmt_num(2.5) == "2.50" and app.fmt_num(3.0) == "3" and app.fmt_num(-4, sinal=True) == "-4"
+
+
+def test_piramide_do_drill_igual_ao_grafico(app, base_qtd):
+    cubo = app.construir_cubo(base_qtd)
+    for medida in ("n", "qtd"):
+        pir = app.piramide_drill(cubo, medida)
+        df_plot, _, _ = app.occurrences_dataset(None, [], "(Todos)", cubo=cubo, medida=medida, drill=("ANO", None, None))
+        assert pir["ano"]["y"] == df_plot[df_plot.columns[1]].tolist()
@@ -0,0 +1,66 @@
+"""Registro de memória das sessões (weakref do memo, descarte LRU)."""
+import gc
+import time
+
+import pytest
+
+
+@pytest.fixture
+def reg(app, monkeypatch):
+    registro = app._sessoes_registry()
+    registro["sessoes"].clear()
+    monkeypatch.setattr(app, "SESSOES_MEM_MAX_MB", 1024)
+    monkeypatch.setattr(app, "SESSAO_OCIOSA_S", 0)
+    yield registro
+    registro["sessoes"].clear()
+
+
+def _memo(app, sid, base, n=500):
+    memo = app.MemoRecorte(sid, chave=sid, df=base.iloc[:n].copy(), cubo=None, comp=None)
+    app.tocar_sessao(memo, registrar=True)
+    return memo
+
+
+def test_sessao_fechada_sai_do_registro(app, reg, base):
+    a = _memo(app, "a", base)
+    app.contabilizar_sessao(a, base)
+    assert reg["sessoes"]["a"]["bytes"] > 0
+
+    del a  # sessão fechada: só o registro apontaria para o memo
+    gc.collect()
+    b = _memo(app, "b", base)
+    app.contabilizar_sessao(b, base)
+
+    assert list(reg["sessoes"]) == ["b"]
+
+
+def test_teto_descarta_a_sessao_ociosa(app, reg, base, monkeypatch):
+    a = _memo(app, "a", base)
+    app.contabilizar_sessao(a, base)
+    reg["sessoes"]["a"]["ultimo"] -= 60
+    monkeypatch.setattr(app, "SESSOES_MEM_MAX_MB", 0)
+
+    b = _memo(app, "b", base)
+    app.contabilizar_sessao(b, base)
+
+    assert a["chave"] is None and a["df"] is None
+    assert b["df"] is not None
+    assert reg["descartes"] >= 1
+
+
+def test_download_adiado_marca_uso_da_sessao(app, reg, base):
+    a = _memo(app, "a", base)
+    reg["sessoes"]["a"]["ultimo"] = 0.0
+
+    # thread do download: sem session_state, só o memo
+    assert app.recortes_memo(a, [], "(Todos)", None, None) is not None
+    assert time.time() - reg["sessoes"]["a"]["ultimo"] < 5
+
+
+def test_memo_antigo_nao_substitui_o_atual(app, reg, base):
+    antigo = _memo(app, "a", base)
+    atual = _memo(app, "a", base, n=100)
+
+    app.tocar_sessao(antigo)
+
+    assert reg["sessoes"]["a"]["memo"]() is atual
@@ -0,0 +1,25 @@
+"""Top k + "(Outros)" dos rankings."""
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.mark.parametrize("k", [None, 1, 5, 12, 40])
+def test_top_k_outros_preserva_total(app, k):
+    rng = np.random.default_rng(k or 0)
+    cont = pd.Series(rng.integers(1, 8, size=30), index=[f"Motivo {i}" for i in range(30)])  # com empates
+
+    top = app.top_k_outros(cont, k)
+
+    assert top.sum() == cont.sum()
+    if k is None or k >= len(cont):
+        assert app.ROTULO_OUTROS not in top.index
+        assert len(top) == len(cont)
+        return
+    assert top.index[-1] == app.ROTULO_OUTROS
+    assert len(top) == k + 1
+    cabeca = top.iloc[:-1]
+    # os k maiores, em ordem decrescente; empate pelo rótulo
+    assert sorted(cabeca.to_numpy(), reverse=True) == cabeca.tolist()
+    assert cabeca.min() >= cont.drop(cabeca.index).max()
+    assert list(cabeca.index) == sorted(cabeca.index, key=lambda r: (-cont[r], r))